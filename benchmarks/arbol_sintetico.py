@@ -0,0 +1,192 @@
+"""Generador de árboles de facturas sintéticos para los benchmarks.
+
+Crea, bajo una ruta, la misma forma de datos que reciben los scripts:
+
+    xml/<mes>/<lote>/AttachedDocument_F-010-<n>.xml   (main.py, faltantes_febrero.py, metadatos_xml.py)
+    json/FE<n>.json
+    carpetas/AttachedDocument_F-010-<n>/               (estructurador, prueba, radicador)
+        AttachedDocument_F-010-<n>.xml, FE<n>.json y un resultado MSPS/local
+    soportes/FE<n>/soporte.pdf                         (radicador)
+    facturas.xlsx                                      (columna 'Factura')
+    capita.xlsx                                        (Transaccion, Usuarios, Consultas)
+    capita_lote.xlsx                                   (lo mismo con varias facturas y numFactura)
+"""
+import base64
+import json
+import os
+import random
+
+TAMANO_XML = 12 * 1024
+TAMANO_JSON = 4 * 1024
+TAMANO_PDF = 64 * 1024
+FACTURAS_POR_LOTE = 500
+
+
+def _escribir(ruta, tamano, semilla):
+    """Escribe un archivo de tamaño fijo con contenido poco comprimible."""
+    with open(ruta, 'wb') as f:
+        f.write(random.Random(semilla).randbytes(tamano))
+
+
+def _resultado_msps(numero, tipo):
+    """Contenido de un ResultadosMSPS_* en el formato original del ministerio."""
+    observaciones = [{"Clase": "NOTIFICACION", "Observaciones": f"ProcesoId {numero} registrado"}]
+    if tipo == 'cuv':
+        observaciones.append({"Clase": "NOTIFICACION", "Observaciones": f"CUV {'%0128x' % numero}"})
+    else:
+        observaciones.append({"Clase": "RECHAZADO", "Observaciones": "RVC019 dato inválido"})
+    return json.dumps({"ResultState": False, "ResultadosValidacion": observaciones})
+
+
+def _attached_document(numero, tamano):
+    """AttachedDocument de la DIAN con la factura incrustada en CDATA (base64 en 1 de cada 10)."""
+    lineas = []
+    linea = 0
+    while sum(map(len, lineas)) < tamano - 2500:
+        linea += 1
+        lineas.append(f"<cac:InvoiceLine><cbc:ID>{linea}</cbc:ID><cbc:InvoicedQuantity>1</cbc:InvoicedQuantity>"
+                      f"<cbc:LineExtensionAmount currencyID=\"COP\">{linea * 1000}.00</cbc:LineExtensionAmount>"
+                      f"<cac:Item><cbc:Description>Servicio de salud {linea}</cbc:Description></cac:Item>"
+                      f"</cac:InvoiceLine>")
+    cufe = '%096x' % (numero * 7919)
+    factura = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2" '
+        'xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" '
+        'xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">'
+        f'<cbc:ID>FE{numero}</cbc:ID><cbc:UUID schemeName="CUFE-SHA384">{cufe}</cbc:UUID>'
+        f'<cbc:IssueDate>2025-03-{numero % 28 + 1:02d}</cbc:IssueDate>'
+        '<cac:AccountingSupplierParty><cac:Party><cac:PartyTaxScheme><cbc:CompanyID>900123456</cbc:CompanyID>'
+        '</cac:PartyTaxScheme></cac:Party></cac:AccountingSupplierParty>'
+        '<cac:AccountingCustomerParty><cac:Party><cac:PartyTaxScheme><cbc:CompanyID>800088702</cbc:CompanyID>'
+        '</cac:PartyTaxScheme></cac:Party></cac:AccountingCustomerParty>'
+        f'<cac:LegalMonetaryTotal><cbc:PayableAmount currencyID="COP">{linea * (linea + 1) * 500}.00'
+        '</cbc:PayableAmount></cac:LegalMonetaryTotal>' + ''.join(lineas) + '</Invoice>')
+    if numero % 10 == 0:
+        incrustada = base64.b64encode(factura.encode('utf-8')).decode('ascii')
+    else:
+        incrustada = f"<![CDATA[{factura}]]>"
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<AttachedDocument xmlns="urn:oasis:names:specification:ubl:schema:xsd:AttachedDocument-2" '
+        'xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" '
+        'xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">'
+        f'<cbc:ID>{numero}</cbc:ID><cbc:IssueDate>2025-04-01</cbc:IssueDate>'
+        f'<cbc:ParentDocumentID>FE{numero}</cbc:ParentDocumentID>'
+        '<cac:SenderParty><cac:PartyTaxScheme><cbc:CompanyID>900123456</cbc:CompanyID></cac:PartyTaxScheme></cac:SenderParty>'
+        '<cac:ReceiverParty><cac:PartyTaxScheme><cbc:CompanyID>800088702</cbc:CompanyID></cac:PartyTaxScheme></cac:ReceiverParty>'
+        f'<cac:Attachment><cac:ExternalReference><cbc:MimeCode>text/xml</cbc:MimeCode>'
+        f'<cbc:Description>{incrustada}</cbc:Description></cac:ExternalReference></cac:Attachment>'
+        f'<cac:ParentDocumentLineReference><cbc:LineID>1</cbc:LineID><cac:DocumentReference>'
+        f'<cbc:ID>FE{numero}</cbc:ID><cbc:UUID schemeName="CUFE-SHA384">{cufe}</cbc:UUID>'
+        '</cac:DocumentReference></cac:ParentDocumentLineReference></AttachedDocument>')
+
+
+def generar_xml_json(ruta, facturas):
+    """Árbol de XML por mes/lote y carpeta plana de FE*.json (~5 % de JSON faltantes)."""
+    carpeta_json = os.path.join(ruta, 'json')
+    os.makedirs(carpeta_json, exist_ok=True)
+    for n in range(1, facturas + 1):
+        carpeta_xml = os.path.join(ruta, 'xml', f"mes{n % 3 + 1:02d}", f"lote{n // FACTURAS_POR_LOTE:04d}")
+        os.makedirs(carpeta_xml, exist_ok=True)
+        with open(os.path.join(carpeta_xml, f"AttachedDocument_F-010-{n}.xml"), 'w', encoding='utf-8') as f:
+            f.write(_attached_document(n, TAMANO_XML))
+        if n % 20:
+            _escribir(os.path.join(carpeta_json, f"FE{n}.json"), TAMANO_JSON, -n)
+
+
+def generar_carpetas_factura(ruta, facturas):
+    """Carpetas por factura con XML, JSON y un resultado (aprobada, rechazo local o rechazo MSPS)."""
+    for n in range(1, facturas + 1):
+        carpeta = os.path.join(ruta, 'carpetas', f"AttachedDocument_F-010-{n}")
+        os.makedirs(carpeta, exist_ok=True)
+        _escribir(os.path.join(carpeta, f"AttachedDocument_F-010-{n}.xml"), TAMANO_XML, n)
+        _escribir(os.path.join(carpeta, f"FE{n}.json"), TAMANO_JSON, -n)
+        caso = n % 3
+        with open(os.path.join(carpeta, f"ResultadosLocales_FE{n}.txt"), 'w', encoding='utf-8') as f:
+            f.write('{}')
+        if caso == 0:
+            with open(os.path.join(carpeta, f"ResultadosMSPS_FE{n}_ID{n}_A_CUV.txt"), 'w', encoding='utf-8') as f:
+                f.write(_resultado_msps(n, 'cuv'))
+        elif caso == 1:
+            with open(os.path.join(carpeta, f"ResultadosMSPS_FE{n}_ID0_R.txt"), 'w', encoding='utf-8') as f:
+                f.write(_resultado_msps(n, 'rechazo'))
+
+
+def generar_soportes(ruta, facturas):
+    """Carpeta de soportes FE<n> con un PDF por factura."""
+    for n in range(1, facturas + 1):
+        carpeta = os.path.join(ruta, 'soportes', f"FE{n}")
+        os.makedirs(carpeta, exist_ok=True)
+        _escribir(os.path.join(carpeta, 'soporte.pdf'), TAMANO_PDF, n * 7)
+
+
+def generar_excel_facturas(ruta, facturas):
+    """facturas.xlsx con la columna 'Factura' (incluye ~2 % de facturas inexistentes)."""
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Facturas')
+    hoja.append(['Factura'])
+    for n in range(1, facturas + 1):
+        hoja.append([n if n % 50 else facturas + n])
+    libro.save(os.path.join(ruta, 'facturas.xlsx'))
+
+
+def generar_excel_capita(ruta, facturas, consultas_por_usuario=5, facturas_capita=1, nombre='capita.xlsx'):
+    """capita.xlsx con un usuario por factura y sus consultas.
+
+    Con facturas_capita > 1 la hoja de transacciones trae esa cantidad de
+    facturas (FECAP1, FECAP2, ...) y usuarios y consultas la columna numFactura,
+    con los usuarios repartidos entre ellas (consecutivos por factura).
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(11)
+    libro = Workbook(write_only=True)
+    lote = facturas_capita > 1
+
+    def factura_de(n):
+        return [f"FECAP{(n - 1) % facturas_capita + 1}"] if lote else []
+
+    def consecutivo_de(n):
+        return (n - 1) // facturas_capita + 1
+
+    hoja = libro.create_sheet('Transaccion')
+    hoja.append(['numDocumentoIdObligado', 'numFactura', 'tipoNota', 'numNota'])
+    for k in range(1, facturas_capita + 1):
+        hoja.append(['900123456', f'FECAP{k}', None, None])
+
+    hoja = libro.create_sheet('Usuarios')
+    hoja.append((['numFactura'] if lote else []) + ['tipoDocumentoIdentificacion', 'numDocumentoIdentificacion', 'tipoUsuario', 'fechaNacimiento',
+                 'codSexo', 'codPaisResidencia', 'codMunicipioResidencia', 'codZonaTerritorialResidencia',
+                 'incapacidad', 'codPaisOrigen', 'consecutivo'])
+    for n in range(1, facturas + 1):
+        hoja.append(factura_de(n) + ['CC', str(10**7 + n), '4', '1980-01-01', rng.choice('HM'), '170', '76001',
+                                     '01', 'NO', '170', consecutivo_de(n)])
+
+    hoja = libro.create_sheet('Consultas')
+    hoja.append((['numFactura'] if lote else []) + ['consecutivoUsuario', 'codPrestador', 'fechaInicioAtencion', 'numAutorizacion', 'codConsulta',
+                 'modalidadGrupoServicioTecSal', 'grupoServicios', 'codServicio', 'finalidadTecnologiaSalud',
+                 'causaMotivoAtencion', 'codDiagnosticoPrincipal', 'codDiagnosticoRelacionado1',
+                 'tipoDiagnosticoPrincipal', 'tipoDocumentoIdentificacion', 'numDocumentoIdentificacion',
+                 'vrServicio', 'conceptoRecaudo', 'valorPagoModerador', 'numFEVPagoModerador'])
+    for n in range(1, facturas + 1):
+        for _ in range(consultas_por_usuario):
+            hoja.append(factura_de(n) + [consecutivo_de(n), '760010000001', '2025-03-01 08:00', None, '890201',
+                                         '01', '01', '328', '44', '38', rng.choice(['A09X', 'J069', 'I10X']), None,
+                                         '01', 'CC', str(10**7 + n), 0, '05', 0, None])
+
+    libro.save(os.path.join(ruta, nombre))
+
+
+def generar_arbol(ruta, facturas):
+    """Genera el árbol completo para la cantidad de facturas indicada."""
+    os.makedirs(ruta, exist_ok=True)
+    generar_xml_json(ruta, facturas)
+    generar_carpetas_factura(ruta, facturas)
+    generar_soportes(ruta, facturas)
+    generar_excel_facturas(ruta, facturas)
+    generar_excel_capita(ruta, facturas)
+    generar_excel_capita(ruta, facturas, facturas_capita=max(2, facturas // 100), nombre='capita_lote.xlsx')
+    return ruta
@@ -0,0 +1,94 @@
+"""Mide el tiempo de arranque (importar el módulo en un intérprete nuevo) de cada script.
+
+Cada medición lanza un proceso `python -c "import <módulo>"` desde la carpeta
+del repositorio y se reporta la mediana de varias repeticiones. `import pandas`
+y `import tqdm` se incluyen como referencia de lo que cuesta cargarlos.
+
+Con --comparar <revisión> se extrae esa revisión de git a un directorio
+temporal y se mide lo mismo allí, para ver la mejora contra una versión anterior.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones 15] [--comparar HEAD~1]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS = [
+    'prueba',
+    'main',
+    'renombrador',
+    'seleccionador_de_carpetas',
+    'faltantes_febrero',
+    'estructurador',
+    'radicador',
+    'capita',
+    'cli',
+]
+REFERENCIAS = ['pandas', 'tqdm', 'openpyxl']
+
+
+def medir_import(modulo, directorio, repeticiones):
+    """Mediana en ms de importar el módulo en un proceso nuevo (None si no existe o falla)."""
+    if modulo in MODULOS and not os.path.exists(os.path.join(directorio, f"{modulo}.py")):
+        return None
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        proceso = subprocess.run([sys.executable, '-c', f"import {modulo}"], cwd=directorio,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if proceso.returncode != 0:
+            return None
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def extraer_revision(revision, destino):
+    """Extrae los archivos de una revisión de git en destino."""
+    archivo = subprocess.run(['git', '-C', RAIZ_REPO, 'archive', revision], check=True, capture_output=True).stdout
+    ruta_tar = os.path.join(destino, 'revision.tar')
+    with open(ruta_tar, 'wb') as f:
+        f.write(archivo)
+    with tarfile.open(ruta_tar) as tar:
+        tar.extractall(destino)
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=15)
+    parser.add_argument('--comparar', default=None, help="Revisión de git contra la cual comparar")
+    args = parser.parse_args()
+
+    vacio = medir_import('sys', RAIZ_REPO, args.repeticiones) or 0
+    print(f"Intérprete vacío: {vacio:.0f} ms (mediana de {args.repeticiones})\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        anterior_dir = extraer_revision(args.comparar, tmp) if args.comparar else None
+
+        encabezado = f"{'módulo':<28}{'ahora ms':>10}"
+        if anterior_dir:
+            encabezado += f"{args.comparar + ' ms':>16}{'ahorro':>10}"
+        print(encabezado)
+
+        for modulo in MODULOS + REFERENCIAS:
+            ahora = medir_import(modulo, RAIZ_REPO, args.repeticiones)
+            etiqueta = modulo if modulo in MODULOS else f"({modulo})"
+            linea = f"{etiqueta:<28}{ahora if ahora is not None else float('nan'):>10.0f}"
+            if anterior_dir and modulo in MODULOS:
+                antes = medir_import(modulo, anterior_dir, args.repeticiones)
+                if antes is not None and ahora is not None:
+                    linea += f"{antes:>16.0f}{antes - ahora:>+10.0f}"
+                else:
+                    linea += f"{'-':>16}{'-':>10}"
+            print(linea)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Compara el armado de consultas de capita.py: ciclo iterrows original vs constructor por columnas.
+
+Uso: python benchmarks/bench_capita.py [--usuarios 50000] [--consultas 500000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capita  # noqa: E402
+
+
+def generar_consultas(usuarios, consultas, semilla=7):
+    """Hoja de consultas sintética, como la lee capita (todo texto, vacíos = '')."""
+    rng = np.random.default_rng(semilla)
+    diagnosticos = np.array(['A09X', 'J069', 'I10X', 'E119', 'Z000', ''])
+    return pd.DataFrame({
+        'consecutivoUsuario': rng.integers(1, usuarios + 1, consultas).astype(str),
+        'codPrestador': '760010000001',
+        'fechaInicioAtencion': '2025-03-01 08:00',
+        'numAutorizacion': np.where(rng.random(consultas) < 0.2, '123456', ''),
+        'codConsulta': '890201',
+        'modalidadGrupoServicioTecSal': '01',
+        'grupoServicios': '01',
+        'codServicio': rng.choice(['328', '334', '1101'], consultas),
+        'finalidadTecnologiaSalud': '44',
+        'causaMotivoAtencion': '38',
+        'codDiagnosticoPrincipal': rng.choice(diagnosticos[:-1], consultas),
+        'codDiagnosticoRelacionado1': rng.choice(diagnosticos, consultas),
+        'codDiagnosticoRelacionado2': '',
+        'codDiagnosticoRelacionado3': '',
+        'tipoDiagnosticoPrincipal': '01',
+        'tipoDocumentoIdentificacion': 'CC',
+        'numDocumentoIdentificacion': rng.integers(10**7, 10**10, consultas).astype(str),
+        'vrServicio': rng.choice(['0', '15000', '32000.0'], consultas),
+        'conceptoRecaudo': '05',
+        'valorPagoModerador': '0',
+        'numFEVPagoModerador': '',
+    })
+
+
+def consultas_iterrows(df):
+    """Ciclo original de capita.main (fila por fila), como referencia."""
+    consultas_por_consecutivo = {}
+    for i, (_, fila) in enumerate(df.iterrows(), 1):
+        consecutivo = int(fila.get('consecutivoUsuario', 0)) if str(fila.get('consecutivoUsuario', '')).isdigit() else 0
+        consulta = {
+            'codPrestador': str(fila.get('codPrestador', '')),
+            'fechaInicioAtencion': str(fila.get('fechaInicioAtencion', '')),
+            'numAutorizacion': None if fila.get('numAutorizacion', '') == '' else str(fila.get('numAutorizacion')),
+            'codConsulta': str(fila.get('codConsulta', '')),
+            'modalidadGrupoServicioTecSal': str(fila.get('modalidadGrupoServicioTecSal', '')),
+            'grupoServicios': str(fila.get('grupoServicios', '')),
+            'codServicio': int(fila.get('codServicio', 0)) if str(fila.get('codServicio', '')).isdigit() else 0,
+            'finalidadTecnologiaSalud': str(fila.get('finalidadTecnologiaSalud', '')),
+            'causaMotivoAtencion': str(fila.get('causaMotivoAtencion', '')),
+            'codDiagnosticoPrincipal': str(fila.get('codDiagnosticoPrincipal', '')),
+            'codDiagnosticoRelacionado1': None if fila.get('codDiagnosticoRelacionado1', '') == '' else str(fila.get('codDiagnosticoRelacionado1')),
+            'codDiagnosticoRelacionado2': None if fila.get('codDiagnosticoRelacionado2', '') == '' else str(fila.get('codDiagnosticoRelacionado2')),
+            'codDiagnosticoRelacionado3': None if fila.get('codDiagnosticoRelacionado3', '') == '' else str(fila.get('codDiagnosticoRelacionado3')),
+            'tipoDiagnosticoPrincipal': str(fila.get('tipoDiagnosticoPrincipal', '')),
+            'tipoDocumentoIdentificacion': str(fila.get('tipoDocumentoIdentificacion', '')),
+            'numDocumentoIdentificacion': str(fila.get('numDocumentoIdentificacion', '')),
+            # El original hacía int('32000.0') y fallaba; aquí se convierte vía float
+            'vrServicio': int(float(fila.get('vrServicio', 0))) if str(fila.get('vrServicio', '')).replace('.', '').isdigit() else 0,
+            'conceptoRecaudo': str(fila.get('conceptoRecaudo', '')),
+            'valorPagoModerador': int(float(fila.get('valorPagoModerador', 0))) if str(fila.get('valorPagoModerador', '')).replace('.', '').isdigit() else 0,
+            'numFEVPagoModerador': str(fila.get('numFEVPagoModerador', '')),
+            'consecutivo': i,
+        }
+        consultas_por_consecutivo.setdefault(consecutivo, []).append(consulta)
+    return consultas_por_consecutivo
+
+
+def medir(nombre, funcion, df):
+    inicio = time.perf_counter()
+    resultado = funcion(df)
+    segundos = time.perf_counter() - inicio
+    # Segunda pasada solo para el pico de memoria (tracemalloc distorsiona el tiempo)
+    del resultado
+    tracemalloc.start()
+    resultado = funcion(df)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    filas = sum(len(lista) for lista in resultado.values())
+    print(f"{nombre:<14}{filas:>10}{segundos:>11.2f}{filas / segundos:>14.0f}{pico / 1e6:>12.1f}")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=50000)
+    parser.add_argument('--consultas', type=int, default=500000)
+    parser.add_argument('--omitir-iterrows', action='store_true', help="No medir el ciclo original (lento)")
+    args = parser.parse_args()
+
+    df = generar_consultas(args.usuarios, args.consultas).astype(str)
+    print(f"{'método':<14}{'filas':>10}{'segundos':>11}{'filas/s':>14}{'pico MB':>12}")
+    if not args.omitir_iterrows:
+        medir('iterrows', consultas_iterrows, df)
+    medir('columnar', lambda datos: dict(capita.construir_servicios(datos, 'consultas').items()), df)
+
+
+if __name__ == '__main__':
+    main()
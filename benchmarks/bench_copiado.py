@@ -0,0 +1,79 @@
+"""Compara bytes escritos y tiempo de la capa copiado.py contra shutil.copytree.
+
+Genera carpetas AttachedDocument_F-010-<n> sintéticas y simula dos meses de
+copias (dos destinos distintos con el mismo contenido), que es el caso en el
+que enlace/dedup evitan volver a escribir los mismos bytes.
+
+Uso: python benchmarks/bench_copiado.py [--facturas 500] [--kb 200]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from copiado import MODOS_COPIA, copiar_arbol, ruta_almacen_para  # noqa: E402
+
+
+def generar_origen(ruta, facturas, kb):
+    """Crea carpetas de factura con XML, JSON y un PDF de soporte."""
+    for n in range(1, facturas + 1):
+        carpeta = os.path.join(ruta, f"AttachedDocument_F-010-{n}")
+        os.makedirs(carpeta)
+        with open(os.path.join(carpeta, f"AttachedDocument_F-010-{n}.xml"), 'wb') as f:
+            f.write(os.urandom(kb * 1024 // 4))
+        with open(os.path.join(carpeta, f"FE{n}.json"), 'wb') as f:
+            f.write(os.urandom(kb * 1024 // 8))
+        with open(os.path.join(carpeta, "soporte.pdf"), 'wb') as f:
+            f.write(os.urandom(kb * 1024))
+
+
+def medir_copytree(origen, destino):
+    inicio = time.perf_counter()
+    escritos = 0
+    for carpeta in os.listdir(origen):
+        shutil.copytree(os.path.join(origen, carpeta), os.path.join(destino, carpeta), dirs_exist_ok=True)
+        for raiz, _, archivos in os.walk(os.path.join(destino, carpeta)):
+            escritos += sum(os.path.getsize(os.path.join(raiz, a)) for a in archivos)
+    return escritos, time.perf_counter() - inicio
+
+
+def medir_modo(origen, destino, modo, ruta_almacen):
+    inicio = time.perf_counter()
+    escritos = 0
+    for carpeta in os.listdir(origen):
+        resultado = copiar_arbol(os.path.join(origen, carpeta), os.path.join(destino, carpeta),
+                                 modo=modo, ruta_almacen=ruta_almacen)
+        escritos += resultado.bytes_copiados
+    return escritos, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--facturas', type=int, default=500)
+    parser.add_argument('--kb', type=int, default=200, help="Tamaño del PDF de soporte en KB")
+    parser.add_argument('--directorio', default=None, help="Directorio de trabajo (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directorio) as tmp:
+        origen = os.path.join(tmp, 'origen')
+        generar_origen(origen, args.facturas, args.kb)
+
+        print(f"{'modo':<10}{'mes':>5}{'MB escritos':>14}{'segundos':>11}")
+        for mes in (1, 2):
+            escritos, segundos = medir_copytree(origen, os.path.join(tmp, 'copytree', f"mes{mes}"))
+            print(f"{'copytree':<10}{mes:>5}{escritos / 1e6:>14.1f}{segundos:>11.2f}")
+
+        for modo in MODOS_COPIA:
+            raiz = os.path.join(tmp, modo)
+            for mes in (1, 2):
+                destino = os.path.join(raiz, f"mes{mes}")
+                escritos, segundos = medir_modo(origen, destino, modo, ruta_almacen_para(destino))
+                print(f"{modo:<10}{mes:>5}{escritos / 1e6:>14.1f}{segundos:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Mide validador_rips.py sobre hojas sintéticas de usuarios y consultas, con algunos errores sembrados.
+
+Uso: python benchmarks/bench_validador_rips.py [--usuarios 200000] [--consultas 2000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capita  # noqa: E402
+import validador_rips  # noqa: E402
+from bench_capita import generar_consultas  # noqa: E402
+
+
+def generar_usuarios(usuarios, semilla=7):
+    """Hoja de usuarios sintética, como la lee capita (todo texto)."""
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'tipoDocumentoIdentificacion': 'CC',
+        'numDocumentoIdentificacion': (np.arange(usuarios) + 10**7).astype(str),
+        'tipoUsuario': '04',
+        'fechaNacimiento': '1980-01-01',
+        'codSexo': rng.choice(['H', 'M'], usuarios),
+        'codPaisResidencia': '170',
+        'codMunicipioResidencia': rng.choice(['76001', '05001', '11001'], usuarios),
+        'codZonaTerritorialResidencia': '01',
+        'incapacidad': 'NO',
+        'codPaisOrigen': '170',
+        'consecutivo': (np.arange(usuarios) + 1).astype(str),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=200000)
+    parser.add_argument('--consultas', type=int, default=2000000)
+    args = parser.parse_args()
+
+    usuarios = generar_usuarios(args.usuarios)
+    consultas = generar_consultas(args.usuarios, args.consultas).astype(str)
+    # El documento de cada consulta es el de su usuario, salvo los errores sembrados
+    consultas['numDocumentoIdentificacion'] = (consultas['consecutivoUsuario'].astype('int64') - 1 + 10**7).astype(str)
+    sembrados = np.arange(0, args.consultas, 1000)
+    consultas.loc[sembrados, 'codDiagnosticoPrincipal'] = 'A0'
+    consultas.loc[sembrados + 1, 'consecutivoUsuario'] = str(args.usuarios + 1)
+    consultas.loc[sembrados + 2, 'numDocumentoIdentificacion'] = '1'
+
+    # Como quedan las hojas después de capita.leer_hojas_texto
+    inicio = time.perf_counter()
+    usuarios = capita.compactar(capita.normalizar_codigos(usuarios))
+    consultas = capita.compactar(capita.normalizar_codigos(consultas))
+    print(f"normalización y category: {time.perf_counter() - inicio:.2f}s")
+
+    inicio = time.perf_counter()
+    errores = validador_rips.validar_libro({'numDocumentoIdObligado': '900123456', 'numFactura': 'FE1'},
+                                           usuarios, {'consultas': consultas})
+    segundos = time.perf_counter() - inicio
+    filas = len(usuarios) + len(consultas)
+    print(f"{filas} filas validadas en {segundos:.2f}s ({filas / segundos:,.0f} filas/s), "
+          f"{len(errores)} errores (sembrados: {3 * len(sembrados)})")
+    for linea in validador_rips.resumen_errores(errores):
+        print(f"  • {linea}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Comprueba que la verificación SHA-256 del radicador detecta una copia dañada al reanudar.
+
+Radica un árbol sintético con --verificar, daña un byte de una copia
+conservando su tamaño y mtime (lo que el caché de hashes no puede distinguir
+por clave), y reanuda varias veces: la primera reanudación debe detectarla y
+borrarla, la segunda volver a copiarla y aceptarla, y el manifiesto debe
+terminar con el hash del origen.
+
+Uso: python benchmarks/comprobar_verificacion.py [--facturas 60] [--factura 58]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import arbol_sintetico  # noqa: E402
+import radicador  # noqa: E402
+from copiado import hash_archivo  # noqa: E402
+from verificacion import leer_manifiesto  # noqa: E402
+
+
+def radicar(arbol, destino, reanudar):
+    """Una ejecución de radicar --verificar; devuelve el procesador para revisar sus contadores."""
+    procesador = radicador.ProcesadorFacturas(
+        ruta_xlsx=os.path.join(arbol, 'facturas.xlsx'), columna='Factura', ruta_destino=destino,
+        ruta_soportes=os.path.join(arbol, 'soportes'), ruta_facturas=os.path.join(arbol, 'carpetas'),
+        reanudar=reanudar, verificar=True)
+    procesador.procesar_todas()
+    return procesador
+
+
+def danar_conservando_clave(ruta):
+    """Cambia un byte del archivo y le devuelve su mtime: mismo tamaño, mismo mtime, otro contenido."""
+    estado = os.stat(ruta)
+    with open(ruta, 'r+b') as f:
+        f.seek(estado.st_size // 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+
+
+def hash_en_manifiesto(ruta_manifiesto, ruta):
+    for digest, ruta_archivo in leer_manifiesto(ruta_manifiesto):
+        if os.path.normpath(ruta_archivo) == os.path.normpath(ruta):
+            return digest
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--facturas', type=int, default=60)
+    parser.add_argument('--factura', type=int, default=58, help="Factura cuyo soporte se daña")
+    args = parser.parse_args()
+    logging.getLogger('radicador').setLevel(logging.ERROR)
+
+    trabajo = tempfile.mkdtemp(prefix='verificacion_')
+    fallas = []
+
+    def comprobar(condicion, mensaje):
+        print(f"{'✅' if condicion else '❌'} {mensaje}")
+        if not condicion:
+            fallas.append(mensaje)
+
+    try:
+        arbol = arbol_sintetico.generar_arbol(os.path.join(trabajo, 'arbol'), args.facturas)
+        destino = os.path.join(trabajo, 'destino')
+        origen = os.path.join(arbol, 'soportes', f"FE{args.factura}", 'soporte.pdf')
+        copia = os.path.join(destino, 'Soportes', f"FE{args.factura}", 'soporte.pdf')
+        with open(os.devnull, 'w') as nulo:
+            # Sin las barras de progreso ni los mensajes de cada ejecución
+            salida, errores, sys.stdout, sys.stderr = sys.stdout, sys.stderr, nulo, nulo
+            try:
+                primera = radicar(arbol, destino, reanudar=False)
+                danar_conservando_clave(copia)
+                deteccion = radicar(arbol, destino, reanudar=True)
+                existia_tras_deteccion = os.path.exists(copia)
+                recopia = radicar(arbol, destino, reanudar=True)
+                estable = radicar(arbol, destino, reanudar=True)
+            finally:
+                sys.stdout, sys.stderr = salida, errores
+
+        comprobar(primera.archivos_con_diferencias == 0, "primera radicación sin diferencias")
+        comprobar(deteccion.archivos_con_diferencias == 1,
+                  f"la copia dañada se detecta al reanudar ({deteccion.archivos_con_diferencias} diferencias)")
+        comprobar(not existia_tras_deteccion, "la copia dañada se borra")
+        comprobar(recopia.archivos_con_diferencias == 0 and os.path.exists(copia),
+                  f"la siguiente reanudación la vuelve a copiar y la acepta ({recopia.archivos_con_diferencias} diferencias)")
+        comprobar(estable.archivos_con_diferencias == 0, "una reanudación más sigue sin diferencias")
+        comprobar(hash_en_manifiesto(estable.ruta_manifiesto, copia) == hash_archivo(origen),
+                  "el manifiesto tiene el hash del origen")
+    finally:
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Suite de benchmarks de los scripts de carpetas sobre árboles sintéticos.
+
+Cada benchmark corre en un proceso aparte (para medir el pico de RSS de forma
+aislada) sobre un árbol generado en tmpfs (/dev/shm si existe). Los resultados
+se guardan en benchmarks/resultados/<fecha>.json y se comparan con la ejecución
+anterior de la misma escala.
+
+Uso:
+    python benchmarks/suite.py --escala 1k
+    python benchmarks/suite.py --escala 10k --solo main radicador
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import arbol_sintetico  # noqa: E402
+
+ESCALAS = {'1k': 1000, '10k': 10000, '100k': 100000}
+CARPETA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+
+def _contar(ruta):
+    """Archivos y bytes bajo una ruta (lo que produjo el benchmark)."""
+    archivos = bytes_totales = 0
+    for raiz, _, nombres in os.walk(ruta):
+        for nombre in nombres:
+            archivos += 1
+            bytes_totales += os.path.getsize(os.path.join(raiz, nombre))
+    return archivos, bytes_totales
+
+
+def _numeros(arbol):
+    from lector_facturas import leer_facturas
+    return leer_facturas(os.path.join(arbol, 'facturas.xlsx'), 'Factura', usar_cache=False)
+
+
+# Cada benchmark recibe (árbol, trabajo) y devuelve la ruta cuyo contenido cuenta como salida
+
+def bench_main(arbol, trabajo):
+    import main
+    destino = os.path.join(trabajo, 'destino')
+    main.procesar_facturas(os.path.join(arbol, 'xml'), destino, os.path.join(arbol, 'json'))
+    return destino
+
+
+def bench_faltantes(arbol, trabajo):
+    import faltantes_febrero
+    from indice_facturas import IndiceFacturas
+    destino = os.path.join(trabajo, 'destino')
+    indice = IndiceFacturas(os.path.join(trabajo, 'indice.json'))
+    indice.actualizar(os.path.join(arbol, 'xml'), os.path.join(arbol, 'json'))
+    no_encontradas = []
+    for numero in _numeros(arbol):
+        faltantes_febrero.procesar_factura(numero, os.path.join(arbol, 'xml'), os.path.join(arbol, 'json'),
+                                           destino, no_encontradas, indice=indice)
+    return destino
+
+
+def bench_radicador(arbol, trabajo):
+    import logging
+    import radicador
+    logging.getLogger('radicador').setLevel(logging.ERROR)
+    destino = os.path.join(trabajo, 'destino')
+    procesador = radicador.ProcesadorFacturas(
+        ruta_xlsx=os.path.join(arbol, 'facturas.xlsx'), columna='Factura', ruta_destino=destino,
+        ruta_soportes=os.path.join(arbol, 'soportes'), ruta_facturas=os.path.join(arbol, 'carpetas'))
+    procesador.procesar_todas()
+    return destino
+
+
+def bench_estructurador(arbol, trabajo):
+    import estructurador
+    destino = os.path.join(trabajo, 'destino')
+    estructurador.copiar_carpetas(_numeros(arbol), os.path.join(arbol, 'carpetas'), destino)
+    return destino
+
+
+def bench_prueba(arbol, trabajo):
+    import prueba
+    # organizar_carpetas mueve carpetas: se trabaja sobre una copia hecha antes de medir
+    return prueba.organizar_carpetas, os.path.join(trabajo, 'carpetas')
+
+
+def bench_capita(arbol, trabajo):
+    import capita
+    salida = os.path.join(trabajo, 'salida')
+    os.makedirs(salida)
+    encabezado, usuarios, servicios = capita.leer_libro(os.path.join(arbol, 'capita.xlsx'))
+    capita.escribir_factura_json(os.path.join(salida, f"{encabezado['numFactura']}.json"), encabezado,
+                                 capita.iterar_usuarios(usuarios, servicios))
+    return salida
+
+
+def bench_capita_lote(arbol, trabajo):
+    import capita
+    salida = os.path.join(trabajo, 'salida')
+    capita.convertir_libro(os.path.join(arbol, 'capita_lote.xlsx'), carpeta_salida=salida)
+    return salida
+
+
+def bench_metadatos(arbol, trabajo):
+    from main import listar_xml
+    from metadatos_xml import CacheMetadatos
+    salida = os.path.join(trabajo, 'salida')
+    os.makedirs(salida)
+    cache = CacheMetadatos(os.path.join(salida, 'metadatos_xml.json'))
+    cache.actualizar(listar_xml(os.path.join(arbol, 'xml')), raiz=os.path.join(arbol, 'xml'))
+    cache.guardar()
+    return salida
+
+
+BENCHMARKS = {
+    'main': bench_main,
+    'faltantes': bench_faltantes,
+    'radicador': bench_radicador,
+    'estructurador': bench_estructurador,
+    'prueba': bench_prueba,
+    'capita': bench_capita,
+    'capita_lote': bench_capita_lote,
+    'metadatos': bench_metadatos,
+}
+
+
+def _pico_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB y macOS en bytes
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+def ejecutar_uno(nombre, arbol, trabajo):
+    """Corre un benchmark en este proceso y devuelve sus métricas."""
+    os.chdir(trabajo)  # Logs, índices y cachés quedan en el directorio de trabajo
+    funcion = BENCHMARKS[nombre]
+
+    preparado = None
+    if nombre == 'prueba':
+        shutil.copytree(os.path.join(arbol, 'carpetas'), os.path.join(trabajo, 'carpetas'))
+        preparado = funcion(arbol, trabajo)
+
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        inicio = time.perf_counter()
+        if preparado:
+            organizar, ruta = preparado
+            organizar(ruta)
+            salida = ruta
+        else:
+            salida = funcion(arbol, trabajo)
+        segundos = time.perf_counter() - inicio
+
+    archivos, bytes_salida = _contar(salida)
+    return {
+        'benchmark': nombre,
+        'segundos': round(segundos, 3),
+        'archivos': archivos,
+        'mb': round(bytes_salida / 1e6, 2),
+        'archivos_por_s': round(archivos / segundos, 1) if segundos else None,
+        'mb_por_s': round(bytes_salida / 1e6 / segundos, 2) if segundos else None,
+        'pico_rss_mb': _pico_rss_mb(),
+    }
+
+
+def _ultima_ejecucion(escala):
+    anteriores = sorted(glob.glob(os.path.join(CARPETA_RESULTADOS, f"*_{escala}.json")))
+    if not anteriores:
+        return {}
+    with open(anteriores[-1], 'r', encoding='utf-8') as f:
+        return {r['benchmark']: r for r in json.load(f)['resultados']}
+
+
+def _directorio_rapido():
+    return '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los scripts de carpetas")
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='1k')
+    parser.add_argument('--solo', nargs='*', choices=sorted(BENCHMARKS), help="Benchmarks a correr")
+    parser.add_argument('--directorio', default=None, help="Dónde generar el árbol (por defecto tmpfs)")
+    parser.add_argument('--ejecutar-uno', nargs=3, metavar=('NOMBRE', 'ARBOL', 'TRABAJO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ejecutar_uno:
+        print(json.dumps(ejecutar_uno(*args.ejecutar_uno)))
+        return
+
+    nombres = args.solo or list(BENCHMARKS)
+    anterior = _ultima_ejecucion(args.escala)
+    resultados = []
+
+    with tempfile.TemporaryDirectory(dir=args.directorio or _directorio_rapido()) as tmp:
+        arbol = os.path.join(tmp, 'arbol')
+        inicio = time.perf_counter()
+        arbol_sintetico.generar_arbol(arbol, ESCALAS[args.escala])
+        print(f"Árbol de {args.escala} facturas generado en {time.perf_counter() - inicio:.1f}s ({arbol})\n")
+
+        print(f"{'benchmark':<15}{'seg':>9}{'archivos/s':>13}{'MB/s':>9}{'RSS MB':>9}{'vs anterior':>14}")
+        for nombre in nombres:
+            trabajo = os.path.join(tmp, f"trabajo_{nombre}")
+            os.makedirs(trabajo)
+            proceso = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--ejecutar-uno', nombre, arbol, trabajo],
+                capture_output=True, text=True)
+            if proceso.returncode != 0:
+                print(f"{nombre:<15} falló:\n{proceso.stderr}")
+                continue
+            resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+            resultados.append(resultado)
+
+            comparacion = ''
+            if nombre in anterior and anterior[nombre]['segundos']:
+                cambio = resultado['segundos'] / anterior[nombre]['segundos'] - 1
+                comparacion = f"{cambio:+.1%}"
+            rss = f"{resultado['pico_rss_mb']:.0f}" if resultado['pico_rss_mb'] is not None else '-'
+            print(f"{nombre:<15}{resultado['segundos']:>9.2f}{resultado['archivos_por_s'] or 0:>13.0f}"
+                  f"{resultado['mb_por_s'] or 0:>9.1f}{rss:>9}{comparacion:>14}")
+            shutil.rmtree(trabajo, ignore_errors=True)
+
+    os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+    ruta_resultados = os.path.join(CARPETA_RESULTADOS, f"{datetime.now():%Y%m%d_%H%M%S}_{args.escala}.json")
+    with open(ruta_resultados, 'w', encoding='utf-8') as f:
+        json.dump({'escala': args.escala, 'fecha': datetime.now().isoformat(timespec='seconds'),
+                   'python': sys.version.split()[0], 'resultados': resultados}, f, indent=2)
+    print(f"\nResultados guardados en {ruta_resultados}")
+
+
+if __name__ == '__main__':
+    main()
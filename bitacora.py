@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Set
+
+
+# Etapas que se registran por factura en radicador.ProcesadorFacturas
+ETAPA_SOPORTE = 'soporte'
+ETAPA_FACTURA = 'factura'
+ETAPA_ARCHIVOS = 'archivos'
+ETAPA_COMPLETADA = 'completada'
+ETAPA_VERIFICACION = 'verificacion'
+
+
+class BitacoraEjecucion:
+    """Bitácora JSONL (solo se agregan líneas) con el estado de cada factura por etapa.
+
+    Cada línea se escribe y se vacía al disco apenas termina la etapa, de modo que
+    si la ejecución se interrumpe la bitácora refleja exactamente lo que se alcanzó
+    a hacer y una ejecución con reanudar=True puede continuar desde ahí.
+    """
+
+    def __init__(self, ruta: Path, reanudar: bool = False):
+        self.ruta = Path(ruta)
+        self._lock = threading.Lock()
+        # {factura: {etapa: estado}}
+        self.estados: Dict[str, Dict[str, str]] = {}
+
+        if reanudar:
+            self._cargar()
+        elif self.ruta.exists():
+            self.ruta.unlink()
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._archivo = open(self.ruta, 'a', encoding='utf-8')
+
+    def _cargar(self) -> None:
+        """Reproduce la bitácora existente; una línea final truncada se ignora"""
+        if not self.ruta.exists():
+            return
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                self.estados.setdefault(registro['factura'], {})[registro['etapa']] = registro['estado']
+
+    def registrar(self, factura: str, etapa: str, estado: str = 'ok', detalle: str = '') -> None:
+        """Agrega el estado de una etapa de la factura"""
+        registro = {
+            'factura': factura,
+            'etapa': etapa,
+            'estado': estado,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+        }
+        if detalle:
+            registro['detalle'] = detalle
+
+        with self._lock:
+            self.estados.setdefault(factura, {})[etapa] = estado
+            self._archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            self._archivo.flush()
+
+    def etapa_completada(self, factura: str, etapa: str) -> bool:
+        """Indica si la etapa de la factura terminó bien en esta u otra ejecución"""
+        return self.estados.get(factura, {}).get(etapa) == 'ok'
+
+    def completadas(self) -> Set[str]:
+        """Facturas que terminaron todas sus etapas"""
+        return {factura for factura, etapas in self.estados.items()
+                if etapas.get(ETAPA_COMPLETADA) == 'ok'}
+
+    def cerrar(self) -> None:
+        """Cierra el archivo de la bitácora"""
+        with self._lock:
+            if not self._archivo.closed:
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+                self._archivo.close()
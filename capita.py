@@ -1,6 +1,188 @@
+import csv
 import os
+import sys
+import numpy as np
 import pandas as pd
 import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Conversiones que se aplican a cada campo, una vez por columna
+TEXTO = 'texto'              # Se deja el texto tal cual
+OPCIONAL = 'opcional'        # Cadena vacía -> None
+ENTERO = 'entero'            # Solo dígitos -> int, en otro caso 0
+VALOR = 'valor'              # Dígitos con punto decimal -> int, en otro caso 0
+DOS_DIGITOS = 'dos_digitos'  # Relleno con ceros a la izquierda hasta 2 posiciones
+
+CAMPOS_USUARIO = [
+    ('tipoDocumentoIdentificacion', TEXTO),
+    ('numDocumentoIdentificacion', TEXTO),
+    ('tipoUsuario', DOS_DIGITOS),
+    ('fechaNacimiento', TEXTO),
+    ('codSexo', TEXTO),
+    ('codPaisResidencia', TEXTO),
+    ('codMunicipioResidencia', TEXTO),
+    ('codZonaTerritorialResidencia', TEXTO),
+    ('incapacidad', TEXTO),
+    ('codPaisOrigen', TEXTO),
+    ('consecutivo', ENTERO),
+    # No incluir 'servicios' aquí, se agrega dinámicamente después
+]
+
+# Campos de cada tipo de servicio RIPS (el 'consecutivo' se calcula por usuario)
+CAMPOS_SERVICIO = {
+    'consultas': [
+        ('codPrestador', TEXTO),
+        ('fechaInicioAtencion', TEXTO),
+        ('numAutorizacion', OPCIONAL),
+        ('codConsulta', TEXTO),
+        ('modalidadGrupoServicioTecSal', TEXTO),
+        ('grupoServicios', TEXTO),
+        ('codServicio', ENTERO),
+        ('finalidadTecnologiaSalud', TEXTO),
+        ('causaMotivoAtencion', TEXTO),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('codDiagnosticoRelacionado1', OPCIONAL),
+        ('codDiagnosticoRelacionado2', OPCIONAL),
+        ('codDiagnosticoRelacionado3', OPCIONAL),
+        ('tipoDiagnosticoPrincipal', TEXTO),
+        ('tipoDocumentoIdentificacion', TEXTO),
+        ('numDocumentoIdentificacion', TEXTO),
+        ('vrServicio', VALOR),
+        ('conceptoRecaudo', TEXTO),
+        ('valorPagoModerador', VALOR),
+        ('numFEVPagoModerador', TEXTO),
+    ],
+    'procedimientos': [
+        ('codPrestador', TEXTO),
+        ('fechaInicioAtencion', TEXTO),
+        ('idMIPRES', OPCIONAL),
+        ('numAutorizacion', OPCIONAL),
+        ('codProcedimiento', TEXTO),
+        ('viaIngresoServicioSalud', TEXTO),
+        ('modalidadGrupoServicioTecSal', TEXTO),
+        ('grupoServicios', TEXTO),
+        ('codServicio', ENTERO),
+        ('finalidadTecnologiaSalud', TEXTO),
+        ('tipoDocumentoIdentificacion', TEXTO),
+        ('numDocumentoIdentificacion', TEXTO),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('codDiagnosticoRelacionado', OPCIONAL),
+        ('codComplicacion', OPCIONAL),
+        ('vrServicio', VALOR),
+        ('conceptoRecaudo', TEXTO),
+        ('valorPagoModerador', VALOR),
+        ('numFEVPagoModerador', TEXTO),
+    ],
+    'urgencias': [
+        ('codPrestador', TEXTO),
+        ('fechaInicioAtencion', TEXTO),
+        ('causaMotivoAtencion', TEXTO),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('codDiagnosticoPrincipalE', TEXTO),
+        ('codDiagnosticoRelacionadoE1', OPCIONAL),
+        ('codDiagnosticoRelacionadoE2', OPCIONAL),
+        ('codDiagnosticoRelacionadoE3', OPCIONAL),
+        ('condicionDestinoUsuarioEgreso', TEXTO),
+        ('codDiagnosticoCausaMuerte', OPCIONAL),
+        ('fechaEgreso', TEXTO),
+    ],
+    'hospitalizacion': [
+        ('codPrestador', TEXTO),
+        ('viaIngresoServicioSalud', TEXTO),
+        ('fechaInicioAtencion', TEXTO),
+        ('numAutorizacion', OPCIONAL),
+        ('causaMotivoAtencion', TEXTO),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('codDiagnosticoPrincipalE', TEXTO),
+        ('codDiagnosticoRelacionadoE1', OPCIONAL),
+        ('codDiagnosticoRelacionadoE2', OPCIONAL),
+        ('codDiagnosticoRelacionadoE3', OPCIONAL),
+        ('codComplicacion', OPCIONAL),
+        ('condicionDestinoUsuarioEgreso', TEXTO),
+        ('codDiagnosticoCausaMuerte', OPCIONAL),
+        ('fechaEgreso', TEXTO),
+    ],
+    'recienNacidos': [
+        ('codPrestador', TEXTO),
+        ('tipoDocumentoIdentificacion', TEXTO),
+        ('numDocumentoIdentificacion', TEXTO),
+        ('fechaNacimiento', TEXTO),
+        ('edadGestacional', ENTERO),
+        ('numConsultasCPrenatal', ENTERO),
+        ('codSexoBiologico', TEXTO),
+        ('peso', VALOR),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('condicionDestinoUsuarioEgreso', TEXTO),
+        ('codDiagnosticoCausaMuerte', OPCIONAL),
+        ('fechaEgreso', TEXTO),
+    ],
+    'medicamentos': [
+        ('codPrestador', TEXTO),
+        ('numAutorizacion', OPCIONAL),
+        ('idMIPRES', OPCIONAL),
+        ('fechaDispensAdmon', TEXTO),
+        ('codDiagnosticoPrincipal', TEXTO),
+        ('codDiagnosticoRelacionado', OPCIONAL),
+        ('tipoMedicamento', TEXTO),
+        ('codTecnologiaSalud', TEXTO),
+        ('nomTecnologiaSalud', OPCIONAL),
+        ('concentracionMedicamento', ENTERO),
+        ('unidadMedida', ENTERO),
+        ('formaFarmaceutica', OPCIONAL),
+        ('unidadMinDispensa', ENTERO),
+        ('cantidadMedicamento', VALOR),
+        ('diasTratamiento', ENTERO),
+        ('tipoDocumentoIdentificacion', TEXTO),
+        ('numDocumentoIdentificacion', TEXTO),
+        ('vrUnitMedicamento', VALOR),
+        ('vrServicio', VALOR),
+        ('conceptoRecaudo', TEXTO),
+        ('valorPagoModerador', VALOR),
+        ('numFEVPagoModerador', TEXTO),
+    ],
+    'otrosServicios': [
+        ('codPrestador', TEXTO),
+        ('numAutorizacion', OPCIONAL),
+        ('idMIPRES', OPCIONAL),
+        ('fechaSuministroTecnologia', TEXTO),
+        ('tipoOS', TEXTO),
+        ('codTecnologiaSalud', TEXTO),
+        ('nomTecnologiaSalud', TEXTO),
+        ('cantidadOS', ENTERO),
+        ('tipoDocumentoIdentificacion', TEXTO),
+        ('numDocumentoIdentificacion', TEXTO),
+        ('vrUnitOS', VALOR),
+        ('vrServicio', VALOR),
+        ('conceptoRecaudo', TEXTO),
+        ('valorPagoModerador', VALOR),
+        ('numFEVPagoModerador', TEXTO),
+    ],
+}
+
+# Columna que reparte usuarios y servicios entre las facturas de un libro con varias transacciones
+COLUMNA_FACTURA = 'numFactura'
+
+# Catálogos locales de la tabla de referencia del MSPS (opcionales): un CSV por
+# catálogo con el código en la primera columna, por ejemplo exportado de SISPRO.
+# Se leen una sola vez; los códigos del libro que están en el catálogo pasan a
+# ser el mismo objeto de texto del catálogo y validador_rips rechaza los que no.
+CARPETA_CATALOGOS = os.environ.get('RIPS_CATALOGOS',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalogos'))
+CATALOGO_MUNICIPIOS = 'municipios'
+CATALOGO_CIE10 = 'cie10'
+
+# Palabra clave en el nombre de la hoja (en minúsculas) -> tipo de servicio
+HOJAS_SERVICIO = [
+    ('consultas', 'consultas'),
+    ('procedimientos', 'procedimientos'),
+    ('urgencias', 'urgencias'),
+    ('hospitaliz', 'hospitalizacion'),
+    ('recien', 'recienNacidos'),
+    ('medicamentos', 'medicamentos'),
+    ('otros', 'otrosServicios'),
+]
+
 
 def main():
     # Solicitar la ruta del archivo Excel
@@ -10,164 +192,490 @@ def main():
     if not validar_ruta(ruta_excel):
         print("❌ La ruta del archivo Excel no existe.")
         return
-    
+
+    compacto = input("¿Generar JSON compacto, sin sangría? (s/n): ").strip().lower() == 's'
+    forzar = input("¿Generar el JSON aunque la validación RIPS encuentre errores? (s/n): ").strip().lower() == 's'
+
+    convertir_libro(ruta_excel, compacto, forzar=forzar)
+
+
+def convertir_libro(ruta_excel, compacto=False, carpeta_salida=None, validar=True, forzar=False,
+                    trabajadores=None, executor=None):
+    """Convierte el libro RIPS en <numFactura>.json (en carpeta_salida o en el directorio actual).
+
+    Con validar=True el libro se valida antes de serializar (ver validador_rips.py);
+    si hay errores se escriben en <numFactura>_errores_rips.csv y el JSON solo se
+    genera con forzar=True. Devuelve la ruta del JSON, o None si no se generó.
+
+    Si la hoja de transacciones trae varias facturas distintas (no solo filas
+    repetidas de la misma, que se convierten con la primera), el libro leído se reparte
+    por numFactura y se escribe un JSON por factura en un pool de procesos (ver
+    convertir_lote); en ese caso devuelve la carpeta de salida si se generaron todos.
+    """
+    # Leer el libro una sola vez
+    df_transacciones, df_usuarios, hojas_servicio = leer_hojas_texto(ruta_excel)
+    if carpeta_salida:
+        os.makedirs(carpeta_salida, exist_ok=True)
+
+    facturas = (df_transacciones[COLUMNA_FACTURA].nunique()
+                if df_transacciones is not None and COLUMNA_FACTURA in df_transacciones else 0)
+    if facturas > 1:
+        carpeta_salida = carpeta_salida or '.'
+        resultados = convertir_lote(df_transacciones, df_usuarios, hojas_servicio, carpeta_salida, compacto,
+                                    validar, forzar, trabajadores, executor)
+        generados = sum(1 for _, ruta, _, _ in resultados if ruta)
+        print(f"✅ {generados} de {facturas} facturas convertidas en {carpeta_salida}")
+        return carpeta_salida if resultados and generados == len(resultados) else None
+
+    encabezado = encabezado_de(df_transacciones.iloc[0] if df_transacciones is not None and not df_transacciones.empty
+                               else {})
+
+    # Generar el nombre del archivo JSON de salida
+    output_file = f"{encabezado['numFactura']}.json"
+    if carpeta_salida:
+        output_file = os.path.join(carpeta_salida, output_file)
+    ruta, total, errores = convertir_factura(encabezado, df_usuarios, hojas_servicio, output_file, compacto,
+                                             validar, forzar)
+    if errores is not None:
+        if errores.empty:
+            print("✅ Validación RIPS sin errores")
+        else:
+            import validador_rips
+
+            print(f"⚠️ Validación RIPS: {len(errores)} errores, detalle en {ruta_errores_rips(output_file)}")
+            for linea in validador_rips.resumen_errores(errores):
+                print(f"  • {linea}")
+    if ruta is None:
+        print("❌ No se generó el JSON; corrija el libro o genere de todos modos (forzar)")
+        return None
+
+    print(f"✅ Archivo JSON creado exitosamente en {output_file} ({total} usuarios)")
+    return output_file
+
+
+def ruta_errores_rips(ruta_json):
+    """<numFactura>_errores_rips.csv junto al JSON de la factura."""
+    return f"{os.path.splitext(ruta_json)[0]}_errores_rips.csv"
+
+
+def convertir_factura(encabezado, df_usuarios, hojas_servicio, output_file, compacto=False, validar=True,
+                      forzar=False):
+    """Valida y escribe una factura ya leída, sin imprimir.
+
+    Devuelve (ruta del JSON o None si la validación lo impidió, usuarios escritos,
+    DataFrame de errores o None si no se validó).
+    """
+    errores = None
+    if validar:
+        import validador_rips
+
+        errores = validador_rips.validar_libro(encabezado, df_usuarios, hojas_servicio)
+        if not errores.empty:
+            errores.to_csv(ruta_errores_rips(output_file), index=False)
+            if not forzar:
+                return None, 0, errores
+
+    usuarios = construir_usuarios(df_usuarios) if df_usuarios is not None else []
+    servicios_por_tipo = {tipo: construir_servicios(df, tipo) for tipo, df in hojas_servicio.items()}
+
+    # Guardar en JSON usuario por usuario, sin armar la factura completa en memoria
+    total = escribir_factura_json(output_file, encabezado, iterar_usuarios(usuarios, servicios_por_tipo),
+                                  indent=None if compacto else 4)
+    return output_file, total, errores
+
+
+def _convertir_factura_tarea(tarea):
+    """Adaptador para el pool de procesos: devuelve (numFactura, ruta o None, usuarios, cantidad de errores)"""
+    encabezado = tarea[0]
+    ruta, total, errores = convertir_factura(*tarea)
+    return encabezado['numFactura'], ruta, total, 0 if errores is None else len(errores)
+
+
+def compactar(df):
+    """Pasa a category las columnas con pocos valores distintos (códigos, fechas, prestador, numFactura).
+
+    Ocupan una fracción de la memoria y se envían mucho más rápido a los
+    procesos del pool; capita y validador_rips las vuelven a texto al convertir.
+    """
+    for columna in df.columns:
+        if isinstance(df[columna].dtype, pd.CategoricalDtype):
+            continue
+        codigos, unicos = pd.factorize(df[columna])
+        if len(unicos) <= len(df) // 2:
+            df[columna] = pd.Categorical.from_codes(codigos, unicos)
+    return df
+
+
+def particionar(df):
+    """{numFactura: filas de la hoja}, en una sola pasada; cada parte conserva el índice de la hoja."""
+    if df is None:
+        return {}
+    grupos = df.groupby(COLUMNA_FACTURA, sort=False, observed=True).indices
+    return {str(factura): df.take(posiciones) for factura, posiciones in grupos.items()}
+
+
+def convertir_lote(df_transacciones, df_usuarios, hojas_servicio, carpeta_salida='.', compacto=False,
+                   validar=True, forzar=False, trabajadores=None, executor=None):
+    """Escribe un JSON por factura de la hoja de transacciones, repartiendo las hojas por numFactura.
+
+    Usuarios y servicios deben traer la columna numFactura. Cada factura se
+    valida y serializa en un pool de procesos (si se recibe executor se usa ese
+    y no se cierra). Devuelve [(numFactura, ruta o None, usuarios, errores)].
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    hojas = dict(hojas_servicio, usuarios=df_usuarios) if df_usuarios is not None else dict(hojas_servicio)
+    sin_columna = [nombre for nombre, df in hojas.items() if COLUMNA_FACTURA not in df]
+    if sin_columna:
+        print(f"❌ El libro trae {df_transacciones[COLUMNA_FACTURA].nunique()} facturas, pero las hojas {', '.join(sin_columna)} "
+              f"no tienen la columna {COLUMNA_FACTURA} para repartirlas")
+        return []
+
+    encabezados = {}
+    for fila in df_transacciones.to_dict('records'):
+        encabezado = encabezado_de(fila)
+        if encabezado['numFactura'] in encabezados:
+            print(f"⚠️ Factura {encabezado['numFactura']} repetida en la hoja de transacciones; se usa la primera")
+            continue
+        encabezados[encabezado['numFactura']] = encabezado
+
+    # Una sola pasada por hoja: {hoja: {numFactura: filas}}
+    particiones = {nombre: particionar(df) for nombre, df in hojas.items()}
+    for nombre, grupos in particiones.items():
+        huerfanas = sum(len(filas) for factura, filas in grupos.items() if factura not in encabezados)
+        if huerfanas:
+            print(f"⚠️ {nombre}: {huerfanas} filas con un numFactura que no está en la hoja de transacciones")
+
+    def tareas():
+        for factura, encabezado in encabezados.items():
+            df_usuarios_factura = particiones.get('usuarios', {}).get(factura)
+            if df_usuarios is not None and df_usuarios_factura is None:
+                df_usuarios_factura = df_usuarios.iloc[0:0]
+            servicios = {tipo: grupos[factura] for tipo, grupos in particiones.items()
+                         if tipo != 'usuarios' and factura in grupos}
+            yield (encabezado, df_usuarios_factura, servicios, os.path.join(carpeta_salida, f"{factura}.json"),
+                   compacto, validar, forzar)
+
+    trabajadores = trabajadores or os.cpu_count() or 1
+    if trabajadores == 1 or len(encabezados) < 2:
+        resultados = list(map(_convertir_factura_tarea, tareas()))
+    elif executor is not None:
+        resultados = list(executor.map(_convertir_factura_tarea, tareas()))
+    else:
+        with ProcessPoolExecutor(max_workers=min(trabajadores, len(encabezados))) as executor:
+            resultados = list(executor.map(_convertir_factura_tarea, tareas()))
+
+    for factura, ruta, total, errores in resultados:
+        if ruta:
+            aviso = f", {errores} errores RIPS" if errores else ""
+            print(f"✅ {factura}: {ruta} ({total} usuarios{aviso})")
+        else:
+            print(f"❌ {factura}: {errores} errores RIPS, detalle en "
+                  f"{ruta_errores_rips(os.path.join(carpeta_salida, f'{factura}.json'))}")
+    return resultados
+
+
+def leer_libro(ruta_excel):
+    """Lee el libro RIPS y devuelve (encabezado, usuarios, {tipo: {consecutivoUsuario: [servicios]}})."""
+    encabezado, df_usuarios, hojas_servicio = leer_hojas(ruta_excel)
+    usuarios = construir_usuarios(df_usuarios) if df_usuarios is not None else []
+    return encabezado, usuarios, {tipo: construir_servicios(df, tipo) for tipo, df in hojas_servicio.items()}
+
+
+def leer_hojas(ruta_excel):
+    """Lee el libro RIPS como texto: (encabezado, hoja de usuarios o None, {tipo: hoja de servicios}).
+
+    El encabezado es el de la primera fila de la hoja de transacciones.
+    """
+    df_transacciones, df_usuarios, hojas_servicio = leer_hojas_texto(ruta_excel)
+    primera_fila = df_transacciones.iloc[0] if df_transacciones is not None and not df_transacciones.empty else {}
+    return encabezado_de(primera_fila), df_usuarios, hojas_servicio
+
+
+def encabezado_de(fila):
+    """Encabezado de la factura a partir de una fila de la hoja de transacciones."""
+    return {
+        "numDocumentoIdObligado": str(fila.get('numDocumentoIdObligado', '')),
+        "numFactura": str(fila.get('numFactura', '')),
+        "tipoNota": None if fila.get('tipoNota', '') == '' else str(fila.get('tipoNota')),
+        "numNota": None if fila.get('numNota', '') == '' else str(fila.get('numNota')),
+    }
+
+
+def leer_hojas_texto(ruta_excel):
+    """Lee cada hoja del libro una sola vez, como texto: (transacciones, usuarios, {tipo: servicios}).
+
+    Las hojas que no están quedan en None (o fuera del diccionario de servicios).
+    Usuarios y servicios salen con los códigos normalizados y las columnas de
+    pocos valores distintos como category (ver normalizar_codigos y compactar).
+    """
     # Cargar el archivo Excel
     xls = pd.ExcelFile(ruta_excel)
-    
-    # Inicializar el diccionario factura
-    factura = {
-        "numDocumentoIdObligado": "",
-        "numFactura": "",
-        "tipoNota": None,
-        "numNota": None,
-        "usuarios": []
-    }
-    
-    # Diccionarios para almacenar servicios por consecutivo
-    consultas_por_consecutivo = {}
-    procedimientos_por_consecutivo = {}
+
+    df_transacciones = None
+    df_usuarios = None
+    hojas_servicio = {}
 
     # Procesar cada hoja del Excel
     for sheet_name in xls.sheet_names:
         sheet_name_lower = sheet_name.lower()
-        
+
         # Procesar la hoja de transacciones
         if 'transaccion' in sheet_name_lower:
-            df = pd.read_excel(xls, sheet_name, dtype=str)
-            df = df.fillna('')  # Reemplazar NaN con cadena vacía
-            if not df.empty:
-                primera_fila = df.iloc[0]
-                factura["numDocumentoIdObligado"] = str(primera_fila.get('numDocumentoIdObligado', ''))
-                factura["numFactura"] = str(primera_fila.get('numFactura', ''))
-                factura["tipoNota"] = None if primera_fila.get('tipoNota', '') == '' else str(primera_fila.get('tipoNota'))
-                factura["numNota"] = None if primera_fila.get('numNota', '') == '' else str(primera_fila.get('numNota'))
-        
+            df_transacciones = pd.read_excel(xls, sheet_name, dtype=str).fillna('')  # Reemplazar NaN con cadena vacía
+
         # Procesar la hoja de usuarios
         elif 'usuarios' in sheet_name_lower:
-            df = pd.read_excel(xls, sheet_name, dtype=str)
-            df = df.fillna('')  # Reemplazar NaN con cadena vacía
-            for _, fila in df.iterrows():
-                usuario = {
-                    'tipoDocumentoIdentificacion': str(fila.get('tipoDocumentoIdentificacion', '')),
-                    'numDocumentoIdentificacion': str(fila.get('numDocumentoIdentificacion', '')),
-                    'tipoUsuario': str(fila.get('tipoUsuario', '')).zfill(2),
-                    'fechaNacimiento': str(fila.get('fechaNacimiento', '')),
-                    'codSexo': str(fila.get('codSexo', '')),
-                    'codPaisResidencia': str(fila.get('codPaisResidencia', '')),
-                    'codMunicipioResidencia': str(fila.get('codMunicipioResidencia', '')),
-                    'codZonaTerritorialResidencia': str(fila.get('codZonaTerritorialResidencia', '')),
-                    'incapacidad': str(fila.get('incapacidad', '')),
-                    'codPaisOrigen': str(fila.get('codPaisOrigen', '')),
-                    'consecutivo': int(fila.get('consecutivo', 0)) if str(fila.get('consecutivo', '')).isdigit() else 0
-                    # No incluir 'servicios' aquí, se agrega dinámicamente después
-                }
-                factura['usuarios'].append(usuario)
-        
-        # Procesar la hoja de consultas
-        elif 'consultas' in sheet_name_lower:
-            df = pd.read_excel(xls, sheet_name, dtype=str)
-            df = df.fillna('')  # Reemplazar NaN con cadena vacía
-            for i, (_, fila) in enumerate(df.iterrows(), 1):  # Iniciar el índice en 1
-                consecutivo = int(fila.get('consecutivoUsuario', 0)) if str(fila.get('consecutivoUsuario', '')).isdigit() else 0
-                consulta = {
-                    'codPrestador': str(fila.get('codPrestador', '')),
-                    'fechaInicioAtencion': str(fila.get('fechaInicioAtencion', '')),
-                    'numAutorizacion': None if fila.get('numAutorizacion', '') == '' else str(fila.get('numAutorizacion')),
-                    'codConsulta': str(fila.get('codConsulta', '')),
-                    'modalidadGrupoServicioTecSal': str(fila.get('modalidadGrupoServicioTecSal', '')),
-                    'grupoServicios': str(fila.get('grupoServicios', '')),
-                    'codServicio': int(fila.get('codServicio', 0)) if str(fila.get('codServicio', '')).isdigit() else 0,
-                    'finalidadTecnologiaSalud': str(fila.get('finalidadTecnologiaSalud', '')),
-                    'causaMotivoAtencion': str(fila.get('causaMotivoAtencion', '')),
-                    'codDiagnosticoPrincipal': str(fila.get('codDiagnosticoPrincipal', '')),
-                    'codDiagnosticoRelacionado1': None if fila.get('codDiagnosticoRelacionado1', '') == '' else str(fila.get('codDiagnosticoRelacionado1')),
-                    'codDiagnosticoRelacionado2': None if fila.get('codDiagnosticoRelacionado2', '') == '' else str(fila.get('codDiagnosticoRelacionado2')),
-                    'codDiagnosticoRelacionado3': None if fila.get('codDiagnosticoRelacionado3', '') == '' else str(fila.get('codDiagnosticoRelacionado3')),
-                    'tipoDiagnosticoPrincipal': str(fila.get('tipoDiagnosticoPrincipal', '')),
-                    'tipoDocumentoIdentificacion': str(fila.get('tipoDocumentoIdentificacion', '')),
-                    'numDocumentoIdentificacion': str(fila.get('numDocumentoIdentificacion', '')),
-                    'vrServicio': int(fila.get('vrServicio', 0)) if str(fila.get('vrServicio', '')).replace('.', '').isdigit() else 0,
-                    'conceptoRecaudo': str(fila.get('conceptoRecaudo', '')),
-                    'valorPagoModerador': int(fila.get('valorPagoModerador', 0)) if str(fila.get('valorPagoModerador', '')).replace('.', '').isdigit() else 0,
-                    'numFEVPagoModerador': str(fila.get('numFEVPagoModerador', '')),
-                    'consecutivo': i  # Usar el índice del arreglo como consecutivo
-                }
-                if consecutivo not in consultas_por_consecutivo:
-                    consultas_por_consecutivo[consecutivo] = []
-                consultas_por_consecutivo[consecutivo].append(consulta)
-        
-        # Procesar la hoja de procedimientos
-        elif 'procedimientos' in sheet_name_lower:
-            df = pd.read_excel(xls, sheet_name, dtype=str).fillna('')
-
-            r = df['consecutivoUsuario'].fillna(0)
-            print(r)
-
-            # for i, (_, fila) in enumerate(df.iterrows(), 1):  # Iniciar el índice en 1
-            #     consecutivo = int(fila.get('consecutivoUsuario', 0)) if str(fila.get('consecutivoUsuario', '')).isdigit() else 0
-            #     procedimiento = {
-            #         'codPrestador': str(fila.get('codPrestador', '')),
-            #         'fechaInicioAtencion': str(fila.get('fechaInicioAtencion', '')),
-            #         'idMIPRES': None if fila.get('idMIPRES', '') == '' else str(fila.get('idMIPRES')),
-            #         'numAutorizacion': None if fila.get('numAutorizacion', '') == '' else str(fila.get('numAutorizacion')),
-            #         'codProcedimiento': str(fila.get('codProcedimiento', '')),
-            #         'viaIngresoServicioSalud': str(fila.get('viaIngresoServicioSalud', '')),
-            #         'modalidadGrupoServicioTecSal': str(fila.get('modalidadGrupoServicioTecSal', '')),
-            #         'grupoServicios': str(fila.get('grupoServicios', '')),
-            #         'codServicio': int(fila.get('codServicio', 0)) if str(fila.get('codServicio', '')).isdigit() else 0,
-            #         'finalidadTecnologiaSalud': str(fila.get('finalidadTecnologiaSalud', '')),
-            #         'tipoDocumentoIdentificacion': str(fila.get('tipoDocumentoIdentificacion', '')),
-            #         'numDocumentoIdentificacion': str(fila.get('numDocumentoIdentificacion', '')),
-            #         'codDiagnosticoPrincipal': str(fila.get('codDiagnosticoPrincipal', '')),
-            #         'codDiagnosticoRelacionado': None if fila.get('codDiagnosticoRelacionado', '') == '' else str(fila.get('codDiagnosticoRelacionado')),
-            #         'codComplicacion': None if fila.get('codComplicacion', '') == '' else str(fila.get('codComplicacion')),
-            #         'vrServicio': int(fila.get('vrServicio', 0)) if str(fila.get('vrServicio', '')).replace('.', '').isdigit() else 0,
-            #         'conceptoRecaudo': str(fila.get('conceptoRecaudo', '')),
-            #         'valorPagoModerador': int(fila.get('valorPagoModerador', 0)) if str(fila.get('valorPagoModerador', '')).replace('.', '').isdigit() else 0,
-            #         'numFEVPagoModerador': str(fila.get('numFEVPagoModerador', '')),
-            #         'consecutivo': i  # Usar el índice del arreglo como consecutivo
-            #     }
-            #         procedimientos_por_consecutivo[consecutivo] = []
-            #     procedimientos_por_consecutivo[consecutivo].append(procedimiento)
-
-
-    print(json.dumps(factura, indent=4))
-    
-    # # Vincular servicios a los usuarios y filtrar aquellos sin servicios
-    # usuarios_filtrados = []
-    # for usuario in factura['usuarios']:
-    #     consecutivo = usuario['consecutivo']
-    #     # Obtener consultas y procedimientos para este usuario
-    #     consultas = consultas_por_consecutivo.get(consecutivo, [])
-    #     procedimientos = procedimientos_por_consecutivo.get(consecutivo, [])
-        
-    #     # Crear el objeto servicios dinámicamente
-    #     servicios = {}
-    #     if consultas:
-    #         servicios['consultas'] = consultas
-    #     if procedimientos:
-    #         servicios['procedimientos'] = procedimientos
-        
-    #     # Incluir solo usuarios con servicios no vacíos
-    #     if servicios:
-    #         usuario['servicios'] = servicios
-    #         usuarios_filtrados.append(usuario)
-    
-    # # Actualizar la lista de usuarios con los filtrados
-    # factura['usuarios'] = usuarios_filtrados
-    
-    # # Generar el nombre del archivo JSON de salida
-    # output_file = f"{factura['numFactura']}.json"
-    
-    # # Guardar en JSON
-    # with open(output_file, 'w', encoding='utf-8') as f:
-    #     json.dump(factura, f, indent=4, ensure_ascii=False)
-    
-    # print(f"✅ Archivo JSON creado exitosamente en {output_file}")
+            df_usuarios = compactar(normalizar_codigos(pd.read_excel(xls, sheet_name, dtype=str).fillna('')))
+
+        # Procesar las hojas de servicios (consultas, procedimientos, ...)
+        else:
+            for palabra, tipo in HOJAS_SERVICIO:
+                if palabra in sheet_name_lower:
+                    hojas_servicio[tipo] = compactar(normalizar_codigos(
+                        pd.read_excel(xls, sheet_name, dtype=str).fillna('')))
+                    break
+
+    return df_transacciones, df_usuarios, hojas_servicio
+
+
+def convertir_columna(serie, tipo):
+    """Aplica la conversión del campo a toda la columna de una vez."""
+    if tipo == TEXTO:
+        return serie
+    if tipo == OPCIONAL:
+        return serie.astype(object).where(serie != '', None)
+    if tipo == DOS_DIGITOS:
+        return serie.str.zfill(2)
+    if tipo == ENTERO:
+        validos = serie.str.isdigit()
+    elif tipo == VALOR:
+        validos = serie.str.replace('.', '', regex=False).str.isdigit() & (serie.str.count(r'\.') <= 1)
+    else:
+        raise ValueError(f"Tipo de campo desconocido: {tipo}")
+    return pd.to_numeric(serie.where(validos, '0')).astype('int64')
+
+
+def valores_y_codigos(serie):
+    """(valores distintos como texto, código de cada fila); si la columna es category se usan sus categorías."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return (pd.Series(np.asarray(serie.cat.categories, dtype=object).astype(str), dtype=object),
+                serie.cat.codes.to_numpy())
+    codigos, unicos = pd.factorize(serie.astype(str))
+    return pd.Series(np.asarray(unicos, dtype=object), dtype=object), codigos
+
+
+def normalizar_columna(serie, tipo):
+    """convertir_columna aplicada solo a los valores distintos y repartida a las filas por sus códigos.
+
+    En columnas de pocos valores (prestador, servicio, finalidad, diagnósticos)
+    cada conversión se hace unas decenas de veces en lugar de una por fila, y
+    las filas comparten el mismo objeto de texto.
+    """
+    unicos, codigos = valores_y_codigos(serie)
+    convertidos = convertir_columna(unicos, tipo).to_numpy()
+    # dtype explícito: sin él pandas volvería a recorrer las filas para inferir el tipo
+    return pd.Series(convertidos.take(codigos), index=serie.index, dtype=convertidos.dtype)
+
+
+def normalizar_columnas(df, campos):
+    """Devuelve un DataFrame con los campos indicados ya convertidos (faltantes = '')."""
+    nombres = [nombre for nombre, _ in campos]
+    df = df.reindex(columns=nombres, fill_value='')
+    return pd.DataFrame({nombre: normalizar_columna(df[nombre], tipo) for nombre, tipo in campos},
+                        index=df.index)
+
+
+@lru_cache(maxsize=None)
+def catalogo(nombre):
+    """{código: código} del catálogo local <CARPETA_CATALOGOS>/<nombre>.csv, leído una vez; None si no existe.
+
+    Los códigos se normalizan como los del libro y se internan, así todas las
+    filas que los usan comparten el mismo objeto de texto.
+    """
+    ruta = os.path.join(CARPETA_CATALOGOS, f"{nombre}.csv")
+    if not os.path.isfile(ruta):
+        return None
+    normalizar = NORMALIZADORES_CATALOGO[nombre]
+    tabla = {}
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+        for fila in csv.reader(f):
+            # Se omiten los encabezados y las filas vacías: todo código tiene al menos un dígito
+            if fila and any(caracter.isdigit() for caracter in fila[0]):
+                codigo = sys.intern(normalizar(fila[0]))
+                tabla[codigo] = codigo
+    return tabla
+
+
+def _rellenar(ancho):
+    """Códigos numéricos que Excel guardó como número y perdieron los ceros a la izquierda (05001 -> 5001)."""
+    def normalizar(valor):
+        valor = valor.strip()
+        return valor.zfill(ancho) if valor.isdigit() and len(valor) < ancho else valor
+    return normalizar
+
+
+def _cie10(valor):
+    """CIE-10 como lo espera el MSPS: mayúsculas, sin punto ni espacios (a09.x -> A09X)."""
+    return valor.strip().upper().replace('.', '').replace(' ', '')
+
+
+NORMALIZADORES_CATALOGO = {CATALOGO_MUNICIPIOS: _rellenar(5), CATALOGO_CIE10: _cie10}
+
+# Columna (o prefijo, terminado en '*') -> (normalizador, catálogo del que se toma el código internado)
+NORMALIZADORES_CODIGO = {
+    'codMunicipioResidencia': (_rellenar(5), CATALOGO_MUNICIPIOS),
+    'codPaisResidencia': (_rellenar(3), None),
+    'codPaisOrigen': (_rellenar(3), None),
+    'codZonaTerritorialResidencia': (_rellenar(2), None),
+    'codPrestador': (_rellenar(12), None),
+    'codDiagnostico*': (_cie10, CATALOGO_CIE10),
+}
+
+
+def normalizador_de(columna):
+    """(normalizador, catálogo) de la columna, o None si la columna no es un código normalizable."""
+    if columna in NORMALIZADORES_CODIGO:
+        return NORMALIZADORES_CODIGO[columna]
+    for clave, valor in NORMALIZADORES_CODIGO.items():
+        if clave.endswith('*') and columna.startswith(clave[:-1]):
+            return valor
+    return None
+
+
+def normalizar_codigos(df):
+    """Normaliza las columnas de códigos de la hoja, una vez por valor distinto."""
+    for columna in df.columns:
+        normalizador = normalizador_de(columna)
+        if normalizador is None:
+            continue
+        normalizar, nombre_catalogo = normalizador
+        tabla = catalogo(nombre_catalogo) if nombre_catalogo else None
+        unicos, codigos = valores_y_codigos(df[columna])
+        nuevos = [normalizar(valor) for valor in unicos]
+        if tabla:
+            nuevos = [tabla.get(valor, valor) for valor in nuevos]
+        df[columna] = np.asarray(nuevos, dtype=object).take(codigos)
+    return df
+
+
+def a_registros(df):
+    """Convierte el DataFrame en lista de dicts (varias veces más rápido que to_dict('records'))."""
+    nombres = list(df.columns)
+    columnas = [df[nombre].tolist() for nombre in nombres]
+    return [dict(zip(nombres, fila)) for fila in zip(*columnas)]
+
+
+def construir_usuarios(df):
+    """Construye la lista de usuarios a partir de la hoja de usuarios."""
+    return a_registros(normalizar_columnas(df, CAMPOS_USUARIO))
+
+
+class ServiciosPorUsuario:
+    """Servicios de un tipo agrupados por consecutivoUsuario.
+
+    Guarda las columnas ya convertidas, ordenadas por usuario, y el rango de
+    filas de cada usuario; los dicts de un usuario se arman solo cuando se
+    piden, de modo que escribir la factura no obliga a tener todos los
+    servicios como dicts a la vez.
+    """
+
+    def __init__(self, datos, rangos_por_usuario):
+        self.nombres = list(datos.columns)
+        self.columnas = [datos[nombre].to_numpy() for nombre in self.nombres]
+        self.rangos = rangos_por_usuario
+
+    def get(self, consecutivo, predeterminado=None):
+        rango = self.rangos.get(consecutivo)
+        if rango is None:
+            return predeterminado
+        inicio, fin = rango
+        valores = [columna[inicio:fin].tolist() for columna in self.columnas]
+        return [dict(zip(self.nombres, fila)) for fila in zip(*valores)]
+
+    def items(self):
+        for consecutivo in self.rangos:
+            yield consecutivo, self.get(consecutivo)
+
+    def __len__(self):
+        return len(self.rangos)
+
+
+def construir_servicios(df, tipo):
+    """Agrupa los servicios de un tipo por consecutivoUsuario con un solo ordenamiento estable."""
+    datos = normalizar_columnas(df, CAMPOS_SERVICIO[tipo])
+    columna_usuario = df['consecutivoUsuario'] if 'consecutivoUsuario' in df else pd.Series('', index=df.index)
+    consecutivo_usuario = normalizar_columna(columna_usuario, ENTERO).to_numpy()
+
+    # Ordenar por usuario conservando el orden de la hoja dentro de cada usuario
+    orden = np.argsort(consecutivo_usuario, kind='stable')
+    claves = consecutivo_usuario[orden]
+    unicos, inicios = np.unique(claves, return_index=True)
+    fines = np.append(inicios[1:], len(claves))
+    datos = datos.iloc[orden].reset_index(drop=True)
+
+    # Consecutivo del servicio = posición dentro del arreglo del usuario
+    datos['consecutivo'] = np.arange(len(claves)) - np.repeat(inicios, fines - inicios) + 1
+
+    return ServiciosPorUsuario(datos, {consecutivo: (inicio, fin) for consecutivo, inicio, fin
+                                       in zip(unicos.tolist(), inicios.tolist(), fines.tolist())})
+
+
+def armar_factura(encabezado, usuarios, servicios_por_tipo):
+    """Arma la factura completa en memoria (para archivos pequeños o validaciones)."""
+    factura = dict(encabezado)
+    factura['usuarios'] = list(iterar_usuarios(usuarios, servicios_por_tipo))
+    return factura
+
+
+def iterar_usuarios(usuarios, servicios_por_tipo):
+    """Vincula los servicios a cada usuario y entrega uno a la vez, omitiendo los que no tienen servicios."""
+    for usuario in usuarios:
+        consecutivo = usuario['consecutivo']
+
+        # Crear el objeto servicios dinámicamente, en el orden de la norma
+        servicios = {}
+        for tipo in CAMPOS_SERVICIO:
+            lista = servicios_por_tipo.get(tipo, {}).get(consecutivo)
+            if lista:
+                servicios[tipo] = lista
+
+        # Incluir solo usuarios con servicios no vacíos
+        if servicios:
+            yield dict(usuario, servicios=servicios)
+
+
+def escribir_factura_json(ruta, encabezado, usuarios, indent=4):
+    """Escribe la factura en disco serializando un usuario a la vez.
+
+    Con indent=4 el resultado es idéntico a json.dump(factura, indent=4); con
+    indent=None se genera JSON compacto. Devuelve la cantidad de usuarios escritos.
+    """
+    separadores = (',', ': ') if indent is not None else (',', ':')
+
+    def salto(nivel):
+        return '\n' + ' ' * (indent * nivel) if indent is not None else ''
+
+    total = 0
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for clave, valor in encabezado.items():
+            f.write(f"{salto(1)}{json.dumps(clave)}{separadores[1]}{json.dumps(valor, ensure_ascii=False)},")
+        f.write(f"{salto(1)}\"usuarios\"{separadores[1]}[")
+
+        for usuario in usuarios:
+            texto = json.dumps(usuario, indent=indent, separators=separadores, ensure_ascii=False)
+            if indent is not None:
+                texto = texto.replace('\n', salto(2))
+            f.write(f"{',' if total else ''}{salto(2)}{texto}")
+            total += 1
+
+        f.write(f"{salto(1) if total else ''}]{salto(0)}}}")
+    return total
+
 
 def validar_ruta(ruta):
     # Validar si la ruta es un archivo existente
     return os.path.isfile(ruta) and os.path.exists(ruta)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,245 @@
+import os
+import re
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+# Catálogo local en SQLite de las facturas y sus archivos (XML, JSON, CUV,
+# rechazos, resultados locales, carpetas). Un escáner incremental lo mantiene al
+# día comparando el mtime de cada directorio: solo se vuelven a listar los que
+# cambiaron. Preguntas como "qué facturas de este Excel no tienen XML o CUV"
+# se responden con una consulta indexada en lugar de miles de stat por la red.
+
+RUTA_CATALOGO_PREDETERMINADA = 'catalogo_facturas.db'
+VERSION_CATALOGO = 1
+
+# Tipos de artefacto
+TIPO_XML = 'xml'
+TIPO_JSON = 'json'
+TIPO_CUV = 'cuv'
+TIPO_ID0_R = 'id0_r'
+TIPO_LOCALES = 'locales'
+TIPO_CARPETA = 'carpeta'        # AttachedDocument_F-010-<n>
+TIPO_CARPETA_FE = 'carpeta_fe'  # FE<n> (soportes o facturas radicadas)
+TIPOS = (TIPO_XML, TIPO_JSON, TIPO_CUV, TIPO_ID0_R, TIPO_LOCALES, TIPO_CARPETA, TIPO_CARPETA_FE)
+
+# Se prueban en orden: los resultados MSPS van antes que FE*.json porque el CUV renombrado también es .json
+PATRONES_ARCHIVO = [
+    (TIPO_CUV, re.compile(r'^ResultadosMSPS_FE(\d+)_.*_A_CUV\.(txt|json)$')),
+    (TIPO_ID0_R, re.compile(r'^ResultadosMSPS_FE(\d+)_ID0_R\.txt$')),
+    (TIPO_LOCALES, re.compile(r'^ResultadosLocales_FE(\d+)\.txt$')),
+    (TIPO_JSON, re.compile(r'^FE(\d+).*\.json$', re.IGNORECASE)),
+    (TIPO_XML, re.compile(r'(\d+)\.xml$', re.IGNORECASE)),
+]
+PATRONES_DIRECTORIO = [
+    (TIPO_CARPETA, re.compile(r'^AttachedDocument_F-010-(\d+)$')),
+    (TIPO_CARPETA_FE, re.compile(r'^FE(\d+)$')),
+]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS directorios (
+    ruta TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archivos (
+    directorio TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    es_directorio INTEGER NOT NULL,
+    tipo TEXT,
+    numero TEXT,
+    PRIMARY KEY (directorio, nombre)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS archivos_por_numero ON archivos (numero, tipo);
+"""
+
+
+def clasificar_nombre(nombre, es_directorio=False):
+    """Devuelve (tipo, número de factura) de un archivo o carpeta, o (None, None) si no es un artefacto conocido."""
+    for tipo, patron in (PATRONES_DIRECTORIO if es_directorio else PATRONES_ARCHIVO):
+        match = patron.search(nombre)
+        if match:
+            return tipo, match.group(1)
+    return None, None
+
+
+class Catalogo:
+    """Catálogo SQLite de número de factura -> archivos y carpetas, sincronizado por mtime de directorio.
+
+    La conexión es de un solo hilo: se consulta desde el hilo principal y los
+    resultados (conjuntos, listas) se reparten a los hilos de copia.
+    """
+
+    def __init__(self, ruta=RUTA_CATALOGO_PREDETERMINADA):
+        self.ruta = ruta
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.execute('PRAGMA journal_mode=WAL')
+        self.conexion.execute('PRAGMA synchronous=NORMAL')
+        version = self.conexion.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, VERSION_CATALOGO):
+            # Otra versión del esquema: se reconstruye desde cero
+            self.conexion.executescript('DROP TABLE IF EXISTS archivos; DROP TABLE IF EXISTS directorios;')
+        self.conexion.executescript(ESQUEMA)
+        self.conexion.execute(f'PRAGMA user_version={VERSION_CATALOGO}')
+        self.directorios_escaneados = 0
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+    @staticmethod
+    def _condicion_raiz(columna, raiz):
+        """Condición SQL 'columna está dentro de raiz' sin LIKE (los nombres llevan '_')"""
+        raiz = os.path.abspath(raiz)
+        prefijo = os.path.join(raiz, '')
+        return f"({columna} = ? OR substr({columna}, 1, ?) = ?)", [raiz, len(prefijo), prefijo]
+
+    def sincronizar(self, raiz, recursivo=True):
+        """Pone el catálogo al día con el árbol; solo relista los directorios cuyo mtime cambió.
+
+        Con recursivo=False se lista solo la raíz (sus subcarpetas quedan como
+        artefactos, p. ej. las carpetas FE<n> de soportes). Devuelve los directorios relistados.
+        """
+        raiz = os.path.abspath(raiz)
+        cursor = self.conexion.cursor()
+        condicion, parametros = self._condicion_raiz('ruta', raiz)
+        conocidos = dict(cursor.execute(f"SELECT ruta, mtime FROM directorios WHERE {condicion}", parametros))
+        vistos = set()
+        escaneados = 0
+        pendientes = [raiz]
+
+        with self.conexion:
+            while pendientes:
+                directorio = pendientes.pop()
+                try:
+                    mtime = os.stat(directorio).st_mtime_ns
+                except OSError:
+                    continue
+                vistos.add(directorio)
+
+                if conocidos.get(directorio) == mtime:
+                    subdirectorios = [nombre for (nombre,) in cursor.execute(
+                        "SELECT nombre FROM archivos WHERE directorio = ? AND es_directorio = 1", (directorio,))]
+                else:
+                    filas = []
+                    try:
+                        with os.scandir(directorio) as entradas:
+                            for entrada in entradas:
+                                es_directorio = entrada.is_dir() and not entrada.is_symlink()
+                                tipo, numero = clasificar_nombre(entrada.name, es_directorio)
+                                filas.append((directorio, entrada.name, int(es_directorio), tipo, numero))
+                    except OSError as e:
+                        print(f"Error al listar {directorio}: {str(e)}")
+                        continue
+                    cursor.execute("DELETE FROM archivos WHERE directorio = ?", (directorio,))
+                    cursor.executemany("INSERT INTO archivos VALUES (?, ?, ?, ?, ?)", filas)
+                    cursor.execute("INSERT OR REPLACE INTO directorios VALUES (?, ?)", (directorio, mtime))
+                    subdirectorios = [fila[1] for fila in filas if fila[2]]
+                    escaneados += 1
+
+                if recursivo:
+                    pendientes.extend(os.path.join(directorio, nombre) for nombre in subdirectorios)
+
+            # Directorios que ya no existen (o que no se alcanzaron desde la raíz)
+            if recursivo:
+                desaparecidos = [(ruta,) for ruta in conocidos if ruta not in vistos]
+            else:
+                desaparecidos = [(raiz,)] if raiz in conocidos and raiz not in vistos else []
+            cursor.executemany("DELETE FROM archivos WHERE directorio = ?", desaparecidos)
+            cursor.executemany("DELETE FROM directorios WHERE ruta = ?", desaparecidos)
+
+        self.directorios_escaneados = escaneados
+        return escaneados
+
+    def buscar(self, numero, tipo, raiz=None) -> Optional[str]:
+        """Ruta del primer artefacto del tipo para la factura (opcionalmente dentro de raiz), o None"""
+        consulta = "SELECT directorio, nombre FROM archivos WHERE numero = ? AND tipo = ?"
+        parametros = [str(numero), tipo]
+        if raiz:
+            condicion, extra = self._condicion_raiz('directorio', raiz)
+            consulta += f" AND {condicion}"
+            parametros += extra
+        fila = self.conexion.execute(consulta + " ORDER BY directorio, nombre LIMIT 1", parametros).fetchone()
+        return os.path.join(*fila) if fila else None
+
+    def buscar_todos(self, numero, raiz=None) -> Dict[str, List[str]]:
+        """{tipo: [rutas]} de todos los artefactos de una factura"""
+        consulta = "SELECT tipo, directorio, nombre FROM archivos WHERE numero = ? AND tipo IS NOT NULL"
+        parametros = [str(numero)]
+        if raiz:
+            condicion, extra = self._condicion_raiz('directorio', raiz)
+            consulta += f" AND {condicion}"
+            parametros += extra
+        artefactos = {}
+        for tipo, directorio, nombre in self.conexion.execute(consulta + " ORDER BY directorio, nombre", parametros):
+            artefactos.setdefault(tipo, []).append(os.path.join(directorio, nombre))
+        return artefactos
+
+    def faltantes(self, numeros: Iterable[str], tipos: Sequence[str], raiz=None) -> Dict[str, List[str]]:
+        """{tipo: [facturas sin ese artefacto]} en el orden en que llegaron los números (sin repetidos)"""
+        for tipo in tipos:
+            if tipo not in TIPOS:
+                raise ValueError(f"Tipo de artefacto desconocido: {tipo}. Use uno de {TIPOS}")
+
+        cursor = self.conexion.cursor()
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS consulta (numero TEXT PRIMARY KEY, orden INTEGER)")
+        cursor.execute("DELETE FROM consulta")
+        cursor.executemany("INSERT OR IGNORE INTO consulta VALUES (?, ?)",
+                           ((str(numero), orden) for orden, numero in enumerate(numeros)))
+
+        condicion, extra = ('', [])
+        if raiz:
+            condicion, extra = self._condicion_raiz('a.directorio', raiz)
+            condicion = f" AND {condicion}"
+
+        resultado = {}
+        for tipo in tipos:
+            resultado[tipo] = [numero for (numero,) in cursor.execute(
+                "SELECT c.numero FROM consulta c WHERE NOT EXISTS ("
+                f"SELECT 1 FROM archivos a WHERE a.numero = c.numero AND a.tipo = ?{condicion}) ORDER BY c.orden",
+                [tipo] + extra)]
+        cursor.execute("DELETE FROM consulta")
+        return resultado
+
+    def nombres_en(self, directorio, solo_directorios=False) -> Optional[List[str]]:
+        """Nombres de lo que hay en un directorio ya catalogado (None si no está en el catálogo)"""
+        directorio = os.path.abspath(directorio)
+        if self.conexion.execute("SELECT 1 FROM directorios WHERE ruta = ?", (directorio,)).fetchone() is None:
+            return None
+        consulta = "SELECT nombre FROM archivos WHERE directorio = ?"
+        if solo_directorios:
+            consulta += " AND es_directorio = 1"
+        return [nombre for (nombre,) in self.conexion.execute(consulta + " ORDER BY nombre", (directorio,))]
+
+    def resumen(self, raiz=None) -> Dict[str, int]:
+        """Cantidad de artefactos por tipo"""
+        consulta = "SELECT tipo, count(*) FROM archivos WHERE tipo IS NOT NULL"
+        parametros = []
+        if raiz:
+            condicion, parametros = self._condicion_raiz('directorio', raiz)
+            consulta += f" AND {condicion}"
+        return dict(self.conexion.execute(consulta + " GROUP BY tipo", parametros))
+
+
+class IndiceCatalogo:
+    """Vista del catálogo con la misma interfaz de búsqueda que IndiceFacturas (buscar_xml / buscar_json)"""
+
+    def __init__(self, catalogo, ruta_base_xml, ruta_json_base):
+        self.catalogo = catalogo
+        self.ruta_base_xml = ruta_base_xml
+        self.ruta_json_base = ruta_json_base
+
+    def actualizar(self):
+        escaneados = self.catalogo.sincronizar(self.ruta_base_xml)
+        escaneados += self.catalogo.sincronizar(self.ruta_json_base, recursivo=False)
+        self.catalogo.directorios_escaneados = escaneados
+
+    def buscar_xml(self, numero_factura):
+        return self.catalogo.buscar(numero_factura, TIPO_XML, self.ruta_base_xml)
+
+    def buscar_json(self, numero_factura):
+        return self.catalogo.buscar(numero_factura, TIPO_JSON, self.ruta_json_base)
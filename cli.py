@@ -0,0 +1,556 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from copiado import MODOS_COPIA, MODO_COPIA
+
+
+# Línea de comandos única para todos los scripts, sin preguntas por consola.
+#
+#   python cli.py radicar --xlsx marzo.xlsx --columna Factura --soportes S: --facturas F: --destino D:/radicado
+#   python cli.py --trabajadores 8 lote trabajos.toml
+#
+# Un archivo de trabajos (TOML, o YAML si está instalado PyYAML) ejecuta varios
+# trabajos en un solo proceso: pandas se importa una vez, los pools de hilos y
+# de procesos se comparten y el índice de XML/JSON se carga y guarda una sola vez.
+# Cada trabajo usa las mismas opciones del subcomando (guiones o guiones bajos):
+#
+#   [opciones]
+#   trabajadores = 8
+#   detener_en_error = false
+#
+#   [[trabajos]]
+#   nombre = "Marzo EPS Sur"
+#   tipo = "faltantes"
+#   xlsx = "D:/007-Invoices/marzo.xlsx"
+#   xml = "D:/007-Invoices/2025/MAR-2025"
+#   json = "D:/007-Invoices/json_files"
+#   destino = "D:/007-Invoices/2025-Directories"
+#
+#   [[trabajos]]
+#   tipo = "radicar"
+#   ...
+
+
+class ContextoLote:
+    """Recursos compartidos entre trabajos: pools de hilos y procesos, índice, catálogo y metadatos de facturas"""
+
+    def __init__(self, trabajadores=None, ruta_indice=None, ruta_catalogo=None, ruta_metadatos=None):
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        self.ruta_indice = ruta_indice
+        self.ruta_catalogo = ruta_catalogo
+        self.ruta_metadatos = ruta_metadatos
+        self._hilos = None
+        self._procesos = None
+        self._indice = None
+        self._catalogo = None
+        self._metadatos = None
+
+    @property
+    def hilos(self):
+        """Pool de hilos para copias (se crea al primer uso)"""
+        if self._hilos is None:
+            self._hilos = ThreadPoolExecutor(max_workers=self.trabajadores)
+        return self._hilos
+
+    @property
+    def procesos(self):
+        """Pool de procesos para trabajo de CPU (se crea al primer uso)"""
+        if self._procesos is None:
+            self._procesos = ProcessPoolExecutor(max_workers=self.trabajadores)
+        return self._procesos
+
+    @property
+    def indice(self):
+        """Índice de XML/JSON cargado una sola vez para todo el lote"""
+        if self._indice is None:
+            from indice_facturas import IndiceFacturas, RUTA_INDICE_PREDETERMINADA
+            self._indice = IndiceFacturas(self.ruta_indice or RUTA_INDICE_PREDETERMINADA)
+        return self._indice
+
+    @property
+    def catalogo(self):
+        """Catálogo SQLite (--catalogo o el predeterminado), abierto una sola vez"""
+        if self._catalogo is None:
+            from catalogo import Catalogo, RUTA_CATALOGO_PREDETERMINADA
+            self._catalogo = Catalogo(self.ruta_catalogo or RUTA_CATALOGO_PREDETERMINADA)
+        return self._catalogo
+
+    def catalogo_opcional(self):
+        """El catálogo solo si se pidió con --catalogo; si no, los trabajos consultan el disco"""
+        return self.catalogo if self.ruta_catalogo else None
+
+    @property
+    def metadatos(self):
+        """Caché de metadatos de XML (--metadatos o el predeterminado), cargado una sola vez"""
+        if self._metadatos is None:
+            from metadatos_xml import CacheMetadatos
+            self._metadatos = CacheMetadatos(self.ruta_metadatos)
+        return self._metadatos
+
+    def metadatos_opcional(self):
+        """Los metadatos solo si se pidieron con --metadatos; si no, se cruza por el nombre del archivo"""
+        return self.metadatos if self.ruta_metadatos else None
+
+    def cerrar(self):
+        if self._catalogo is not None:
+            self._catalogo.cerrar()
+        if self._metadatos is not None:
+            self._metadatos.guardar()
+        if self._indice is not None:
+            self._indice.guardar()
+        if self._hilos is not None:
+            self._hilos.shutdown()
+        if self._procesos is not None:
+            self._procesos.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+
+# Cada trabajo recibe (args, contexto) y devuelve True si se pudo ejecutar.
+# Los módulos se importan dentro de la función: un trabajo de renombrado no paga el import de pandas.
+
+def ejecutar_procesar(args, contexto):
+    from main import procesar_facturas
+    procesar_facturas(args.xml, args.destino, args.json, trabajadores=contexto.trabajadores,
+                      executor=contexto.hilos, metadatos=contexto.metadatos_opcional(),
+                      catalogo=contexto.catalogo_opcional())
+    return True
+
+
+def ejecutar_faltantes(args, contexto):
+    import faltantes_febrero
+    catalogo = contexto.catalogo_opcional()
+    metadatos = contexto.metadatos_opcional()
+    return faltantes_febrero.ejecutar(args.xlsx, args.xml, args.json, args.destino,
+                                      indice=None if catalogo else contexto.indice, catalogo=catalogo,
+                                      metadatos=metadatos,
+                                      executor=contexto.procesos if metadatos is not None else None,
+                                      excel=args.excel) is not None
+
+
+def ejecutar_radicar(args, contexto):
+    import radicador
+    from reglas_copia import cargar_reglas
+    radicador.configurar_logging()
+    procesador = radicador.ProcesadorFacturas(
+        ruta_xlsx=args.xlsx,
+        columna=args.columna,
+        ruta_destino=args.destino,
+        ruta_soportes=args.soportes,
+        ruta_facturas=args.facturas,
+        trabajadores=contexto.trabajadores,
+        limite_soportes=args.limite_soportes,
+        limite_facturas=args.limite_facturas,
+        reanudar=args.reanudar,
+        modo_copia=args.modo,
+        executor=contexto.hilos if contexto.trabajadores > 1 else None,
+        reglas=cargar_reglas(args.reglas, args.eps),
+        catalogo=contexto.catalogo_opcional(),
+        verificar=args.verificar,
+        tamano_bloque=args.bloque_kb * 1024,
+    )
+    if args.perfil:
+        exitosas, fallidas = radicador.ejecutar_con_perfil(procesador)
+    else:
+        exitosas, fallidas = procesador.procesar_todas()
+    procesador.generar_reporte()
+    if procesador.ruta_destino.exists():
+        procesador.exportar_metricas()
+    return exitosas + fallidas > 0
+
+
+def ejecutar_verificar(args, contexto):
+    from verificacion import verificar_manifiesto
+    if not os.path.isfile(args.manifiesto):
+        print(f"❌ No existe el manifiesto: {args.manifiesto}")
+        return False
+    inicio = time.perf_counter()
+    try:
+        correctos, problemas = verificar_manifiesto(args.manifiesto, tamano_bloque=args.bloque_kb * 1024,
+                                                    executor=contexto.hilos)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    for problema in problemas:
+        print(f"  • {problema}")
+    print(f"{'✅' if not problemas else '❌'} {correctos} archivos correctos, {len(problemas)} con problemas "
+          f"({time.perf_counter() - inicio:.1f}s)")
+    return not problemas
+
+
+def ejecutar_estructurar(args, contexto):
+    import estructurador
+    return estructurador.ejecutar(args.xlsx, args.columna, args.carpetas, args.destino, args.modo,
+                                  executor=contexto.procesos, trabajadores=contexto.trabajadores,
+                                  excel=args.excel) is not None
+
+
+def ejecutar_seleccionar(args, contexto):
+    import seleccionador_de_carpetas
+    resultado = seleccionador_de_carpetas.ejecutar(args.xlsx, args.carpetas, args.destino, args.columna,
+                                                   args.empaquetar, args.tamano_maximo_mb, args.modo,
+                                                   executor=contexto.hilos)
+    return resultado is not None
+
+
+def ejecutar_organizar(args, contexto):
+    import prueba
+    if not os.path.isdir(args.ruta):
+        print(f"❌ La ruta especificada no es un directorio válido: {args.ruta}")
+        return False
+    prueba.organizar_carpetas(args.ruta, args.simular, catalogo=contexto.catalogo_opcional())
+    return True
+
+
+def ejecutar_renombrar(args, contexto):
+    import renombrador
+    if args.deshacer:
+        if not renombrador.validar_ruta(args.deshacer):
+            return False
+        print(f"↩️ {renombrador.deshacer_renombrado(args.deshacer)} archivos restaurados.")
+        return True
+    if not renombrador.validar_ruta(args.ruta):
+        return False
+    renombrador.renombrar_archivos_zip(args.ruta)
+    return True
+
+
+def ejecutar_capita(args, contexto):
+    import capita
+    if not capita.validar_ruta(args.excel):
+        print(f"❌ La ruta del archivo Excel no existe: {args.excel}")
+        return False
+    return capita.convertir_libro(args.excel, args.compacto, args.salida, validar=not args.sin_validar,
+                                  forzar=args.forzar, trabajadores=contexto.trabajadores,
+                                  executor=contexto.procesos) is not None
+
+
+def ejecutar_vigilar(args, contexto):
+    from vigilante import Vigilante
+    for ruta in (args.xml, args.json):
+        if not os.path.isdir(ruta):
+            print(f"❌ La ruta especificada no es un directorio válido: {ruta}")
+            return False
+    Vigilante(args.xml, args.json, args.destino, espera=args.espera, sondeo=args.sondeo,
+              intervalo_sondeo=args.intervalo, indice=contexto.indice,
+              trabajadores=contexto.trabajadores).ejecutar()
+    return True
+
+
+def ejecutar_metadatos(args, contexto):
+    import csv
+    from main import listar_xml
+    from metadatos_xml import CAMPOS
+    if not os.path.isdir(args.xml):
+        print(f"❌ La ruta especificada no es un directorio válido: {args.xml}")
+        return False
+    metadatos = contexto.metadatos
+
+    inicio = time.perf_counter()
+    rutas = [os.path.abspath(ruta) for ruta in listar_xml(args.xml)]
+    leidos = metadatos.actualizar(rutas, executor=contexto.procesos, raiz=args.xml)
+    segundos = time.perf_counter() - inicio
+    print(f"🧾 {len(rutas)} XML, {leidos} leídos en {segundos:.1f}s "
+          f"({leidos / segundos if segundos else 0:.0f}/s), {metadatos.descartados} ya no existían; "
+          f"caché en {metadatos.ruta_cache}")
+
+    registros = [metadatos.registro(ruta) for ruta in rutas]
+    errores = [registro for registro in registros if registro['error']]
+    distintos = [registro for registro in registros
+                 if registro['numero_archivo'] and registro['numero'] != registro['numero_archivo']]
+    por_numero = {}
+    for registro in registros:
+        por_numero.setdefault(registro['numero'], []).append(registro['ruta'])
+    duplicados = {numero: lista for numero, lista in por_numero.items() if len(lista) > 1}
+
+    print(f"⚠️ {len(errores)} XML ilegibles, {len(distintos)} con número distinto al del nombre, "
+          f"{len(duplicados)} facturas con más de un XML")
+    for registro in (errores + distintos)[:10]:
+        print(f"  • {os.path.basename(registro['ruta'])}: factura {registro['factura'] or '?'} {registro['error']}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8-sig', newline='') as f:
+            escritor = csv.DictWriter(f, fieldnames=CAMPOS)
+            escritor.writeheader()
+            escritor.writerows(registros)
+        print(f"💾 Metadatos guardados en {args.salida}")
+    return True
+
+
+def ejecutar_catalogo(args, contexto):
+    import csv
+    from lector_facturas import leer_facturas
+    catalogo = contexto.catalogo
+
+    for ruta in args.sincronizar:
+        if not os.path.isdir(ruta):
+            print(f"❌ La ruta no es un directorio: {ruta}")
+            return False
+        inicio = time.perf_counter()
+        escaneados = catalogo.sincronizar(ruta, recursivo=not args.plano)
+        print(f"🗃️ {ruta}: {escaneados} directorios releídos en {time.perf_counter() - inicio:.1f}s")
+
+    if not args.xlsx:
+        for tipo, cantidad in sorted(catalogo.resumen(args.raiz).items()):
+            print(f"  {tipo:<12}{cantidad:>10}")
+        return True
+
+    try:
+        facturas = leer_facturas(args.xlsx, args.columna)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    faltantes = catalogo.faltantes(facturas, args.tipos, args.raiz)
+    for tipo, numeros in faltantes.items():
+        muestra = ', '.join(numeros[:20]) + (' ...' if len(numeros) > 20 else '')
+        print(f"📋 Sin {tipo}: {len(numeros)} de {len(set(facturas))}{': ' + muestra if numeros else ''}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8-sig', newline='') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(['Factura', 'Falta'])
+            for tipo, numeros in faltantes.items():
+                escritor.writerows((numero, tipo) for numero in numeros)
+        print(f"💾 Faltantes guardados en {args.salida}")
+    return True
+
+
+def cargar_archivo_trabajos(ruta):
+    """Lee un archivo de trabajos TOML o YAML y devuelve (opciones, [trabajos])"""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(ruta, 'rb') as f:
+            datos = tomllib.load(f)
+    elif extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Para archivos YAML instale PyYAML (pip install pyyaml) o use TOML")
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"Formato de archivo de trabajos no soportado: {extension}. Use .toml, .yaml o .yml")
+
+    trabajos = datos.get('trabajos') or []
+    if not isinstance(trabajos, list) or not all(isinstance(trabajo, dict) for trabajo in trabajos):
+        raise ValueError("'trabajos' debe ser una lista de tablas con al menos la clave 'tipo'")
+    return datos.get('opciones') or {}, trabajos
+
+
+def trabajo_a_argumentos(trabajo):
+    """Convierte un trabajo del archivo en argumentos del subcomando: {'tipo': 'capita', 'excel': 'a.xlsx'} -> ['capita', '--excel', 'a.xlsx']"""
+    if 'tipo' not in trabajo:
+        raise ValueError("Falta la clave 'tipo'")
+    argumentos = [str(trabajo['tipo'])]
+    for clave, valor in trabajo.items():
+        if clave in ('tipo', 'nombre') or valor is None or valor is False:
+            continue
+        opcion = '--' + clave.replace('_', '-')
+        if valor is True:
+            argumentos.append(opcion)
+        elif isinstance(valor, list):
+            argumentos.extend([opcion, *map(str, valor)])
+        else:
+            argumentos.extend([opcion, str(valor)])
+    return argumentos
+
+
+def ejecutar_lote(args, contexto, parser):
+    """Valida todos los trabajos del archivo y luego los ejecuta en orden con el contexto compartido"""
+    try:
+        opciones, trabajos = cargar_archivo_trabajos(args.archivo)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se pudo leer el archivo de trabajos: {e}")
+        return False
+
+    if not args.trabajadores_globales and opciones.get('trabajadores'):
+        contexto.trabajadores = int(opciones['trabajadores'])
+    detener_en_error = args.detener_en_error or bool(opciones.get('detener_en_error'))
+
+    # Se validan todos antes de empezar: un error de tipeo no debe aparecer a mitad de la noche
+    preparados = []
+    for numero, trabajo in enumerate(trabajos, 1):
+        nombre = trabajo.get('nombre') or f"trabajo {numero} ({trabajo.get('tipo', '?')})"
+        try:
+            argumentos = parser.parse_args(trabajo_a_argumentos(trabajo))
+        except ValueError as e:
+            print(f"❌ {nombre}: {e}")
+            return False
+        except SystemExit:  # argparse ya mostró el error
+            print(f"❌ {nombre}: opciones inválidas")
+            return False
+        if argumentos.funcion is ejecutar_lote:
+            print(f"❌ {nombre}: un lote no puede contener otro lote")
+            return False
+        if argumentos.funcion is ejecutar_vigilar:
+            print(f"❌ {nombre}: el modo vigilancia no termina, ejecútelo fuera del lote")
+            return False
+        preparados.append((nombre, argumentos))
+
+    resultados = []
+    for nombre, argumentos in preparados:
+        print(f"\n{'=' * 60}\n▶️ {nombre}\n{'=' * 60}")
+        inicio = time.perf_counter()
+        try:
+            exitoso = argumentos.funcion(argumentos, contexto)
+        except Exception as e:
+            print(f"❌ {nombre}: {e}")
+            exitoso = False
+        resultados.append((nombre, exitoso, time.perf_counter() - inicio))
+        if not exitoso and detener_en_error:
+            print("⛔ Se detiene el lote por el error anterior")
+            break
+
+    print(f"\n{'=' * 60}\n📋 RESUMEN DEL LOTE\n{'=' * 60}")
+    for nombre, exitoso, segundos in resultados:
+        print(f"{'✅' if exitoso else '❌'} {nombre} ({segundos:.1f}s)")
+    omitidos = len(preparados) - len(resultados)
+    if omitidos:
+        print(f"⏭️ {omitidos} trabajos sin ejecutar")
+    return all(exitoso for _, exitoso, _ in resultados) and not omitidos
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(description="Herramientas de facturas y radicación, sin preguntas por consola")
+    parser.add_argument('--trabajadores', type=int, default=None, dest='trabajadores_globales',
+                        help="Hilos/procesos compartidos (por defecto, núcleos de la CPU)")
+    parser.add_argument('--indice', default=None, help="Ruta del índice de XML/JSON (indice_facturas.json)")
+    parser.add_argument('--catalogo', default=None,
+                        help="Catálogo SQLite de facturas: procesar, faltantes, radicar y organizar lo consultan en lugar del disco")
+    parser.add_argument('--metadatos', default=None,
+                        help="Caché de metadatos de XML (.parquet o .json): procesar y faltantes cruzan por el número del contenido")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    sub = subparsers.add_parser('procesar', help="Crea carpetas por factura desde el árbol de XML y los JSON (main.py)")
+    sub.add_argument('--xml', required=True, help="Raíz del árbol de XML")
+    sub.add_argument('--json', required=True, help="Carpeta de FE*.json")
+    sub.add_argument('--destino', required=True)
+    sub.set_defaults(funcion=ejecutar_procesar)
+
+    sub = subparsers.add_parser('faltantes', help="Arma carpetas de las facturas de un Excel (faltantes_febrero.py)")
+    sub.add_argument('--xlsx', required=True, help="Excel con la columna 'Factura'")
+    sub.add_argument('--xml', required=True, help="Raíz del árbol de XML")
+    sub.add_argument('--json', required=True, help="Carpeta de FE*.json")
+    sub.add_argument('--destino', required=True)
+    sub.add_argument('--excel', action='store_true', help="Además del reporte, escribe el .xlsx de no encontradas")
+    sub.set_defaults(funcion=ejecutar_faltantes)
+
+    sub = subparsers.add_parser('radicar', help="Copia soportes y facturas para radicar (radicador.py)")
+    sub.add_argument('--xlsx', required=True)
+    sub.add_argument('--columna', required=True)
+    sub.add_argument('--soportes', required=True)
+    sub.add_argument('--facturas', required=True)
+    sub.add_argument('--destino', required=True)
+    sub.add_argument('--modo', choices=MODOS_COPIA, default=MODO_COPIA)
+    sub.add_argument('--limite-soportes', type=int, default=None, help="Copias simultáneas desde soportes")
+    sub.add_argument('--limite-facturas', type=int, default=None, help="Copias simultáneas desde facturas")
+    sub.add_argument('--reanudar', action='store_true', help="Continúa la ejecución anterior según la bitácora")
+    sub.add_argument('--perfil', action='store_true', help="Ejecuta bajo cProfile")
+    sub.add_argument('--reglas', default=None, help="Archivo TOML/JSON de reglas de copia por EPS")
+    sub.add_argument('--eps', default=None, help="EPS cuyas reglas se aplican (ver reglas_copia.py)")
+    sub.add_argument('--verificar', action='store_true', help="Comparar origen y destino por SHA-256 y escribir el manifiesto")
+    sub.add_argument('--bloque-kb', type=int, default=1024, help="Tamaño de lectura al hashear, en KB")
+    sub.set_defaults(funcion=ejecutar_radicar)
+
+    sub = subparsers.add_parser('verificar', help="Vuelve a comprobar un manifiesto SHA-256 de radicación, sin el origen")
+    sub.add_argument('manifiesto', help="manifiesto_radicacion.sha256")
+    sub.add_argument('--bloque-kb', type=int, default=1024, help="Tamaño de lectura al hashear, en KB")
+    sub.set_defaults(funcion=ejecutar_verificar)
+
+    sub = subparsers.add_parser('estructurar', help="Copia carpetas y reestructura los resultados MSPS (estructurador.py)")
+    sub.add_argument('--xlsx', required=True)
+    sub.add_argument('--columna', required=True)
+    sub.add_argument('--carpetas', required=True)
+    sub.add_argument('--destino', required=True)
+    sub.add_argument('--modo', choices=MODOS_COPIA, default=MODO_COPIA)
+    sub.add_argument('--excel', action='store_true', help="Además del reporte, escribe el .xlsx de no encontradas")
+    sub.set_defaults(funcion=ejecutar_estructurar)
+
+    sub = subparsers.add_parser('seleccionar', help="Copia o empaqueta las carpetas de un Excel (seleccionador_de_carpetas.py)")
+    sub.add_argument('--xlsx', required=True)
+    sub.add_argument('--columna', required=True)
+    sub.add_argument('--carpetas', required=True)
+    sub.add_argument('--destino', required=True)
+    sub.add_argument('--empaquetar', action='store_true', help="ZIP directo desde el origen, sin copiar")
+    sub.add_argument('--tamano-maximo-mb', type=int, default=None, help="Tamaño máximo por volumen ZIP")
+    sub.add_argument('--modo', choices=MODOS_COPIA, default=MODO_COPIA)
+    sub.set_defaults(funcion=ejecutar_seleccionar)
+
+    sub = subparsers.add_parser('organizar', help="Clasifica carpetas por resultado de validación (prueba.py)")
+    sub.add_argument('--ruta', required=True)
+    sub.add_argument('--simular', action='store_true', help="Solo genera el plan, no mueve nada")
+    sub.set_defaults(funcion=ejecutar_organizar)
+
+    sub = subparsers.add_parser('renombrar', help="Incrementa el sufijo de los ZIP (renombrador.py)")
+    grupo = sub.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--ruta', help="Carpeta con los ZIP")
+    grupo.add_argument('--deshacer', help="Registro deshacer_renombrado_*.jsonl a revertir")
+    sub.set_defaults(funcion=ejecutar_renombrar)
+
+    sub = subparsers.add_parser('capita', help="Convierte un libro RIPS de cápita a JSON (capita.py)")
+    sub.add_argument('--excel', required=True)
+    sub.add_argument('--compacto', action='store_true', help="JSON sin sangría")
+    sub.add_argument('--salida', default=None, help="Carpeta de salida (por defecto, la actual)")
+    sub.add_argument('--sin-validar', action='store_true', help="No validar el RIPS antes de escribir el JSON")
+    sub.add_argument('--forzar', action='store_true', help="Escribir el JSON aunque la validación encuentre errores")
+    sub.set_defaults(funcion=ejecutar_capita)
+
+    sub = subparsers.add_parser('metadatos', help="Lee número, CUFE, fecha, NIT y total de los XML y los guarda en caché")
+    sub.add_argument('--xml', required=True, help="Raíz del árbol de XML")
+    sub.add_argument('--salida', default=None, help="CSV con los metadatos de cada XML")
+    sub.set_defaults(funcion=ejecutar_metadatos)
+
+    sub = subparsers.add_parser('catalogo', help="Sincroniza el catálogo SQLite y consulta facturas sin XML/JSON/CUV")
+    sub.add_argument('--sincronizar', nargs='*', default=[], metavar='RUTA', help="Árboles a sincronizar")
+    sub.add_argument('--plano', action='store_true', help="Sincronizar solo el primer nivel de cada ruta")
+    sub.add_argument('--xlsx', default=None, help="Lista de facturas a consultar (xlsx/xls/csv/parquet)")
+    sub.add_argument('--columna', default='Factura')
+    sub.add_argument('--tipos', nargs='+', default=['xml', 'json', 'cuv'],
+                     choices=['xml', 'json', 'cuv', 'id0_r', 'locales', 'carpeta', 'carpeta_fe'])
+    sub.add_argument('--raiz', default=None, help="Limitar la consulta a los archivos bajo esta ruta")
+    sub.add_argument('--salida', default=None, help="CSV con las facturas faltantes")
+    sub.set_defaults(funcion=ejecutar_catalogo)
+
+    sub = subparsers.add_parser('vigilar', help="Crea y clasifica carpetas a medida que llegan XML, JSON y resultados (vigilante.py)")
+    sub.add_argument('--xml', required=True, help="Raíz del árbol de XML")
+    sub.add_argument('--json', required=True, help="Carpeta de FE*.json")
+    sub.add_argument('--destino', required=True, help="Carpeta de las facturas (la que organiza prueba.py)")
+    sub.add_argument('--espera', type=float, default=0.25, help="Segundos de silencio que cierran una ráfaga de eventos")
+    sub.add_argument('--sondeo', action='store_true', help="Revisar por mtime aunque esté instalado watchdog")
+    sub.add_argument('--intervalo', type=float, default=0.25,
+                     help="Segundos entre revisiones en modo sondeo (se suman a la latencia de cada evento)")
+    sub.set_defaults(funcion=ejecutar_vigilar)
+
+    sub = subparsers.add_parser('lote', help="Ejecuta los trabajos de un archivo TOML/YAML en un solo proceso")
+    sub.add_argument('archivo')
+    sub.add_argument('--detener-en-error', action='store_true')
+    sub.set_defaults(funcion=ejecutar_lote)
+
+    return parser
+
+
+def main(argv=None):
+    parser = construir_parser()
+    args = parser.parse_args(argv)
+
+    with ContextoLote(args.trabajadores_globales, args.indice, args.catalogo, args.metadatos) as contexto:
+        if args.funcion is ejecutar_lote:
+            exitoso = ejecutar_lote(args, contexto, parser)
+        else:
+            exitoso = args.funcion(args, contexto)
+    return 0 if exitoso else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import atexit
+import hashlib
+import os
+import shutil
+import threading
+
+
+# Modos de copia:
+#   copia   -> copia física (shutil.copy2), el comportamiento original
+#   enlace  -> enlace duro si origen y destino están en el mismo sistema de archivos
+#   reflink -> clon copy-on-write (Btrfs/XFS) si el sistema de archivos lo permite
+#   dedup   -> guarda cada contenido una sola vez en un almacén por hash y enlaza
+#              el destino a él, así los archivos repetidos entre ejecuciones no
+#              vuelven a ocupar espacio
+# Los modos enlace/reflink/dedup caen a copia física cuando no son posibles; en
+# dedup, si el almacén está en otro volumen que el destino, se copia directo
+# (pasar por el almacén sería copiar dos veces). Los hashes de dedup quedan en
+# un caché por (tamaño, mtime, inodo, ctime) dentro del almacén, así una
+# re-ejecución no vuelve a leer todo el árbol de origen.
+MODO_COPIA = 'copia'
+MODO_ENLACE = 'enlace'
+MODO_REFLINK = 'reflink'
+MODO_DEDUP = 'dedup'
+MODOS_COPIA = (MODO_COPIA, MODO_ENLACE, MODO_REFLINK, MODO_DEDUP)
+
+NOMBRE_ALMACEN = '.almacen_contenido'
+TAMANO_BLOQUE = 1024 * 1024
+FICLONE = 0x40049409  # ioctl de Linux para clonar un archivo (reflink)
+NOMBRE_CACHE_ALMACEN = 'cache_hashes.json'
+
+_caches_almacen = {}  # ruta del almacén -> verificacion.CacheHashes, uno por proceso
+_avisos_otro_volumen = set()
+_lock_almacen = threading.Lock()
+
+
+class ResultadoCopia:
+    """Acumula lo que hizo una copia de carpeta: archivos copiados, enlazados, omitidos y bytes escritos"""
+
+    def __init__(self):
+        self.archivos_copiados = 0
+        self.archivos_enlazados = 0
+        self.archivos_omitidos = 0
+        self.bytes_copiados = 0
+
+    def __repr__(self):
+        return (f"ResultadoCopia(copiados={self.archivos_copiados}, enlazados={self.archivos_enlazados}, "
+                f"omitidos={self.archivos_omitidos}, bytes={self.bytes_copiados})")
+
+
+def archivo_sin_cambios(origen, destino) -> bool:
+    """Indica si el destino ya tiene el mismo tamaño y fecha de modificación que el origen."""
+    try:
+        stat_origen = os.stat(origen)
+        stat_destino = os.stat(destino)
+    except OSError:
+        return False
+    # copy2 conserva el mtime; se tolera la resolución de 2 s de FAT/SMB
+    return (stat_origen.st_size == stat_destino.st_size and
+            abs(stat_origen.st_mtime - stat_destino.st_mtime) < 2)
+
+
+def hash_archivo(ruta, tamano_bloque=TAMANO_BLOQUE) -> str:
+    """SHA-256 del contenido del archivo, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _enlazar(origen, destino) -> bool:
+    """Crea un enlace duro; devuelve False si no es posible (otro volumen, FAT, permisos)."""
+    try:
+        if os.path.lexists(destino):
+            os.unlink(destino)
+        os.link(origen, destino)
+        return True
+    except OSError:
+        return False
+
+
+def _clonar(origen, destino) -> bool:
+    """Clona el archivo con reflink; devuelve False si el sistema no lo soporta."""
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        return False
+    _desvincular_compartido(destino)
+    try:
+        with open(origen, 'rb') as f_origen, open(destino, 'wb') as f_destino:
+            fcntl.ioctl(f_destino.fileno(), FICLONE, f_origen.fileno())
+        shutil.copystat(origen, destino)
+        return True
+    except OSError:
+        return False
+
+
+def _cache_almacen(ruta_almacen):
+    """Caché de hashes del almacén, cargado una vez por proceso y guardado al salir."""
+    with _lock_almacen:
+        cache = _caches_almacen.get(ruta_almacen)
+        if cache is None:
+            from verificacion import CacheHashes  # verificacion importa este módulo
+            cache = CacheHashes(os.path.join(ruta_almacen, NOMBRE_CACHE_ALMACEN))
+            if not _caches_almacen:
+                atexit.register(guardar_caches_almacen)
+            _caches_almacen[ruta_almacen] = cache
+        return cache
+
+
+def guardar_caches_almacen():
+    """Guarda los cachés de hashes de dedup; si no se puede, la próxima ejecución vuelve a hashear."""
+    with _lock_almacen:
+        caches = list(_caches_almacen.items())
+    for ruta_almacen, cache in caches:
+        try:
+            os.makedirs(ruta_almacen, exist_ok=True)
+            cache.guardar()
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el caché de hashes de {ruta_almacen}: {e}")
+
+
+def _volumen(ruta):
+    """Dispositivo del volumen de la ruta (o de la carpeta existente más cercana que la contiene)."""
+    ruta = os.path.abspath(ruta)
+    while not os.path.exists(ruta) and os.path.dirname(ruta) != ruta:
+        ruta = os.path.dirname(ruta)
+    return os.stat(ruta).st_dev
+
+
+def _guardar_en_almacen(origen, ruta_almacen, resultado) -> str:
+    """Guarda el contenido en el almacén (si no estaba) y devuelve su ruta."""
+    digest = _cache_almacen(ruta_almacen).hash(origen)
+    ruta_contenido = os.path.join(ruta_almacen, digest[:2], digest)
+    if not os.path.exists(ruta_contenido):
+        os.makedirs(os.path.dirname(ruta_contenido), exist_ok=True)
+        temporal = f"{ruta_contenido}.{os.getpid()}.tmp"
+        shutil.copy2(origen, temporal)
+        os.replace(temporal, ruta_contenido)
+        resultado.bytes_copiados += os.path.getsize(ruta_contenido)
+    return ruta_contenido
+
+
+def copiar_archivo(origen, destino, modo=MODO_COPIA, ruta_almacen=None, resultado=None):
+    """Copia un archivo según el modo indicado y acumula el resultado."""
+    if resultado is None:
+        resultado = ResultadoCopia()
+
+    if modo == MODO_ENLACE and _enlazar(origen, destino):
+        resultado.archivos_enlazados += 1
+        return destino
+
+    if modo == MODO_REFLINK and _clonar(origen, destino):
+        resultado.archivos_enlazados += 1
+        return destino
+
+    if modo == MODO_DEDUP:
+        ruta_contenido = _guardar_en_almacen(origen, ruta_almacen, resultado)
+        if _enlazar(ruta_contenido, destino):
+            resultado.archivos_enlazados += 1
+            return destino
+        origen = ruta_contenido
+
+    _desvincular_compartido(destino)
+    shutil.copy2(origen, destino)
+    resultado.archivos_copiados += 1
+    resultado.bytes_copiados += os.path.getsize(destino)
+    return destino
+
+
+def _desvincular_compartido(destino):
+    """Borra el destino si es un enlace, para no sobrescribir el contenido que comparte."""
+    try:
+        stat_destino = os.lstat(destino)
+    except OSError:
+        return
+    if os.path.islink(destino) or stat_destino.st_nlink > 1:
+        os.unlink(destino)
+
+
+def copiar_arbol(origen, destino, omitir_sin_cambios=False, modo=MODO_COPIA, ruta_almacen=None,
+                 nombre_destino=None) -> ResultadoCopia:
+    """Copia una carpeta completa (como copytree con dirs_exist_ok=True).
+
+    Con omitir_sin_cambios=True los archivos que ya existen en el destino con el
+    mismo tamaño y mtime no se vuelven a copiar, lo que abarata las re-ejecuciones.
+    En modo dedup el almacén por defecto queda junto a las carpetas de destino.
+
+    nombre_destino(nombre) permite filtrar y renombrar durante la misma copia:
+    devuelve el nombre con que se escribe el archivo, o None para no copiarlo
+    (ver reglas_copia.py). Los archivos filtrados cuentan como omitidos.
+
+    Los modos enlace/reflink/dedup comparten el contenido con el origen o el
+    almacén: quien modifique luego el destino debe reemplazar el archivo
+    (escribir a un temporal y renombrar), no reescribirlo en el sitio.
+    """
+    if modo not in MODOS_COPIA:
+        raise ValueError(f"Modo de copia desconocido: {modo}. Use uno de {MODOS_COPIA}")
+    if modo == MODO_DEDUP and ruta_almacen is None:
+        ruta_almacen = os.path.join(os.path.dirname(os.path.abspath(destino)), NOMBRE_ALMACEN)
+    if modo == MODO_DEDUP and _volumen(ruta_almacen) != _volumen(destino):
+        # No se puede enlazar entre volúmenes: pasar por el almacén copiaría cada archivo dos veces
+        with _lock_almacen:
+            avisar = ruta_almacen not in _avisos_otro_volumen
+            _avisos_otro_volumen.add(ruta_almacen)
+        if avisar:
+            print(f"⚠️ El almacén {ruta_almacen} está en otro volumen que el destino: se hace copia física")
+        modo = MODO_COPIA
+
+    resultado = ResultadoCopia()
+
+    def copiar(ruta_origen, ruta_destino):
+        if nombre_destino is not None:
+            nuevo = nombre_destino(os.path.basename(ruta_origen))
+            ruta_destino = os.path.join(os.path.dirname(ruta_destino), nuevo)
+        if omitir_sin_cambios and archivo_sin_cambios(ruta_origen, ruta_destino):
+            resultado.archivos_omitidos += 1
+            return ruta_destino
+        return copiar_archivo(ruta_origen, ruta_destino, modo, ruta_almacen, resultado)
+
+    def ignorar(directorio, nombres):
+        omitidos = {nombre for nombre in nombres if nombre_destino(nombre) is None}
+        resultado.archivos_omitidos += len(omitidos)
+        return omitidos
+
+    shutil.copytree(origen, destino, ignore=ignorar if nombre_destino is not None else None,
+                    copy_function=copiar, dirs_exist_ok=True)
+    return resultado
+
+
+def ruta_almacen_para(ruta_destino) -> str:
+    """Almacén de dedup junto a la carpeta de destino, compartido entre ejecuciones (meses)."""
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_destino)), NOMBRE_ALMACEN)
+
+
+def solicitar_modo_copia() -> str:
+    """Pregunta el modo de copia por consola (Enter = copia física)."""
+    while True:
+        modo = input(f"🔗 Modo de copia {MODOS_COPIA} (Enter = {MODO_COPIA}): ").strip().lower()
+        if not modo:
+            return MODO_COPIA
+        if modo in MODOS_COPIA:
+            return modo
+        print(f"⚠️ Modo no válido: {modo}")
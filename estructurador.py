@@ -1,9 +1,16 @@
 import os
 import shutil
 import json
-import pandas as pd
 import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from lector_facturas import leer_facturas
+from copiado import MODO_COPIA, copiar_arbol, ruta_almacen_para, solicitar_modo_copia
+from reportes import CARPETA_REPORTES, COPIADA, FALLIDA, NO_ENCONTRADA, ReporteEjecucion
+
+PROCESO_REPORTE = 'estructurador'
 
 
 def validar_ruta(ruta):
@@ -14,62 +21,87 @@ def validar_ruta(ruta):
 def procesar_archivo_xlsx(ruta_xlsx, columna):
     """Procesa el archivo .xlsx y devuelve lista de números de factura"""
     try:
-        df = pd.read_excel(ruta_xlsx)
-        if columna not in df.columns:
-            print(f"La columna {columna} no se encuentra en el archivo .xlsx.")
-            return []
-        return [str(numero) for numero in df[columna].dropna().astype(str)]
+        return leer_facturas(ruta_xlsx, columna)
+    except ValueError as e:
+        # Columna inexistente o formato no soportado: el mensaje dice cuál
+        print(f"No se pudieron leer las facturas de {ruta_xlsx}: {e}")
+        return []
     except Exception as e:
         print(f"Error al leer el archivo .xlsx: {e}")
         return []
 
 
-def copiar_carpetas(facturas, origen, destino):
-    """Copia carpetas de facturas desde origen a destino"""
+def copiar_carpetas(facturas, origen, destino, modo=MODO_COPIA, reporte=None):
+    """Copia carpetas de facturas desde origen a destino (modo: ver copiado.MODOS_COPIA)
+
+    El resultado de cada factura queda en el reporte de la ejecución (ver
+    reportes.py); sin reporte se abre uno en <destino>/reportes y se cierra al final.
+    """
     if not os.path.exists(destino):
         os.makedirs(destino)
+    ruta_almacen = ruta_almacen_para(destino)
+    reporte_propio = reporte is None
+    if reporte_propio:
+        reporte = ReporteEjecucion(os.path.join(destino, CARPETA_REPORTES), PROCESO_REPORTE)
 
     copiadas = []
-    no_encontradas = []
     for factura in facturas:
         nombre_carpeta = f"AttachedDocument_F-010-{factura}"
         origen_carpeta = os.path.join(origen, nombre_carpeta)
         destino_carpeta = os.path.join(destino, nombre_carpeta)
 
-        if os.path.exists(origen_carpeta):
-            shutil.copytree(origen_carpeta, destino_carpeta, dirs_exist_ok=True)
-            copiadas.append(destino_carpeta)
-            print(f"✅ Copiada: {nombre_carpeta}")
-        else:
+        if not os.path.exists(origen_carpeta):
             print(f"⚠️ No encontrada: {nombre_carpeta}")
-            no_encontradas.append(factura)
+            reporte.registrar(factura, NO_ENCONTRADA, "carpeta no existe en el origen")
+            continue
 
-    # Guardar facturas no encontradas en un Excel
-    if no_encontradas:
-        excel_path = os.path.join(destino, "facturas_no_encontradas.xlsx")
+        inicio = time.perf_counter()
         try:
-            df = pd.DataFrame({"Factura": no_encontradas})
-            df.to_excel(excel_path, index=False)
-            print(f"Facturas no encontradas guardadas en {excel_path}")
-        except Exception as e:
-            print(f"Error al escribir en {excel_path}: {e}")
+            resultado = copiar_arbol(origen_carpeta, destino_carpeta, modo=modo, ruta_almacen=ruta_almacen)
+        except (OSError, shutil.Error) as e:
+            print(f"❌ Error al copiar {nombre_carpeta}: {e}")
+            reporte.registrar(factura, FALLIDA, str(e), segundos=time.perf_counter() - inicio)
+            continue
+        reporte.registrar(factura, COPIADA, bytes_copiados=resultado.bytes_copiados,
+                          segundos=time.perf_counter() - inicio)
+        copiadas.append(destino_carpeta)
+        print(f"✅ Copiada: {nombre_carpeta}")
 
+    if reporte_propio:
+        print(f"📊 Reporte de la ejecución en {reporte.cerrar()}")
     return copiadas
 
 
-def reestructurar_archivo(factura, ruta_carpeta):
-    """Reestructura el archivo JSON ResultadosMSPS_FE{factura}_ID0_R.txt"""
-    archivo_json = os.path.join(ruta_carpeta, f"ResultadosMSPS_FE{factura}_ID0_R.txt")
+# Patrones precompilados para las Observaciones del MSPS
+PATRON_PROCESO_ID = re.compile(r"ProcesoId (\d+)")
+PATRON_CUV = re.compile(r"[0-9a-f]{128}")
+
+# Estados que devuelve la reestructuración de un archivo
+REESTRUCTURADO = 'reestructurado'
+YA_REESTRUCTURADO = 'ya_reestructurado'
+NO_ENCONTRADO = 'no_encontrado'
+ERROR = 'error'
 
-    if not os.path.exists(archivo_json):
-        print(f"⚠️ Archivo {os.path.basename(archivo_json)} no encontrado en {ruta_carpeta}")
-        return False
+
+def _reestructurar(factura, ruta_carpeta):
+    """Reestructura ResultadosMSPS_FE{factura}_ID0_R.txt sin imprimir; devuelve (estado, mensaje)"""
+    archivo_json = os.path.join(ruta_carpeta, f"ResultadosMSPS_FE{factura}_ID0_R.txt")
+    nombre_archivo = os.path.basename(archivo_json)
 
     try:
         # Leer el JSON original
         with open(archivo_json, 'r', encoding='utf-8') as f:
             data = json.load(f)
+    except FileNotFoundError:
+        return NO_ENCONTRADO, f"Archivo {nombre_archivo} no encontrado en {ruta_carpeta}"
+    except Exception as e:
+        return ERROR, f"Error al reestructurar {nombre_archivo}: {e}"
+
+    # Si ya tiene la nueva estructura no se vuelve a escribir
+    if "ResultState" in data and "CodigoUnicoValidacion" in data:
+        return YA_REESTRUCTURADO, f"{nombre_archivo} ya estaba reestructurado"
 
+    try:
         # Extraer ProcesoId y CodigoUnicoValidacion de Observaciones
         proceso_id = 0  # Valor predeterminado si no se encuentra
         codigo_unico = ""  # Valor predeterminado si no se encuentra
@@ -78,15 +110,13 @@ def reestructurar_archivo(factura, ruta_carpeta):
         if data.get("ResultadosValidacion") and len(data["ResultadosValidacion"]) > 0:
             # Buscar ProcesoId
             observaciones = data["ResultadosValidacion"][0].get("Observaciones", "")
-            match_proceso = re.search(r"ProcesoId (\d+)", observaciones)
+            match_proceso = PATRON_PROCESO_ID.search(observaciones)
             if match_proceso:
                 proceso_id = int(match_proceso.group(1))
 
             # Buscar CodigoUnicoValidacion en Observaciones
             for validacion in data["ResultadosValidacion"]:
-                print(validacion.get("Observaciones", ""))
-                obs = validacion.get("Observaciones", "")
-                match_cuv = re.search(r"[0-9a-f]{128}", obs)
+                match_cuv = PATRON_CUV.search(validacion.get("Observaciones", ""))
                 if match_cuv:
                     codigo_unico = match_cuv.group(0)
                     break
@@ -108,14 +138,63 @@ def reestructurar_archivo(factura, ruta_carpeta):
             "ResultadosValidacion": resultados_validacion
         }
 
-        # Escribir el nuevo JSON
-        with open(archivo_json, 'w', encoding='utf-8') as f:
-            json.dump(nueva_data, f, indent=2, ensure_ascii=False)
-        print(f"✅ Reestructurado: {os.path.basename(archivo_json)} en {ruta_carpeta} con ProcesoId {proceso_id}")
-        return True
+        # Escribir el nuevo JSON en un temporal y reemplazar: una caída nunca deja
+        # un JSON a medias y, si la carpeta se copió con enlaces
+        # (copiado.MODO_ENLACE/MODO_DEDUP), no se toca el archivo de origen
+        temporal = f"{archivo_json}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(nueva_data, f, indent=2, ensure_ascii=False)
+            os.replace(temporal, archivo_json)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return REESTRUCTURADO, f"Reestructurado: {nombre_archivo} en {ruta_carpeta} con ProcesoId {proceso_id}"
     except Exception as e:
-        print(f"Error al reestructurar {os.path.basename(archivo_json)}: {e}")
-        return False
+        return ERROR, f"Error al reestructurar {nombre_archivo}: {e}"
+
+
+def _reestructurar_tarea(tarea):
+    """Adaptador para el pool de procesos: recibe (factura, ruta_carpeta)"""
+    return _reestructurar(*tarea)
+
+
+def reestructurar_archivo(factura, ruta_carpeta):
+    """Reestructura el archivo JSON ResultadosMSPS_FE{factura}_ID0_R.txt"""
+    estado, mensaje = _reestructurar(factura, ruta_carpeta)
+    iconos = {REESTRUCTURADO: "✅", YA_REESTRUCTURADO: "⏭️", NO_ENCONTRADO: "⚠️", ERROR: "❌"}
+    print(f"{iconos[estado]} {mensaje}")
+    return estado in (REESTRUCTURADO, YA_REESTRUCTURADO)
+
+
+def reestructurar_lote(tareas, trabajadores=None, executor=None):
+    """Reestructura muchos archivos en un pool de procesos.
+
+    tareas es una lista de (factura, ruta_carpeta). Devuelve ({estado: cantidad},
+    [mensajes de error o de archivos no encontrados]); no imprime por archivo.
+    Si se recibe un executor (pool compartido entre trabajos) se usa ese y no se cierra.
+    """
+    resumen = Counter()
+    problemas = []
+
+    def acumular(resultados):
+        for estado, mensaje in resultados:
+            resumen[estado] += 1
+            if estado in (NO_ENCONTRADO, ERROR):
+                problemas.append(mensaje)
+
+    trabajadores = trabajadores or os.cpu_count() or 1
+    # Para lotes pequeños no compensa arrancar procesos
+    if trabajadores == 1 or len(tareas) < 50:
+        acumular(map(_reestructurar_tarea, tareas))
+    elif executor is not None:
+        chunksize = max(1, len(tareas) // (trabajadores * 8))
+        acumular(executor.map(_reestructurar_tarea, tareas, chunksize=chunksize))
+    else:
+        chunksize = max(1, len(tareas) // (trabajadores * 8))
+        with ProcessPoolExecutor(max_workers=trabajadores) as executor:
+            acumular(executor.map(_reestructurar_tarea, tareas, chunksize=chunksize))
+    return resumen, problemas
 
 
 def main():
@@ -125,11 +204,24 @@ def main():
         columna = input("Ingrese el nombre de la columna con números de facturas 📋: ")
         ruta_carpetas = input("Ingrese la ruta de las carpetas 📂: ")
         ruta_destino = input("Ingrese la ruta de destino 📁: ")
+        modo_copia = solicitar_modo_copia()
+        excel = input("¿Generar también el Excel de facturas no encontradas? (s/n) 📊: ").strip().lower() == 's'
     except EOFError:
         print(
             "❌ Error: No se pudo leer la entrada. Asegúrese de proporcionar las rutas interactivamente o use argumentos de línea de comandos.")
         return
 
+    ejecutar(ruta_xlsx, columna, ruta_carpetas, ruta_destino, modo_copia, excel=excel)
+
+
+def ejecutar(ruta_xlsx, columna, ruta_carpetas, ruta_destino, modo_copia=MODO_COPIA, executor=None,
+             trabajadores=None, excel=False):
+    """Copia y reestructura las carpetas de las facturas del Excel sin hacer preguntas.
+
+    Con excel=True, además del reporte de la ejecución se escribe un .xlsx con
+    las facturas no encontradas o fallidas. Devuelve el resumen {estado: cantidad}
+    de la reestructuración, o None si no se pudo ejecutar.
+    """
     # Validar rutas
     if not validar_ruta(ruta_xlsx):
         print("⚠️ Verifique la ruta del archivo .xlsx y vuelva a intentarlo.")
@@ -150,14 +242,30 @@ def main():
     print(f"Facturas encontradas: {facturas}")
 
     # Copiar carpetas y obtener las rutas de las carpetas copiadas
-    carpetas_copiadas = copiar_carpetas(facturas, ruta_carpetas, ruta_destino)
+    reporte = ReporteEjecucion(os.path.join(ruta_destino, CARPETA_REPORTES), PROCESO_REPORTE)
+    with reporte:
+        carpetas_copiadas = copiar_carpetas(facturas, ruta_carpetas, ruta_destino, modo_copia, reporte)
+    print(f"📊 {reporte.resumen()} (reporte en {reporte.ruta_particion})")
+    if excel and (reporte.conteo[NO_ENCONTRADA] or reporte.conteo[FALLIDA]):
+        ruta_excel = os.path.join(ruta_destino, f"facturas_no_encontradas_{reporte.ejecucion}.xlsx")
+        filas = reporte.exportar_excel(ruta_excel, [NO_ENCONTRADA, FALLIDA])
+        print(f"Facturas no encontradas guardadas en {ruta_excel} ({filas})")
 
-    # Reestructurar archivos JSON en las carpetas copiadas
+    # Reestructurar archivos JSON en las carpetas copiadas (en paralelo)
+    carpetas_copiadas = set(carpetas_copiadas)
+    tareas = []
     for factura in facturas:
         nombre_carpeta = f"AttachedDocument_F-010-{factura}"
         ruta_carpeta = os.path.join(ruta_destino, nombre_carpeta)
         if ruta_carpeta in carpetas_copiadas:
-            reestructurar_archivo(factura, ruta_carpeta)
+            tareas.append((factura, ruta_carpeta))
+
+    resumen, problemas = reestructurar_lote(tareas, trabajadores, executor)
+    for problema in problemas:
+        print(f"⚠️ {problema}")
+    print(f"✅ Reestructurados: {resumen[REESTRUCTURADO]} | ⏭️ Ya reestructurados: {resumen[YA_REESTRUCTURADO]} | "
+          f"⚠️ No encontrados: {resumen[NO_ENCONTRADO]} | ❌ Errores: {resumen[ERROR]}")
+    return resumen
 
 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
 import os
 import shutil
-import pandas as pd
+import time
+from catalogo import IndiceCatalogo
+from indice_facturas import IndiceFacturas, PATRON_JSON, PATRON_XML
+from lector_facturas import leer_facturas
+from metadatos_xml import IndiceMetadatos
+from reportes import CARPETA_REPORTES, COPIADA, FALLIDA, NO_ENCONTRADA, ReporteEjecucion
+
+PROCESO_REPORTE = 'faltantes'
 
 
 def crear_directorio(ruta):
@@ -22,24 +29,25 @@ def copiar_archivo(origen, destino):
 def leer_numeros_factura(ruta_xlsx):
     """Lee los números de factura desde un archivo .xlsx."""
     try:
-        # Leer el archivo Excel
-        df = pd.read_excel(ruta_xlsx, engine='openpyxl')
-        # Asumiendo que la columna se llama 'Factura', ajusta si es diferente
-        if 'Factura' not in df.columns:
-            print(f"Error: No se encontró la columna 'Factura' en {ruta_xlsx}. Columnas disponibles: {list(df.columns)}")
-            return []
-        # Convertir a lista, sin agregar FE todavía
-        return [str(numero) for numero in df['Factura'].dropna().astype(str)]
+        # Asumiendo que la columna se llama 'Factura', ajusta si es diferente.
+        # Se devuelven sin agregar FE todavía
+        return leer_facturas(ruta_xlsx, 'Factura')
+    except ValueError as e:
+        # Columna inexistente o formato no soportado: el mensaje dice cuál
+        print(f"Error: No se pudieron leer las facturas de {ruta_xlsx}. {e}")
+        return []
     except Exception as e:
         print(f"Error al leer el archivo .xlsx: {str(e)}")
         return []
 
 
 def buscar_xml_recursivo(ruta_base, numero_factura):
-    """Busca recursivamente un archivo XML que contenga el número de factura."""
+    """Busca recursivamente el XML cuyo nombre termina en el número de factura."""
     for raiz, _, archivos in os.walk(ruta_base):
         for archivo in archivos:
-            if archivo.endswith('.xml') and numero_factura in archivo:
+            # Número exacto: la factura 2008 no debe encontrar AttachedDocument_F-010-200816.xml
+            match = PATRON_XML.search(archivo)
+            if match and match.group(1) == numero_factura:
                 return os.path.join(raiz, archivo)
     return None
 
@@ -47,9 +55,9 @@ def buscar_xml_recursivo(ruta_base, numero_factura):
 def buscar_json(ruta_json_base, numero_factura):
     """Busca un archivo JSON con el número de factura (FE + número)."""
     try:
-        numero_factura_fe = f"FE{numero_factura}"
         for archivo in os.listdir(ruta_json_base):
-            if archivo.endswith('.json') and numero_factura_fe in archivo:
+            match = PATRON_JSON.search(archivo)
+            if match and match.group(1) == numero_factura:
                 return archivo
         return None
     except Exception as e:
@@ -57,13 +65,12 @@ def buscar_json(ruta_json_base, numero_factura):
         return None
 
 
-def guardar_facturas_no_encontradas(facturas_no_encontradas, ruta_destino):
-    """Guarda los números de factura no encontrados en un archivo .xlsx."""
+def guardar_facturas_no_encontradas(reporte, ruta_destino):
+    """Exporta a .xlsx las facturas no encontradas o fallidas del reporte (ya cerrado) de la ejecución."""
     try:
-        if facturas_no_encontradas:
-            df = pd.DataFrame(facturas_no_encontradas, columns=["Factura"])
-            ruta_salida = os.path.join(ruta_destino, "facturas_no_encontradas.xlsx")
-            df.to_excel(ruta_salida, index=False, engine='openpyxl')
+        if reporte.conteo[NO_ENCONTRADA] or reporte.conteo[FALLIDA]:
+            ruta_salida = os.path.join(ruta_destino, f"facturas_no_encontradas_{reporte.ejecucion}.xlsx")
+            reporte.exportar_excel(ruta_salida, [NO_ENCONTRADA, FALLIDA])
             print(f"Facturas no encontradas guardadas en: {ruta_salida}")
         else:
             print("Todas las facturas tuvieron XML asociado. No se creó archivo de no encontradas.")
@@ -71,13 +78,25 @@ def guardar_facturas_no_encontradas(facturas_no_encontradas, ruta_destino):
         print(f"Error al guardar facturas no encontradas: {str(e)}")
 
 
-def procesar_factura(numero_factura, ruta_base_xml, ruta_json_base, ruta_destino, facturas_no_encontradas):
-    """Procesa una factura: busca XML y JSON, y los copia solo si existe el XML."""
+def procesar_factura(numero_factura, ruta_base_xml, ruta_json_base, ruta_destino, facturas_no_encontradas,
+                     indice=None, reporte=None):
+    """Procesa una factura: busca XML y JSON, y los copia solo si existe el XML.
+
+    Si se recibe un IndiceFacturas ya actualizado, las búsquedas son consultas
+    directas al índice en lugar de recorrer el árbol de carpetas. Con un
+    reportes.ReporteEjecucion se registra el resultado de la factura.
+    """
+    inicio = time.perf_counter()
     # Buscar XML primero
-    ruta_xml = buscar_xml_recursivo(ruta_base_xml, numero_factura)
+    if indice is not None:
+        ruta_xml = indice.buscar_xml(numero_factura)
+    else:
+        ruta_xml = buscar_xml_recursivo(ruta_base_xml, numero_factura)
     if not ruta_xml:
         print(f"No se encontró XML para factura {numero_factura}. No se creará carpeta.")
         facturas_no_encontradas.append(numero_factura)
+        if reporte is not None:
+            reporte.registrar(numero_factura, NO_ENCONTRADA, "sin XML")
         return
 
     # Extraer el nombre del XML sin extensión para la carpeta
@@ -90,17 +109,34 @@ def procesar_factura(numero_factura, ruta_base_xml, ruta_json_base, ruta_destino
 
     # Copiar XML
     ruta_xml_destino = os.path.join(ruta_carpeta, archivo_xml)
-    copiar_archivo(ruta_xml, ruta_xml_destino)
+    if not copiar_archivo(ruta_xml, ruta_xml_destino):
+        if reporte is not None:
+            reporte.registrar(numero_factura, FALLIDA, "no se pudo copiar el XML",
+                              segundos=time.perf_counter() - inicio)
+        return
+    copiados = os.path.getsize(ruta_xml_destino)
 
     # Buscar y copiar JSON
-    archivo_json = buscar_json(ruta_json_base, numero_factura)
+    if indice is not None:
+        ruta_json_origen = indice.buscar_json(numero_factura)
+        archivo_json = os.path.basename(ruta_json_origen) if ruta_json_origen else None
+    else:
+        archivo_json = buscar_json(ruta_json_base, numero_factura)
+        ruta_json_origen = os.path.join(ruta_json_base, archivo_json) if archivo_json else None
+    motivo = ''
     if archivo_json:
-        ruta_json_origen = os.path.join(ruta_json_base, archivo_json)
         ruta_json_destino = os.path.join(ruta_carpeta, archivo_json)
-        copiar_archivo(ruta_json_origen, ruta_json_destino)
-        print(f"Procesado {nombre_carpeta}: XML y JSON copiados.")
+        if copiar_archivo(ruta_json_origen, ruta_json_destino):
+            copiados += os.path.getsize(ruta_json_destino)
+            print(f"Procesado {nombre_carpeta}: XML y JSON copiados.")
+        else:
+            motivo = "no se pudo copiar el JSON"
     else:
+        motivo = "sin JSON"
         print(f"Procesado {nombre_carpeta}: Solo XML copiado.")
+    if reporte is not None:
+        reporte.registrar(numero_factura, COPIADA, motivo, bytes_copiados=copiados,
+                          segundos=time.perf_counter() - inicio)
 
 
 def main():
@@ -109,7 +145,25 @@ def main():
     ruta_base_xml = input("Ingrese la ruta base de los archivos XML (árbol de carpetas): ")
     ruta_json_base = input("Ingrese la ruta de la carpeta con archivos JSON: ")
     ruta_destino = input("Ingrese la ruta destino para las carpetas: ")
+    excel = input("¿Generar también el Excel de facturas no encontradas? (s/n): ").strip().lower() == 's'
 
+    ejecutar(ruta_xlsx, ruta_base_xml, ruta_json_base, ruta_destino, excel=excel)
+
+
+def ejecutar(ruta_xlsx, ruta_base_xml, ruta_json_base, ruta_destino, indice=None, catalogo=None,
+             metadatos=None, executor=None, excel=False):
+    """Ejecuta el proceso completo sin preguntas; devuelve las facturas sin XML (None si no se pudo ejecutar).
+
+    Con un IndiceFacturas compartido (por ejemplo, en un lote de cli.py) el índice
+    no se guarda aquí: lo guarda quien lo creó. Con un catalogo.Catalogo las
+    búsquedas se hacen contra el catálogo SQLite en lugar del índice JSON. Con
+    un metadatos_xml.CacheMetadatos el XML de cada factura se busca por el
+    número que trae el XML por dentro (se leen en el pool de procesos executor).
+
+    El resultado de cada factura queda en <destino>/reportes/faltantes (una
+    partición por ejecución, ver reportes.py); el .xlsx de no encontradas solo
+    se escribe con excel=True.
+    """
     # Validar rutas
     if not os.path.exists(ruta_xlsx):
         print("El archivo .xlsx no existe. Verifica e intenta nuevamente.")
@@ -129,17 +183,42 @@ def main():
         print("No se encontraron números de factura en el archivo .xlsx.")
         return
 
+    # Actualizar el índice de XML y JSON (solo se relistan los directorios modificados)
+    if catalogo is not None:
+        indice = IndiceCatalogo(catalogo, ruta_base_xml, ruta_json_base)
+        indice.actualizar()
+        print(f"Catálogo actualizado ({catalogo.directorios_escaneados} directorios escaneados).")
+    else:
+        indice_propio = indice is None
+        if indice_propio:
+            indice = IndiceFacturas()
+        if metadatos is not None:
+            indice = IndiceMetadatos(metadatos, indice, executor=executor)
+        indice.actualizar(ruta_base_xml, ruta_json_base)
+        if indice_propio:
+            indice.guardar()
+        if metadatos is not None:
+            print(f"Metadatos: {metadatos.leidos} XML leídos, {len(indice.duplicados)} facturas con más de un XML.")
+        print(f"Índice actualizado: {len(indice.xml_por_numero)} XML y {len(indice.json_por_numero)} JSON "
+              f"({indice.directorios_escaneados} directorios escaneados).")
+
     # Lista para almacenar facturas no encontradas
     facturas_no_encontradas = []
 
     # Procesar cada número de factura
-    for numero_factura in numeros_factura:
-        procesar_factura(numero_factura, ruta_base_xml, ruta_json_base, ruta_destino, facturas_no_encontradas)
+    reporte = ReporteEjecucion(os.path.join(ruta_destino, CARPETA_REPORTES), PROCESO_REPORTE)
+    with reporte:
+        for numero_factura in numeros_factura:
+            procesar_factura(numero_factura, ruta_base_xml, ruta_json_base, ruta_destino, facturas_no_encontradas,
+                             indice=indice, reporte=reporte)
+    print(f"Reporte de la ejecución ({reporte.resumen()}) en: {reporte.ruta_particion}")
 
-    # Guardar facturas no encontradas en un .xlsx
-    guardar_facturas_no_encontradas(facturas_no_encontradas, ruta_destino)
+    # Guardar facturas no encontradas en un .xlsx, solo si se pidió
+    if excel:
+        guardar_facturas_no_encontradas(reporte, ruta_destino)
 
     print("Procesamiento completado.")
+    return facturas_no_encontradas
 
 
 if __name__ == "__main__":
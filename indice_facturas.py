@@ -0,0 +1,118 @@
+import json
+import os
+import re
+
+
+# Índice persistente que relaciona el número de factura con su XML y su JSON.
+# Se guarda en disco y se mantiene actualizado comparando el mtime de cada
+# directorio: solo se vuelven a listar los directorios que cambiaron.
+
+RUTA_INDICE_PREDETERMINADA = 'indice_facturas.json'
+VERSION_INDICE = 1
+
+# Ej: AttachedDocument_F-010-200816.xml -> 200816
+PATRON_XML = re.compile(r'(\d+)\.xml$', re.IGNORECASE)
+# Ej: FE200816.json -> 200816
+PATRON_JSON = re.compile(r'FE(\d+).*\.json$', re.IGNORECASE)
+
+
+class IndiceFacturas:
+    """Índice en disco de número de factura -> ruta XML y FE<número> -> ruta JSON"""
+
+    def __init__(self, ruta_indice=RUTA_INDICE_PREDETERMINADA):
+        self.ruta_indice = ruta_indice
+        # {"<extensión>|<raíz>": {directorio: {"mtime": int, "subdirectorios": [...], "archivos": [...]}}}
+        self.raices = {}
+        self.xml_por_numero = {}
+        self.json_por_numero = {}
+        self.rutas_xml = []
+        self.directorios_escaneados = 0
+        self.cargar()
+
+    def cargar(self):
+        """Carga el índice desde disco si existe y es de la versión actual."""
+        if not os.path.exists(self.ruta_indice):
+            return
+        try:
+            with open(self.ruta_indice, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get('version') == VERSION_INDICE:
+                self.raices = datos.get('raices', {})
+        except Exception as e:
+            print(f"Índice ilegible, se reconstruirá: {str(e)}")
+            self.raices = {}
+
+    def guardar(self):
+        """Guarda el índice en disco de forma atómica."""
+        temporal = f"{self.ruta_indice}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'version': VERSION_INDICE, 'raices': self.raices}, f)
+        os.replace(temporal, self.ruta_indice)
+
+    def _escanear(self, raiz, extension, recursivo):
+        """Recorre la raíz y vuelve a listar solo los directorios cuyo mtime cambió."""
+        raiz = os.path.abspath(raiz)
+        clave = f"{extension}|{raiz}"  # La misma raíz puede indexarse para XML y para JSON
+        anteriores = self.raices.get(clave, {})
+        actuales = {}
+        pendientes = [raiz]
+
+        while pendientes:
+            directorio = pendientes.pop()
+            try:
+                mtime = os.stat(directorio).st_mtime_ns
+            except OSError:
+                continue
+
+            entrada = anteriores.get(directorio)
+            if entrada is None or entrada['mtime'] != mtime:
+                subdirectorios, archivos = [], []
+                try:
+                    with os.scandir(directorio) as it:
+                        for elemento in it:
+                            if elemento.is_dir():
+                                if recursivo and not elemento.is_symlink():
+                                    subdirectorios.append(elemento.path)
+                            elif elemento.name.lower().endswith(extension):
+                                archivos.append(elemento.name)
+                except OSError as e:
+                    print(f"Error al listar {directorio}: {str(e)}")
+                    continue
+                entrada = {'mtime': mtime, 'subdirectorios': subdirectorios, 'archivos': archivos}
+                self.directorios_escaneados += 1
+
+            actuales[directorio] = entrada
+            pendientes.extend(entrada['subdirectorios'])
+
+        self.raices[clave] = actuales
+        return actuales
+
+    def actualizar(self, ruta_base_xml, ruta_json_base):
+        """Sincroniza el índice con el árbol de XML y la carpeta de JSON."""
+        self.directorios_escaneados = 0
+        directorios_xml = self._escanear(ruta_base_xml, '.xml', recursivo=True)
+        directorios_json = self._escanear(ruta_json_base, '.json', recursivo=False)
+
+        self.xml_por_numero = {}
+        self.rutas_xml = []
+        for directorio in sorted(directorios_xml):
+            for archivo in directorios_xml[directorio]['archivos']:
+                self.rutas_xml.append(os.path.join(directorio, archivo))
+                match = PATRON_XML.search(archivo)
+                if match:
+                    self.xml_por_numero.setdefault(match.group(1), os.path.join(directorio, archivo))
+
+        self.json_por_numero = {}
+        for directorio, entrada in directorios_json.items():
+            for archivo in sorted(entrada['archivos']):
+                match = PATRON_JSON.search(archivo)
+                if match:
+                    self.json_por_numero.setdefault(match.group(1), os.path.join(directorio, archivo))
+
+    def buscar_xml(self, numero_factura):
+        """Devuelve la ruta del XML de la factura o None."""
+        return self.xml_por_numero.get(numero_factura)
+
+    def buscar_json(self, numero_factura):
+        """Devuelve la ruta del JSON FE<número> de la factura o None."""
+        return self.json_por_numero.get(numero_factura)
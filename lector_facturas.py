@@ -0,0 +1,151 @@
+import csv
+import hashlib
+import json
+import os
+import re
+from typing import List, Optional
+
+from copiado import hash_archivo
+
+
+# Lector compartido de listas de números de factura (xlsx, xls, csv o parquet).
+# Lee solo la columna pedida y guarda el resultado en una caché indexada por el
+# hash del archivo, de modo que volver a abrir el mismo Excel es inmediato.
+# La caché va junto a este módulo (o en FACTURAS_CACHE), no en el directorio de
+# trabajo, y es opcional: si no se puede escribir, la lectura sigue igual.
+
+CARPETA_CACHE = os.environ.get('FACTURAS_CACHE',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_facturas'))
+VERSION_CACHE = 1
+
+PATRON_DECIMAL_CERO = re.compile(r'^(\d+)\.0+$')
+
+
+def normalizar_numero(valor) -> Optional[str]:
+    """Convierte el valor de la celda en número de factura como texto (200816.0 -> '200816')."""
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return None
+        if valor.is_integer():
+            return str(int(valor))
+        return str(valor)
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    match = PATRON_DECIMAL_CERO.match(texto)
+    return match.group(1) if match else texto
+
+
+def _columna_no_encontrada(columna, columnas):
+    return ValueError(f"La columna '{columna}' no existe. Columnas disponibles: {list(columnas)}")
+
+
+def _leer_xlsx(ruta, columna):
+    """Lee una columna de la primera hoja en modo solo lectura (streaming)."""
+    from openpyxl import load_workbook
+
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        filas = hoja.iter_rows(values_only=True)
+        encabezado = [str(nombre) if nombre is not None else '' for nombre in next(filas, ())]
+        if columna not in encabezado:
+            raise _columna_no_encontrada(columna, encabezado)
+        indice = encabezado.index(columna) + 1
+        return [fila[0] for fila in hoja.iter_rows(min_row=2, min_col=indice, max_col=indice, values_only=True)]
+    finally:
+        libro.close()
+
+
+def _leer_xls(ruta, columna):
+    """Lee una columna de un Excel 97-2003 (.xls) con pandas (requiere xlrd)."""
+    import pandas as pd
+
+    # Un .xls tiene como mucho 65536 filas: se lee la hoja entera y se valida la columna como en los demás lectores
+    hoja = pd.read_excel(ruta, dtype=object)
+    hoja.columns = [str(nombre) for nombre in hoja.columns]
+    if columna not in hoja.columns:
+        raise _columna_no_encontrada(columna, hoja.columns)
+    return hoja[columna].tolist()
+
+
+def _leer_csv(ruta, columna):
+    """Lee una columna de un CSV (se detecta ',' o ';' como separador)."""
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(f, dialecto)
+        encabezado = [nombre.strip() for nombre in next(lector, [])]
+        if columna not in encabezado:
+            raise _columna_no_encontrada(columna, encabezado)
+        indice = encabezado.index(columna)
+        return [fila[indice] if indice < len(fila) else None for fila in lector]
+
+
+def _leer_parquet(ruta, columna):
+    """Lee una columna de un archivo Parquet (requiere pandas con pyarrow)."""
+    import pandas as pd
+
+    try:
+        return pd.read_parquet(ruta, columns=[columna])[columna].tolist()
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"La columna '{columna}' no existe en {ruta}: {e}")
+
+
+LECTORES = {
+    '.xlsx': _leer_xlsx,
+    '.xlsm': _leer_xlsx,
+    '.xls': _leer_xls,
+    '.csv': _leer_csv,
+    '.parquet': _leer_parquet,
+}
+
+
+def _ruta_cache(ruta, columna):
+    digest = hash_archivo(ruta)
+    sufijo = hashlib.sha1(columna.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(CARPETA_CACHE, f"{digest}_{sufijo}.json")
+
+
+def leer_facturas(ruta, columna, usar_cache=True) -> List[str]:
+    """Devuelve los números de factura de la columna, normalizados y sin vacíos.
+
+    Lanza ValueError si el formato no es soportado o la columna no existe.
+    """
+    extension = os.path.splitext(str(ruta))[1].lower()
+    lector = LECTORES.get(extension)
+    if lector is None:
+        raise ValueError(f"Formato no soportado: {extension}. Use {sorted(LECTORES)}")
+
+    ruta_cache = _ruta_cache(ruta, columna) if usar_cache else None
+    if ruta_cache and os.path.exists(ruta_cache):
+        try:
+            with open(ruta_cache, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get('version') == VERSION_CACHE:
+                return datos['facturas']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    facturas = [numero for numero in map(normalizar_numero, lector(ruta, columna)) if numero]
+
+    if ruta_cache:
+        temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CARPETA_CACHE, exist_ok=True)
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'version': VERSION_CACHE, 'facturas': facturas}, f)
+            os.replace(temporal, ruta_cache)
+        except OSError:
+            # Carpeta de solo lectura, disco lleno...: la próxima vez se vuelve a leer el archivo
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+    return facturas
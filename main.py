@@ -2,6 +2,14 @@
 import os
 import shutil
 import re
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from catalogo import TIPO_JSON
 
 
 def crear_directorio(ruta):
@@ -27,10 +35,18 @@ def extraer_numero_factura(nombre_archivo):
     return match.group(1) if match else ""
 
 
-def verificar_json_existente(nombre_carpeta, ruta_json_origen):
-    """Verifica si el archivo JSON correspondiente existe."""
+def verificar_json_existente(nombre_carpeta, ruta_json_origen, catalogo=None):
+    """Verifica si el archivo JSON correspondiente existe.
+
+    Con un catalogo.Catalogo (ya sincronizado con ruta_json_origen) se responde
+    con una consulta a SQLite en lugar de un stat por la red.
+    """
     numero_factura = extraer_numero_factura(nombre_carpeta)  # Ej: 200816
-    if numero_factura:
+    if numero_factura and catalogo is not None:
+        ruta_json = catalogo.buscar(numero_factura, TIPO_JSON, ruta_json_origen)
+        if ruta_json:
+            return True, ruta_json, os.path.basename(ruta_json)
+    elif numero_factura:
         nombre_json = f"FE{numero_factura}.json"  # Ej: FE200816.json
         ruta_json = os.path.join(ruta_json_origen, nombre_json)
         if os.path.exists(ruta_json):
@@ -54,49 +70,243 @@ def procesar_factura_xml(ruta_base, ruta_destino, archivo):
     return nombre_carpeta, ruta_carpeta
 
 
-def copiar_json_factura(nombre_carpeta, ruta_carpeta, ruta_json_origen):
-    """Copia el archivo JSON con el formato FE<numero> a la carpeta."""
-    numero_factura = extraer_numero_factura(nombre_carpeta)  # Ej: 200816
-    if numero_factura:
-        nombre_json = f"FE{numero_factura}.json"  # Ej: FE200816.json
-        ruta_json = os.path.join(ruta_json_origen, nombre_json)
+def copiar_json_factura(nombre_carpeta, ruta_carpeta, ruta_json_origen, ruta_json=None, nombre_destino=None):
+    """Copia el archivo JSON con el formato FE<numero> a la carpeta.
 
-        if os.path.exists(ruta_json):
-            ruta_json_destino = os.path.join(ruta_carpeta, nombre_json)
-            if copiar_archivo(ruta_json, ruta_json_destino):
-                print(f"Copiado {nombre_json} a {ruta_carpeta}")
-            else:
-                print(f"Error al copiar {nombre_json}")
+    Si se recibe ruta_json (ya verificada), no se vuelve a consultar el disco;
+    nombre_destino permite guardarlo con otro nombre (p. ej. fe200816.JSON como FE200816.json).
+    """
+    numero_factura = extraer_numero_factura(nombre_carpeta)  # Ej: 200816
+    if numero_factura or ruta_json:
+        if ruta_json is None:
+            nombre_json = f"FE{numero_factura}.json"  # Ej: FE200816.json
+            ruta_json = os.path.join(ruta_json_origen, nombre_json)
+            if not os.path.exists(ruta_json):
+                print(f"No se encontró {nombre_json} en {ruta_json_origen}")
+                return False
         else:
-            print(f"No se encontró {nombre_json} en {ruta_json_origen}")
+            nombre_json = nombre_destino or os.path.basename(ruta_json)
+
+        ruta_json_destino = os.path.join(ruta_carpeta, nombre_json)
+        if copiar_archivo(ruta_json, ruta_json_destino):
+            return True
+        print(f"Error al copiar {nombre_json}")
+    return False
+
+
+def listar_json_disponibles(ruta_json_origen, catalogo=None):
+    """Devuelve {nombre en minúsculas: (nombre, tamaño)} de los FE*.json de la carpeta, con un solo listado.
+
+    Las claves van en minúsculas porque los recursos compartidos de Windows no
+    distinguen mayúsculas: fe200816.JSON cuenta como FE200816.json. El tamaño
+    sale del listado (en Windows viene con él, sin un stat más) y solo se usa
+    para las estadísticas. Con un catalogo.Catalogo los nombres salen de SQLite,
+    que no guarda tamaños (quedan en None); la carpeta solo se relista si
+    cambió desde la última sincronización.
+    """
+    if catalogo is not None:
+        catalogo.sincronizar(ruta_json_origen, recursivo=False)
+        nombres = {nombre: None for nombre in catalogo.nombres_en(ruta_json_origen) or []}
+    else:
+        with os.scandir(ruta_json_origen) as entradas:
+            nombres = {entrada.name: entrada.stat().st_size for entrada in entradas if entrada.is_file()}
+    return {nombre.lower(): (nombre, tamano) for nombre, tamano in nombres.items()
+            if nombre.lower().startswith('fe') and nombre.lower().endswith('.json')}
+
+
+class EstadisticaEtapa:
+    """Cuenta los elementos que procesa una etapa del pipeline y el tiempo que estuvo activa"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.cantidad = 0
+        self.bytes = 0
+        self._inicio = None
+        self._fin = None
+        self._lock = threading.Lock()
+
+    def registrar(self, bytes_copiados=0):
+        with self._lock:
+            if self._inicio is None:
+                self._inicio = time.perf_counter()
+            self.cantidad += 1
+            self.bytes += bytes_copiados
+            self._fin = time.perf_counter()
+
+    def resumen(self):
+        segundos = (self._fin - self._inicio) if self._inicio is not None else 0
+        por_segundo = self.cantidad / segundos if segundos else 0
+        texto = f"{self.nombre}: {self.cantidad} en {segundos:.2f}s ({por_segundo:.0f}/s"
+        if self.bytes:
+            texto += f", {self.bytes / 1e6 / segundos if segundos else 0:.1f} MB/s"
+        return texto + ")"
+
+
+def recorrer_xml(ruta_base):
+    """(carpeta, archivo, tamaño) de cada XML del árbol, en el orden de os.walk.
 
+    El tamaño sale del DirEntry del listado: en Windows no cuesta otro viaje por la red.
+    """
+    try:
+        with os.scandir(ruta_base) as it:
+            entradas = list(it)
+    except OSError:
+        return
+    subdirectorios = []
+    for entrada in entradas:
+        if entrada.is_dir():
+            subdirectorios.append(entrada.path)
+        elif entrada.name.lower().endswith(".xml"):
+            yield ruta_base, entrada.name, entrada.stat().st_size
+    for subdirectorio in subdirectorios:
+        yield from recorrer_xml(subdirectorio)
+
+
+def listar_xml(ruta_base):
+    """Rutas de todos los XML del árbol."""
+    return [os.path.join(carpeta_raiz, archivo)
+            for carpeta_raiz, _, archivos in os.walk(ruta_base)
+            for archivo in archivos if archivo.lower().endswith(".xml")]
+
+
+def procesar_facturas(ruta_base, ruta_destino, ruta_json_origen, trabajadores=8, executor=None, metadatos=None,
+                      catalogo=None):
+    """Procesa todas las facturas XML y sus JSON correspondientes.
 
-def procesar_facturas(ruta_base, ruta_destino, ruta_json_origen):
-    """Procesa todas las facturas XML y sus JSON correspondientes."""
+    Funciona como un pipeline: un hilo recorre el árbol de XML, cada XML se
+    cruza contra el conjunto de FE*.json (un solo listado de la carpeta) y las
+    copias se hacen en un pool acotado de hilos, de modo que el recorrido y
+    las copias se solapan. Con un executor compartido (lote de cli.py) las
+    copias van a ese pool y se espera a que terminen sin cerrarlo.
+
+    Con un metadatos_xml.CacheMetadatos el número de factura sale del contenido
+    del XML (ParentDocumentID) y no de los dígitos del nombre del archivo.
+    Con un catalogo.Catalogo los JSON disponibles salen de SQLite.
+    """
     # Crear directorio destino principal
     crear_directorio(ruta_destino)
 
-    # Recorrer directorios y procesar archivos
-    for carpeta_raiz, _, archivos in os.walk(ruta_base):
-        for archivo in archivos:
-            if archivo.lower().endswith(".xml"):
-                # Extraer nombre de la carpeta
-                nombre_carpeta = os.path.splitext(archivo)[0]
-
-                # Verificar si el JSON existe antes de crear la carpeta
-                json_existe, ruta_json, nombre_json = verificar_json_existente(nombre_carpeta, ruta_json_origen)
-                if json_existe:
-                    # Si el JSON existe, procesar el XML y crear la carpeta
-                    nombre_carpeta, ruta_carpeta = procesar_factura_xml(carpeta_raiz, ruta_destino, archivo)
-                    # Copiar el JSON a la carpeta creada
-                    copiar_json_factura(nombre_carpeta, ruta_carpeta, ruta_json_origen)
+    # Listar una sola vez los JSON disponibles
+    json_disponibles = listar_json_disponibles(ruta_json_origen, catalogo)
+
+    rutas_xml = None
+    if metadatos is not None:
+        # Los XML nuevos o modificados se leen en un pool de procesos; el resto sale del caché
+        rutas_xml = listar_xml(ruta_base)
+        metadatos.actualizar(rutas_xml, trabajadores=trabajadores, raiz=ruta_base)
+        metadatos.guardar()
+        print(f"Metadatos: {metadatos.leidos} de {len(rutas_xml)} XML leídos")
+
+    estadisticas = {
+        'recorrido': EstadisticaEtapa("Recorrido de XML"),
+        'cruce': EstadisticaEtapa("Cruce con JSON"),
+        'copia': EstadisticaEtapa("Copia de facturas"),
+    }
+    fin_recorrido = object()
+    # Cola acotada: si las copias van atrás, el recorrido espera en lugar de acumular memoria
+    cola_xml = queue.Queue(maxsize=trabajadores * 64)
+
+    def recorrer():
+        try:
+            if rutas_xml is not None:
+                for ruta_xml in rutas_xml:
+                    estadisticas['recorrido'].registrar()
+                    # El caché de metadatos ya tiene el tamaño de cada XML
+                    registro = metadatos.registro(ruta_xml) or {}
+                    cola_xml.put(os.path.split(ruta_xml) + (registro.get('tamano') or 0,))
+                return
+            for carpeta_raiz, archivo, tamano in recorrer_xml(ruta_base):
+                estadisticas['recorrido'].registrar()
+                cola_xml.put((carpeta_raiz, archivo, tamano))
+        finally:
+            cola_xml.put(fin_recorrido)
+
+    def copiar(carpeta_raiz, archivo, nombre_json, tamano_xml):
+        try:
+            nombre_carpeta, ruta_carpeta = procesar_factura_xml(carpeta_raiz, ruta_destino, archivo)
+            nombre_origen, tamano_json = json_disponibles[nombre_json.lower()]
+            ruta_json = os.path.join(ruta_json_origen, nombre_origen)
+            if copiar_json_factura(nombre_carpeta, ruta_carpeta, ruta_json_origen, ruta_json=ruta_json,
+                                   nombre_destino=nombre_json):
+                # Tamaños de los listados: sin stat extra por copia
+                estadisticas['copia'].registrar(tamano_xml + (tamano_json or 0))
+        except Exception as e:
+            print(f"Error al procesar {archivo}: {str(e)}")
+
+    hilo_recorrido = threading.Thread(target=recorrer, daemon=True)
+    hilo_recorrido.start()
+
+    # Limitar las copias en vuelo para que la cola de tareas del pool no crezca sin control
+    en_vuelo = threading.BoundedSemaphore(trabajadores * 4)
+    # Los XML con el mismo nombre van a la misma carpeta: sus copias se encadenan
+    # (la siguiente se envía al pool cuando termina la anterior, y gana la última,
+    # como en serie) sin dejar un hilo del pool esperando
+    en_espera = {}  # carpeta de destino -> copias que esperan a la que está en curso
+    vistas = set()
+    restantes = 0
+    estado = threading.Condition()
+
+    def lanzar(nombre_carpeta, argumentos):
+        futuro = executor.submit(copiar, *argumentos)
+        futuro.add_done_callback(lambda _: terminar(nombre_carpeta))
+
+    def terminar(nombre_carpeta):
+        nonlocal restantes
+        en_vuelo.release()
+        with estado:
+            restantes -= 1
+            cola = en_espera[nombre_carpeta]
+            siguiente = cola.popleft() if cola else None
+            if siguiente is None:
+                del en_espera[nombre_carpeta]
+            estado.notify_all()
+        if siguiente is not None:
+            lanzar(nombre_carpeta, siguiente)
+
+    with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=trabajadores) as executor:
+        while True:
+            elemento = cola_xml.get()
+            if elemento is fin_recorrido:
+                break
+            carpeta_raiz, archivo, tamano_xml = elemento
+
+            # Verificar si el JSON existe antes de crear la carpeta
+            nombre_carpeta = os.path.splitext(archivo)[0]
+            numero_factura = extraer_numero_factura(nombre_carpeta)
+            if metadatos is not None:
+                numero_factura = metadatos.numero(os.path.join(carpeta_raiz, archivo)) or numero_factura
+            nombre_json = f"FE{numero_factura}.json"
+            estadisticas['cruce'].registrar()
+            if not numero_factura or nombre_json.lower() not in json_disponibles:
+                print(f"No se creó la carpeta para {nombre_carpeta} porque no se encontró el JSON asociado.")
+                continue
+
+            if nombre_carpeta in vistas:
+                print(f"⚠️ {archivo} está repetido (también en otra carpeta del árbol); "
+                      f"{os.path.join(carpeta_raiz, archivo)} reemplaza la copia anterior en {nombre_carpeta}")
+            vistas.add(nombre_carpeta)
+
+            en_vuelo.acquire()
+            argumentos = (carpeta_raiz, archivo, nombre_json, tamano_xml)
+            with estado:
+                restantes += 1
+                cola = en_espera.get(nombre_carpeta)
+                if cola is not None:
+                    cola.append(argumentos)
                 else:
-                    print(f"No se creó la carpeta para {nombre_carpeta} porque no se encontró el JSON asociado.")
+                    en_espera[nombre_carpeta] = deque()
+            if cola is None:
+                lanzar(nombre_carpeta, argumentos)
+        with estado:
+            estado.wait_for(lambda: restantes == 0)
 
+    hilo_recorrido.join()
+    for estadistica in estadisticas.values():
+        print(estadistica.resumen())
     print(f"Carpetas creadas y procesadas en {ruta_destino}")
 
 
-# Configuración de rutas
+# Configuración de rutas (para otras rutas sin editar el script: python cli.py procesar --xml ... --json ... --destino ...)
 # ruta_base = 'D:/007-Invoices/2025/MAR-2025'
 ruta_base = 'D:/007-Invoices/2025/SEPT-2025'
 ruta_destino = 'D:/007-Invoices/2025-Directories'
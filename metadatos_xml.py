@@ -0,0 +1,330 @@
+import base64
+import binascii
+import importlib.util
+import json
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
+from xml.parsers import expat
+
+from indice_facturas import IndiceFacturas
+
+
+# Metadatos de los AttachedDocument de la DIAN leídos del contenido del XML:
+# número de factura, CUFE, fecha de emisión, NIT del emisor y del receptor y
+# total a pagar. Con ellos las facturas se cruzan por clave exacta y no por los
+# dígitos del nombre del archivo ("2008" ya no encuentra "AttachedDocument_F-010-200816.xml").
+#
+# El XML se lee en bloques con expat, sin armar el árbol: la factura incrustada
+# (CDATA o base64 dentro de cac:Attachment/cbc:Description) se pasa bloque a
+# bloque a un segundo parser, así nunca está completa en memoria. Los archivos se
+# reparten en un pool de procesos y el resultado queda en un caché columnar
+# (Parquet si está pyarrow; si no, JSON por columnas) indexado por
+# (ruta, tamaño, mtime): solo se vuelven a leer los XML nuevos o modificados.
+
+CAMPOS = ['ruta', 'numero', 'numero_archivo', 'factura', 'cufe', 'fecha_emision', 'nit_emisor',
+          'nit_receptor', 'total', 'tamano', 'mtime_ns', 'error']
+CAMPOS_ENTEROS = ('tamano', 'mtime_ns')
+VERSION_CACHE = 1
+TAMANO_LECTURA = 64 * 1024
+
+PATRON_NUMERO = re.compile(r'(\d+)$')
+
+RUTA_INCRUSTADA = ('AttachedDocument', 'Attachment', 'ExternalReference', 'Description')
+CAMPOS_POR_RUTA = {
+    # AttachedDocument (el contenedor)
+    ('AttachedDocument', 'ParentDocumentID'): 'factura',
+    ('AttachedDocument', 'IssueDate'): 'fecha_emision',
+    ('AttachedDocument', 'SenderParty', 'PartyTaxScheme', 'CompanyID'): 'nit_emisor',
+    ('AttachedDocument', 'ReceiverParty', 'PartyTaxScheme', 'CompanyID'): 'nit_receptor',
+    ('AttachedDocument', 'ParentDocumentLineReference', 'DocumentReference', 'UUID'): 'cufe',
+    # Invoice (la factura incrustada, o un XML de factura suelto)
+    ('Invoice', 'ID'): 'factura',
+    ('Invoice', 'UUID'): 'cufe',
+    ('Invoice', 'IssueDate'): 'fecha_emision',
+    ('Invoice', 'AccountingSupplierParty', 'Party', 'PartyTaxScheme', 'CompanyID'): 'nit_emisor',
+    ('Invoice', 'AccountingCustomerParty', 'Party', 'PartyTaxScheme', 'CompanyID'): 'nit_receptor',
+    ('Invoice', 'LegalMonetaryTotal', 'PayableAmount'): 'total',
+}
+PROFUNDIDAD_MAXIMA = max(len(ruta) for ruta in CAMPOS_POR_RUTA)
+
+
+def numero_de_archivo(ruta) -> str:
+    """Dígitos finales del nombre del archivo (AttachedDocument_F-010-200816.xml -> '200816')."""
+    match = PATRON_NUMERO.search(os.path.splitext(os.path.basename(ruta))[0])
+    return match.group(1) if match else ''
+
+
+class _LectorDocumento:
+    """Handlers de expat que guardan en `datos` los campos de CAMPOS_POR_RUTA"""
+
+    def __init__(self):
+        self.datos: Dict[str, str] = {}
+        self.ruta: List[str] = []
+        self.campo = None
+        self.texto: List[str] = []
+        self.incrustado: Optional[_FacturaIncrustada] = None
+        self.parser = expat.ParserCreate(namespace_separator=' ')
+        self.parser.buffer_text = True
+        self.parser.buffer_size = TAMANO_LECTURA
+        self.parser.StartElementHandler = self._inicio
+        self.parser.EndElementHandler = self._fin
+        self.parser.CharacterDataHandler = self._caracteres
+
+    def _inicio(self, nombre, _atributos):
+        self.ruta.append(nombre.rpartition(' ')[2])
+        if len(self.ruta) > PROFUNDIDAD_MAXIMA:
+            return
+        clave = tuple(self.ruta)
+        if clave == RUTA_INCRUSTADA:
+            self.incrustado = _FacturaIncrustada()
+        else:
+            self.campo = CAMPOS_POR_RUTA.get(clave)
+            self.texto = []
+
+    def _fin(self, _nombre):
+        if self.incrustado is not None and len(self.ruta) == len(RUTA_INCRUSTADA):
+            self.incrustado.cerrar()
+            # Lo de la factura incrustada manda: el contenedor tiene su propia fecha
+            self.datos.update({campo: valor for campo, valor in self.incrustado.lector.datos.items() if valor})
+            self.incrustado = None
+        elif self.campo is not None:
+            self.datos.setdefault(self.campo, ''.join(self.texto).strip())
+            self.campo = None
+        self.ruta.pop()
+
+    def _caracteres(self, texto):
+        if self.incrustado is not None:
+            self.incrustado.alimentar(texto)
+        elif self.campo is not None:
+            self.texto.append(texto)
+
+
+class _FacturaIncrustada:
+    """Recibe por bloques el texto de cbc:Description (XML en CDATA o base64) y lo va parseando"""
+
+    def __init__(self):
+        self.lector = _LectorDocumento()
+        self.base64 = None  # Se decide con el primer carácter no vacío
+        self.pendiente = ''
+        self.dañada = False
+
+    def alimentar(self, texto):
+        if self.dañada:
+            return
+        if self.base64 is None:
+            texto = texto.lstrip()  # La declaración <?xml?> tiene que ir al principio
+            if not texto:
+                return
+            self.base64 = not texto.startswith('<')
+        try:
+            if self.base64:
+                texto = self.pendiente + ''.join(texto.split())
+                corte = len(texto) - len(texto) % 4
+                self.pendiente = texto[corte:]
+                self.lector.parser.Parse(base64.b64decode(texto[:corte]), False)
+            else:
+                self.lector.parser.Parse(texto, False)
+        except (expat.ExpatError, binascii.Error, ValueError):
+            self.dañada = True  # Se conservan los datos del contenedor
+
+    def cerrar(self):
+        if self.dañada or self.base64 is None:
+            return
+        try:
+            self.lector.parser.Parse(b'' if self.base64 else '', True)
+        except expat.ExpatError:
+            self.dañada = True
+
+
+def leer_metadatos(ruta) -> dict:
+    """Metadatos de un XML (un registro con CAMPOS); si no se puede leer, queda el motivo en 'error'."""
+    ruta = os.path.abspath(ruta)
+    numero_archivo = numero_de_archivo(ruta)
+    registro = dict.fromkeys(CAMPOS, '')
+    registro.update(ruta=ruta, numero_archivo=numero_archivo, tamano=0, mtime_ns=0)
+    lector = _LectorDocumento()
+    try:
+        estado = os.stat(ruta)
+        registro.update(tamano=estado.st_size, mtime_ns=estado.st_mtime_ns)
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(TAMANO_LECTURA), b''):
+                lector.parser.Parse(bloque, False)
+            lector.parser.Parse(b'', True)
+    except (OSError, expat.ExpatError) as e:
+        # Un XML truncado conserva lo que alcanzó a leerse
+        registro['error'] = str(e)
+
+    registro.update(lector.datos)
+    match = PATRON_NUMERO.search(registro['factura'])  # FE200816 -> 200816
+    registro['numero'] = match.group(1) if match else numero_archivo
+    return registro
+
+
+def ruta_cache_predeterminada() -> str:
+    """metadatos_xml.parquet si se puede escribir Parquet; si no, metadatos_xml.json"""
+    return 'metadatos_xml.parquet' if importlib.util.find_spec('pyarrow') else 'metadatos_xml.json'
+
+
+class CacheMetadatos:
+    """Caché columnar de metadatos por ruta de XML; se relee un XML solo si cambió su tamaño o mtime"""
+
+    def __init__(self, ruta_cache=None):
+        self.ruta_cache = ruta_cache or ruta_cache_predeterminada()
+        self.registros: Dict[str, dict] = {}
+        self.leidos = 0
+        self.descartados = 0
+        self.cargar()
+
+    def _es_parquet(self):
+        return self.ruta_cache.lower().endswith('.parquet')
+
+    def cargar(self):
+        """Carga el caché desde disco si existe y es de la versión actual."""
+        if not os.path.exists(self.ruta_cache):
+            return
+        try:
+            if self._es_parquet():
+                import pandas as pd
+                tabla = pd.read_parquet(self.ruta_cache)
+                columnas = {campo: tabla[campo].tolist() for campo in CAMPOS}
+            else:
+                with open(self.ruta_cache, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                if datos.get('version') != VERSION_CACHE:
+                    return
+                columnas = datos['columnas']
+            self.registros = {registro['ruta']: registro
+                              for registro in (dict(zip(CAMPOS, fila)) for fila in zip(*(columnas[c] for c in CAMPOS)))}
+        except Exception as e:
+            print(f"Caché de metadatos ilegible, se reconstruirá: {str(e)}")
+            self.registros = {}
+
+    def guardar(self):
+        """Guarda el caché por columnas de forma atómica."""
+        columnas = {campo: [registro[campo] for registro in self.registros.values()] for campo in CAMPOS}
+        temporal = f"{self.ruta_cache}.tmp"
+        if self._es_parquet():
+            import pandas as pd
+            tabla = pd.DataFrame(columnas, columns=CAMPOS)
+            for campo in CAMPOS_ENTEROS:
+                tabla[campo] = tabla[campo].astype('int64')
+            tabla.to_parquet(temporal, index=False)
+        else:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'version': VERSION_CACHE, 'columnas': columnas}, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta_cache)
+
+    def _vigente(self, ruta) -> bool:
+        registro = self.registros.get(ruta)
+        if registro is None:
+            return False
+        try:
+            estado = os.stat(ruta)
+        except OSError:
+            return False
+        return registro['tamano'] == estado.st_size and registro['mtime_ns'] == estado.st_mtime_ns
+
+    def descartar_ausentes(self, rutas: Iterable[str], raiz=None) -> int:
+        """Quita los registros de XML que ya no están en rutas (borrados o movidos); devuelve cuántos quitó.
+
+        Con raiz solo se revisan los registros de ese árbol: el mismo caché puede
+        servir a varios árboles (un mes y otro) y los demás no se tocan.
+        """
+        vigentes = set(map(os.path.abspath, rutas))
+        prefijo = os.path.join(os.path.abspath(raiz), '') if raiz is not None else ''
+        ausentes = [ruta for ruta in self.registros if ruta not in vigentes and ruta.startswith(prefijo)]
+        for ruta in ausentes:
+            del self.registros[ruta]
+        self.descartados = len(ausentes)
+        return self.descartados
+
+    def actualizar(self, rutas: Iterable[str], executor: Optional[Executor] = None, trabajadores=None,
+                   raiz=None) -> int:
+        """Lee en un pool de procesos los XML que no están en el caché o cambiaron; devuelve cuántos leyó.
+
+        rutas es el árbol completo recién recorrido: los registros de XML que ya
+        no están en él se descartan (ver descartar_ausentes), así el caché no
+        crece sin límite ni responde por archivos que ya no existen.
+        """
+        rutas = list(map(os.path.abspath, rutas))
+        self.descartar_ausentes(rutas, raiz)
+        pendientes = [ruta for ruta in rutas if not self._vigente(ruta)]
+        if not pendientes:
+            self.leidos = 0
+            return 0
+
+        if executor is None and len(pendientes) < 64:
+            # Pocos archivos (re-ejecución): no vale la pena arrancar procesos
+            resultados = list(map(leer_metadatos, pendientes))
+        else:
+            trabajadores = trabajadores or os.cpu_count() or 1
+            # Bloques grandes: cada tarea es barata y el costo está en pasar los resultados entre procesos
+            tamano_bloque = max(1, min(256, len(pendientes) // (trabajadores * 4)))
+            pool = nullcontext(executor) if executor is not None else ProcessPoolExecutor(max_workers=trabajadores)
+            with pool as executor:
+                resultados = list(executor.map(leer_metadatos, pendientes, chunksize=tamano_bloque))
+        for registro in resultados:
+            self.registros[registro['ruta']] = registro
+        self.leidos = len(pendientes)
+        return self.leidos
+
+    def registro(self, ruta) -> Optional[dict]:
+        return self.registros.get(os.path.abspath(ruta))
+
+    def numero(self, ruta) -> Optional[str]:
+        """Número de factura según el contenido del XML (None si no está en el caché)"""
+        registro = self.registro(ruta)
+        return registro['numero'] if registro else None
+
+
+class IndiceMetadatos:
+    """IndiceFacturas cuyo XML por número sale del contenido (ParentDocumentID) y no del nombre del archivo.
+
+    Tiene la misma interfaz de búsqueda que IndiceFacturas (buscar_xml / buscar_json).
+    """
+
+    def __init__(self, cache: CacheMetadatos, indice: Optional[IndiceFacturas] = None,
+                 executor: Optional[Executor] = None, trabajadores=None):
+        self.cache = cache
+        self.indice = indice if indice is not None else IndiceFacturas()
+        self.executor = executor
+        self.trabajadores = trabajadores
+        self.xml_por_numero: Dict[str, str] = {}
+        self.duplicados: Dict[str, List[str]] = {}
+
+    @property
+    def json_por_numero(self):
+        return self.indice.json_por_numero
+
+    @property
+    def directorios_escaneados(self):
+        return self.indice.directorios_escaneados
+
+    def actualizar(self, ruta_base_xml, ruta_json_base):
+        self.indice.actualizar(ruta_base_xml, ruta_json_base)
+        rutas = sorted(self.indice.rutas_xml)
+        self.cache.actualizar(rutas, self.executor, self.trabajadores, raiz=ruta_base_xml)
+
+        self.xml_por_numero = {}
+        self.duplicados = {}
+        for ruta in rutas:
+            numero = self.cache.numero(ruta)
+            if not numero:
+                continue
+            if numero in self.xml_por_numero:
+                self.duplicados.setdefault(numero, [self.xml_por_numero[numero]]).append(ruta)
+            else:
+                self.xml_por_numero[numero] = ruta
+
+    def guardar(self):
+        self.indice.guardar()
+        self.cache.guardar()
+
+    def buscar_xml(self, numero_factura):
+        return self.xml_por_numero.get(numero_factura)
+
+    def buscar_json(self, numero_factura):
+        return self.indice.buscar_json(numero_factura)
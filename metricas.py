@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+# Medición por factura y por etapa (tiempo, bytes y archivos) para saber en qué
+# se va el tiempo de una radicación: lectura del Excel, copia de soportes, copia
+# de facturas o el renombrado/borrado de resultados.
+
+# Límites de los grupos del histograma, en milisegundos
+LIMITES_HISTOGRAMA_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+ANCHO_BARRA = 30
+
+CAMPOS_CSV = ['factura', 'etapa', 'segundos', 'bytes', 'archivos']
+
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """Percentil p (0-100) con interpolación lineal sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    fraccion = posicion - inferior
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * fraccion
+
+
+class MedicionEtapa:
+    """Datos de una medición en curso; la etapa puede completar bytes y archivos."""
+
+    __slots__ = ('bytes', 'archivos')
+
+    def __init__(self):
+        self.bytes = 0
+        self.archivos = 0
+
+
+class MetricasEtapas:
+    """Registro de mediciones (factura, etapa, segundos, bytes, archivos), seguro entre hilos"""
+
+    def __init__(self):
+        self.mediciones = []
+        self._lock = threading.Lock()
+
+    def registrar(self, factura: Optional[str], etapa: str, segundos: float, bytes_copiados: int = 0,
+                  archivos: int = 0) -> None:
+        with self._lock:
+            self.mediciones.append((factura, etapa, segundos, bytes_copiados, archivos))
+
+    @contextmanager
+    def medir(self, factura: Optional[str], etapa: str):
+        """Mide el bloque; se registra aunque el bloque lance una excepción."""
+        medicion = MedicionEtapa()
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        finally:
+            self.registrar(factura, etapa, time.perf_counter() - inicio, medicion.bytes, medicion.archivos)
+
+    def por_etapa(self) -> Dict[str, List[tuple]]:
+        """Agrupa las mediciones por etapa, en el orden en que apareció cada etapa"""
+        with self._lock:
+            mediciones = list(self.mediciones)
+        grupos = {}
+        for medicion in mediciones:
+            grupos.setdefault(medicion[1], []).append(medicion)
+        return grupos
+
+    def resumen(self) -> Dict[str, dict]:
+        """Por etapa: cantidad, total, p50/p95/p99/máximo en segundos, bytes y archivos"""
+        resumen = {}
+        for etapa, mediciones in self.por_etapa().items():
+            tiempos = sorted(medicion[2] for medicion in mediciones)
+            resumen[etapa] = {
+                'cantidad': len(tiempos),
+                'total_s': sum(tiempos),
+                'p50_s': percentil(tiempos, 50),
+                'p95_s': percentil(tiempos, 95),
+                'p99_s': percentil(tiempos, 99),
+                'max_s': tiempos[-1],
+                'bytes': sum(medicion[3] for medicion in mediciones),
+                'archivos': sum(medicion[4] for medicion in mediciones),
+            }
+        return resumen
+
+    def histograma(self, etapa: str) -> List[str]:
+        """Líneas de texto con la distribución de tiempos de una etapa"""
+        tiempos_ms = [medicion[2] * 1000 for medicion in self.por_etapa().get(etapa, [])]
+        if not tiempos_ms:
+            return []
+
+        conteos = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+        for tiempo in tiempos_ms:
+            grupo = 0
+            while grupo < len(LIMITES_HISTOGRAMA_MS) and tiempo >= LIMITES_HISTOGRAMA_MS[grupo]:
+                grupo += 1
+            conteos[grupo] += 1
+
+        # Solo el rango de grupos con datos
+        usados = [i for i, conteo in enumerate(conteos) if conteo]
+        maximo = max(conteos)
+        lineas = []
+        for grupo in range(usados[0], usados[-1] + 1):
+            if grupo == 0:
+                etiqueta = f"< {LIMITES_HISTOGRAMA_MS[0]} ms"
+            elif grupo == len(LIMITES_HISTOGRAMA_MS):
+                etiqueta = f">= {LIMITES_HISTOGRAMA_MS[-1]} ms"
+            else:
+                etiqueta = f"{LIMITES_HISTOGRAMA_MS[grupo - 1]}-{LIMITES_HISTOGRAMA_MS[grupo]} ms"
+            barra = '█' * round(conteos[grupo] / maximo * ANCHO_BARRA)
+            lineas.append(f"{etiqueta:>12} | {barra:<{ANCHO_BARRA}} {conteos[grupo]}")
+        return lineas
+
+    def exportar_json(self, ruta) -> None:
+        """Resumen por etapa y mediciones individuales en JSON"""
+        with self._lock:
+            mediciones = list(self.mediciones)
+        datos = {
+            'resumen': self.resumen(),
+            'mediciones': [dict(zip(CAMPOS_CSV, medicion)) for medicion in mediciones],
+        }
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, ruta)
+
+    def exportar_csv(self, ruta) -> None:
+        """Una fila por medición: factura, etapa, segundos, bytes, archivos"""
+        with self._lock:
+            mediciones = list(self.mediciones)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8', newline='') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(CAMPOS_CSV)
+            escritor.writerows(mediciones)
+        os.replace(temporal, ruta)
@@ -1,62 +1,149 @@
 import os
+import re
+import csv
 import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
+# Carpetas destino de la clasificación
+VALIDADOS = "validados y aprobados"
+RECHAZADOS_LOCALES = "Rechazados Locales"
+RECHAZADOS_MSPS = "Rechazados MSPS"
+CARPETAS_DESTINO = [VALIDADOS, RECHAZADOS_LOCALES, RECHAZADOS_MSPS]
 
-def organizar_carpetas(ruta_base):
-    # Crear las carpetas destino si no existen
-    validados_dir = os.path.join(ruta_base, "validados y aprobados")
-    rechazados_locales_dir = os.path.join(ruta_base, "Rechazados Locales")
-    rechazados_msps_dir = os.path.join(ruta_base, "Rechazados MSPS")
-
-    os.makedirs(validados_dir, exist_ok=True)
-    os.makedirs(rechazados_locales_dir, exist_ok=True)
-    os.makedirs(rechazados_msps_dir, exist_ok=True)
-
-    # Iterar sobre todas las carpetas en el directorio base
-    for carpeta in os.listdir(ruta_base):
-        carpeta_path = os.path.join(ruta_base, carpeta)
-
-        # Verificar que sea un directorio
-        if not os.path.isdir(carpeta_path) or carpeta in ["validados y aprobados",
-                                                          "Rechazados Locales",
-                                                          "Rechazados MSPS"]:
-            continue
+# Patrones precompilados de los archivos de resultado
+PATRON_CUV = re.compile(r'^ResultadosMSPS_FE.*_A_CUV\.txt$')          # ResultadosMSPS_FE######_ID??????_A_CUV.txt
+PATRON_MSPS_ID0 = re.compile(r'^ResultadosMSPS_FE.*_ID0_R\.txt$')     # ResultadosMSPS_FE######_ID0_R.txt
+PATRON_LOCALES = re.compile(r'^ResultadosLocales_FE.*\.txt$')         # ResultadosLocales_FE######.txt
 
-        # Obtener lista de archivos en la carpeta
-        archivos = os.listdir(carpeta_path)
+RUTA_PLAN = 'plan_organizacion.csv'
 
-        # 1. Verificar si tiene archivo ResultadosMSPS_FE######_ID??????_A_CUV.txt
-        if any(f.startswith('ResultadosMSPS_FE') and f.endswith('_A_CUV.txt') for f in archivos):
-            shutil.move(carpeta_path, os.path.join(validados_dir, carpeta))
-            print(f"Moviendo {carpeta} a 'validados y aprobados'")
-            continue
 
-        # Contar tipos de archivos específicos
-        tiene_xml = any(f.endswith('.xml') for f in archivos)
-        tiene_json = any(f.endswith('.json') for f in archivos)
-        tiene_locales = any(f.startswith('ResultadosLocales_FE') and f.endswith('.txt') for f in archivos)
-        tiene_msps_id0 = any(f.startswith('ResultadosMSPS_FE') and f.endswith('_ID0_R.txt') for f in archivos)
-
-        # 2. Verificar si solo tiene xml, json y ResultadosLocales
-        if (tiene_xml and tiene_json and tiene_locales and
-                len(archivos) == 3 and not tiene_msps_id0):
-            shutil.move(carpeta_path, os.path.join(rechazados_locales_dir, carpeta))
-            print(f"Moviendo {carpeta} a 'Rechazados Locales'")
+def clasificar_carpeta(carpeta_path):
+    """Lee la carpeta una sola vez y devuelve la carpeta destino (o None si no aplica ninguna regla)."""
+    with os.scandir(carpeta_path) as entradas:
+        return clasificar_nombres(entrada.name for entrada in entradas)
+
+
+def clasificar_nombres(nombres):
+    """Aplica las reglas a los nombres de lo que contiene una carpeta (del disco o del catálogo)."""
+    total = 0
+    tiene_xml = tiene_json = tiene_locales = tiene_msps_id0 = False
+
+    for nombre in nombres:
+        total += 1
+        # 1. Si tiene archivo ResultadosMSPS_FE######_ID??????_A_CUV.txt ya está validada
+        if PATRON_CUV.match(nombre):
+            return VALIDADOS
+        if nombre.endswith('.xml'):
+            tiene_xml = True
+        elif nombre.endswith('.json'):
+            tiene_json = True
+        elif PATRON_MSPS_ID0.match(nombre):
+            tiene_msps_id0 = True
+        elif PATRON_LOCALES.match(nombre):
+            tiene_locales = True
+
+    # 2. Solo tiene xml, json y ResultadosLocales
+    if tiene_xml and tiene_json and tiene_locales and total == 3 and not tiene_msps_id0:
+        return RECHAZADOS_LOCALES
+
+    # 3. Tiene los 4 archivos específicos
+    if tiene_xml and tiene_json and tiene_locales and tiene_msps_id0 and total == 4:
+        return RECHAZADOS_MSPS
+
+    return None
+
+
+def planificar_movimientos(ruta_base, trabajadores=8, catalogo=None):
+    """Clasifica todas las carpetas y devuelve la lista de movimientos [(carpeta, destino)]."""
+    if catalogo is not None:
+        return planificar_desde_catalogo(ruta_base, catalogo)
+
+    carpetas = []
+    with os.scandir(ruta_base) as entradas:
+        for entrada in entradas:
+            # Verificar que sea un directorio y no una carpeta destino
+            if entrada.is_dir() and entrada.name not in CARPETAS_DESTINO:
+                carpetas.append(entrada.name)
+
+    # En unidades de red la latencia domina: se listan varias carpetas a la vez
+    with ThreadPoolExecutor(max_workers=trabajadores) as executor:
+        destinos = executor.map(clasificar_carpeta, (os.path.join(ruta_base, c) for c in carpetas))
+        return [(carpeta, destino) for carpeta, destino in zip(carpetas, destinos) if destino]
+
+
+def planificar_desde_catalogo(ruta_base, catalogo):
+    """Igual que planificar_movimientos, pero lee el contenido de las carpetas del catálogo SQLite."""
+    # Solo se relistan las carpetas que cambiaron desde la última sincronización
+    catalogo.sincronizar(ruta_base)
+    plan = []
+    for carpeta in catalogo.nombres_en(ruta_base, solo_directorios=True) or []:
+        if carpeta in CARPETAS_DESTINO:
             continue
+        nombres = catalogo.nombres_en(os.path.join(ruta_base, carpeta))
+        destino = clasificar_nombres(nombres) if nombres is not None else None
+        if destino:
+            plan.append((carpeta, destino))
+    return plan
 
-        # 3. Verificar si tiene los 4 archivos específicos
-        if (tiene_xml and tiene_json and tiene_locales and tiene_msps_id0 and
-                len(archivos) == 4):
-            shutil.move(carpeta_path, os.path.join(rechazados_msps_dir, carpeta))
-            print(f"Moviendo {carpeta} a 'Rechazados MSPS'")
+
+def ejecutar_movimientos(ruta_base, plan):
+    """Mueve las carpetas con os.rename (mismo volumen); devuelve la lista de errores."""
+    errores = []
+    for carpeta, destino in plan:
+        origen = os.path.join(ruta_base, carpeta)
+        nueva_ruta = os.path.join(ruta_base, destino, carpeta)
+        if os.path.exists(nueva_ruta):
+            errores.append(f"{carpeta}: ya existe en '{destino}'")
             continue
+        try:
+            os.rename(origen, nueva_ruta)
+        except OSError:
+            try:
+                shutil.move(origen, nueva_ruta)
+            except Exception as e:
+                errores.append(f"{carpeta}: {e}")
+    return errores
+
+
+def guardar_plan(plan, ruta_plan=RUTA_PLAN):
+    """Guarda el plan de movimientos en un CSV para revisarlo."""
+    with open(ruta_plan, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['carpeta', 'destino'])
+        escritor.writerows(plan)
+
+
+def organizar_carpetas(ruta_base, simulacion=False, catalogo=None):
+    """Clasifica y mueve las carpetas; con simulacion=True solo genera el reporte."""
+    # Crear las carpetas destino si no existen
+    if not simulacion:
+        for destino in CARPETAS_DESTINO:
+            os.makedirs(os.path.join(ruta_base, destino), exist_ok=True)
+
+    plan = planificar_movimientos(ruta_base, catalogo=catalogo)
+    resumen = Counter(destino for _, destino in plan)
+    for destino in CARPETAS_DESTINO:
+        print(f"{'Se moverían' if simulacion else 'Moviendo'} {resumen.get(destino, 0)} carpetas a '{destino}'")
+
+    if simulacion:
+        guardar_plan(plan)
+        print(f"Plan guardado en {os.path.abspath(RUTA_PLAN)}")
+        return plan
+
+    errores = ejecutar_movimientos(ruta_base, plan)
+    for error in errores:
+        print(f"No se pudo mover {error}")
+    return plan
 
 
 def main():
     # Puedes cambiar esta ruta por la que desees procesar
     ruta_base = input("Ingrese la ruta del directorio base: ")
     if os.path.isdir(ruta_base):
-        organizar_carpetas(ruta_base)
+        simulacion = input("¿Solo simular y generar el reporte? (s/n): ").strip().lower() == 's'
+        organizar_carpetas(ruta_base, simulacion)
         print("Organización completada!")
     else:
         print("La ruta especificada no es un directorio válido")
@@ -65,4 +152,4 @@ def main():
 if __name__ == "__main__":
     main()
 
-# Este script organiza las carpetas y archivos según las reglas especificadas.(organiza archivos en carpetas)
\ No newline at end of file
+# Este script organiza las carpetas y archivos según las reglas especificadas.(organiza archivos en carpetas)
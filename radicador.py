@@ -1,29 +1,56 @@
 import os
-from typing import List, Optional, Tuple
-import pandas as pd
-from tqdm import tqdm
-import shutil
-import glob
+import sys
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
+from bitacora import (BitacoraEjecucion, ETAPA_SOPORTE, ETAPA_FACTURA,
+                      ETAPA_ARCHIVOS, ETAPA_COMPLETADA, ETAPA_VERIFICACION)
+from lector_facturas import leer_facturas
+from copiado import MODO_COPIA, copiar_arbol, ruta_almacen_para, solicitar_modo_copia
+from metricas import MetricasEtapas
+from reglas_copia import ReglasCopia, cargar_reglas
+from catalogo import Catalogo, TIPO_CARPETA, TIPO_CARPETA_FE
+from verificacion import (CacheHashes, NOMBRE_CACHE, NOMBRE_MANIFIESTO, TAMANO_BLOQUE,
+                          escribir_manifiesto, pares_de_copia, verificar_pares)
+
+if TYPE_CHECKING:
+    from tqdm import tqdm
+
+RUTA_LOG = 'procesamiento_facturas.log'
 
-# Configuración de logging con encoding UTF-8
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('procesamiento_facturas.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
+def configurar_logging(ruta_log: str = RUTA_LOG) -> None:
+    """Configura el logging (archivo UTF-8 + consola); se llama al ejecutar, no al importar el módulo"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(ruta_log, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+# Etapas medidas además de las de la bitácora
+METRICA_CARGA = 'carga_excel'
+METRICA_TOTAL = 'total_factura'
+
+
 class ProcesadorFacturas:
     """Clase para procesar facturas y sus soportes"""
     
     def __init__(self, ruta_xlsx: str, columna: str, ruta_destino: str, 
-                 ruta_soportes: str, ruta_facturas: str):
+                 ruta_soportes: str, ruta_facturas: str, trabajadores: int = 1,
+                 limite_soportes: Optional[int] = None, limite_facturas: Optional[int] = None,
+                 reanudar: bool = False, modo_copia: str = MODO_COPIA,
+                 executor: Optional[ThreadPoolExecutor] = None, reglas: Optional[ReglasCopia] = None,
+                 catalogo: Optional[Catalogo] = None, verificar: bool = False,
+                 tamano_bloque: int = TAMANO_BLOQUE):
         self.ruta_xlsx = Path(ruta_xlsx)
         self.columna = columna
         self.ruta_destino = Path(ruta_destino)
@@ -32,10 +59,58 @@ class ProcesadorFacturas:
         
         self.ruta_soportes_destino = self.ruta_destino / "Soportes"
         self.ruta_facturas_destino = self.ruta_destino / "Facturas"
+        self.ruta_bitacora = self.ruta_destino / "bitacora_radicacion.jsonl"
+        
+        # Con reanudar=True se omiten las facturas y etapas que la bitácora da por terminadas
+        self.reanudar = reanudar
+        self.bitacora: Optional[BitacoraEjecucion] = None
+        
+        # Modo de copia de los soportes (ver copiado.MODOS_COPIA)
+        self.modo_copia = modo_copia
+        self.ruta_almacen = ruta_almacen_para(self.ruta_destino)
+        
+        # Archivos que no se copian o se copian con otro nombre (ver reglas_copia.py)
+        self.reglas = reglas or ReglasCopia()
+        self._destinos_previos = set()
+        
+        # Con catálogo, la existencia de las carpetas de origen se resuelve con una consulta al inicio
+        self.catalogo = catalogo
+        self._sin_soporte: Optional[Set[str]] = None
+        self._sin_carpeta: Optional[Set[str]] = None
+        
+        # Verificación opcional de las copias por SHA-256 y manifiesto del lote
+        self.verificar = verificar
+        self.tamano_bloque = tamano_bloque
+        self.ruta_manifiesto = self.ruta_destino / NOMBRE_MANIFIESTO
+        self.archivos_verificados = 0
+        self.archivos_con_diferencias = 0
         
         self.facturas_exitosas = 0
         self.facturas_fallidas = 0
         self.errores_detallados = []
+        
+        # Tiempos, bytes y archivos por factura y etapa
+        self.metricas = MetricasEtapas()
+        self.ruta_metricas = self.ruta_destino / "metricas_radicacion"
+        
+        # Concurrencia: hilos totales y copias simultáneas permitidas por volumen de origen
+        self.trabajadores = max(1, trabajadores)
+        self._lock = threading.Lock()
+        # En modo paralelo cada fila junta sus errores aquí y se ordenan por fila al final
+        self._errores_fila = threading.local()
+        self._semaforo_soportes = threading.BoundedSemaphore(limite_soportes or self.trabajadores)
+        self._semaforo_facturas = threading.BoundedSemaphore(limite_facturas or self.trabajadores)
+        # Pool de hilos compartido entre trabajos (lote de cli.py); si no hay, se crea uno por ejecución
+        self.executor = executor
+    
+    def registrar_error(self, mensaje: str) -> None:
+        """Agrega un error al detalle de forma segura entre hilos"""
+        errores_fila = getattr(self._errores_fila, 'errores', None)
+        if errores_fila is not None:
+            errores_fila.append(mensaje)
+            return
+        with self._lock:
+            self.errores_detallados.append(mensaje)
     
     def validar_configuracion_inicial(self) -> bool:
         """Valida que todas las rutas de origen existan"""
@@ -61,34 +136,59 @@ class ProcesadorFacturas:
             logger.info(f"📦 Directorio preparado: {directorio}")
     
     def cargar_facturas(self) -> List[str]:
-        """Carga los números de factura desde el archivo Excel"""
+        """Carga los números de factura desde el archivo Excel (o CSV/Parquet)"""
         try:
-            df = pd.read_excel(self.ruta_xlsx)
-            
-            if self.columna not in df.columns:
-                logger.error(f"❌ La columna '{self.columna}' no existe. Columnas disponibles: {list(df.columns)}")
-                return []
-            
-            facturas = [str(factura).strip() for factura in df[self.columna].dropna().astype(str)]
+            with self.metricas.medir(None, METRICA_CARGA) as medicion:
+                facturas = leer_facturas(self.ruta_xlsx, self.columna)
+                medicion.bytes = self.ruta_xlsx.stat().st_size
+                medicion.archivos = 1
             logger.info(f"📊 Cargadas {len(facturas)} facturas desde el Excel")
             return facturas
             
+        except ValueError as e:
+            logger.error(f"❌ {e}")
+            return []
         except Exception as e:
             logger.error(f"❌ Error al leer el archivo Excel: {e}")
             return []
     
+    def consultar_catalogo(self, facturas: List[str]) -> None:
+        """Sincroniza el catálogo con los orígenes y marca las facturas sin soportes o sin carpeta"""
+        escaneados = self.catalogo.sincronizar(self.ruta_soportes, recursivo=False)
+        escaneados += self.catalogo.sincronizar(self.ruta_facturas, recursivo=False)
+        self._sin_soporte = set(self.catalogo.faltantes(facturas, [TIPO_CARPETA_FE], self.ruta_soportes)[TIPO_CARPETA_FE])
+        self._sin_carpeta = set(self.catalogo.faltantes(facturas, [TIPO_CARPETA], self.ruta_facturas)[TIPO_CARPETA])
+        logger.info(f"🗃️ Catálogo ({escaneados} directorios releídos): {len(self._sin_soporte)} facturas sin soportes, "
+                    f"{len(self._sin_carpeta)} sin carpeta de factura")
+    
+    @staticmethod
+    def _existe_origen(factura: str, carpeta_origen: Path, faltantes: Optional[Set[str]]) -> bool:
+        """Consulta el resultado del catálogo si lo hay; si no, pregunta al sistema de archivos"""
+        if faltantes is not None:
+            return factura not in faltantes
+        return carpeta_origen.exists()
+    
     def procesar_soporte(self, factura: str) -> Optional[Path]:
         """Procesa y copia los soportes de una factura"""
         carpeta_origen = self.ruta_soportes / f"FE{factura}"
         
-        if not carpeta_origen.exists():
+        if not self._existe_origen(factura, carpeta_origen, self._sin_soporte):
             logger.warning(f"📁 ❌ Carpeta de soporte no encontrada: FE{factura}")
             return None
         
         carpeta_destino = self.ruta_soportes_destino / f"FE{factura}"
         
+        if self.etapa_completada(factura, ETAPA_SOPORTE) and carpeta_destino.exists():
+            logger.debug(f"⏭️ Soportes ya copiados en la ejecución anterior: FE{factura}")
+            return carpeta_destino
+        
         try:
-            shutil.copytree(carpeta_origen, carpeta_destino, dirs_exist_ok=True)
+            # La medición empieza al obtener el semáforo: la espera no cuenta como copia
+            with self._semaforo_soportes, self.metricas.medir(factura, ETAPA_SOPORTE) as medicion:
+                resultado = copiar_arbol(carpeta_origen, carpeta_destino, omitir_sin_cambios=True,
+                                         modo=self.modo_copia, ruta_almacen=self.ruta_almacen)
+                medicion.bytes = resultado.bytes_copiados
+                medicion.archivos = resultado.archivos_copiados + resultado.archivos_enlazados
             logger.debug(f"✅ Soportes copiados: FE{factura}")
             return carpeta_destino
         except Exception as e:
@@ -99,14 +199,28 @@ class ProcesadorFacturas:
         """Procesa y copia una factura"""
         carpeta_origen = self.ruta_facturas / f"AttachedDocument_F-010-{factura}"
         
-        if not carpeta_origen.exists():
+        if not self._existe_origen(factura, carpeta_origen, self._sin_carpeta):
             logger.warning(f"📄 ❌ Carpeta de factura no encontrada: {carpeta_origen.name}")
             return None
         
         carpeta_destino = self.ruta_facturas_destino / f"FE{factura}"
         
+        # Lo que ya estaba en el destino no pasó por el filtro de la copia
+        if carpeta_destino.exists():
+            with self._lock:
+                self._destinos_previos.add(factura)
+        
+        if self.etapa_completada(factura, ETAPA_FACTURA) and carpeta_destino.exists():
+            logger.debug(f"⏭️ Factura ya copiada en la ejecución anterior: FE{factura}")
+            return carpeta_destino
+        
         try:
-            shutil.copytree(carpeta_origen, carpeta_destino, dirs_exist_ok=True)
+            # Las reglas se aplican durante la copia: lo omitido no se copia y el CUV se escribe como .json
+            with self._semaforo_facturas, self.metricas.medir(factura, ETAPA_FACTURA) as medicion:
+                resultado = copiar_arbol(carpeta_origen, carpeta_destino, omitir_sin_cambios=True,
+                                         nombre_destino=self.reglas.para_factura(factura))
+                medicion.bytes = resultado.bytes_copiados
+                medicion.archivos = resultado.archivos_copiados
             logger.debug(f"✅ Factura copiada: FE{factura}")
             return carpeta_destino
         except Exception as e:
@@ -114,71 +228,94 @@ class ProcesadorFacturas:
             return None
     
     def procesar_archivos_factura(self, ruta_factura_destino: Path, factura: str) -> None:
-        """Renombra archivos CUV y elimina archivos innecesarios"""
+        """Renombra archivos CUV y elimina archivos innecesarios que hayan quedado en el destino.
         
-        # Renombrar archivos CUV de .txt a .json
-        patron_cuv = f"ResultadosMSPS_FE{factura}_*_A_CUV.txt"
-        archivos_cuv = list(ruta_factura_destino.glob(patron_cuv))
+        La copia ya aplica las reglas, así que solo hay trabajo si la carpeta de
+        destino existía antes (ejecuciones anteriores o de versiones sin filtro).
+        """
         
-        for archivo in archivos_cuv:
-            archivo_json = archivo.with_suffix('.json')
-            try:
-                # Si el archivo JSON ya existe, eliminarlo primero
-                if archivo_json.exists():
-                    archivo_json.unlink()
-                    logger.debug(f"Archivo JSON existente eliminado: {archivo_json.name}")
-                
-                archivo.rename(archivo_json)
-                logger.debug(f"Renombrado: {archivo.name} -> {archivo_json.name}")
-            except Exception as e:
-                logger.warning(f"No se pudo renombrar {archivo.name}: {e}")
+        if self.etapa_completada(factura, ETAPA_ARCHIVOS):
+            return
         
-        # Eliminar archivos de rechazo
-        patron_rechazo = f"ResultadosMSPS_FE{factura}_ID0_R.txt"
-        archivos_rechazo = list(ruta_factura_destino.glob(patron_rechazo))
+        with self._lock:
+            if factura not in self._destinos_previos:
+                return
+            self._destinos_previos.discard(factura)
         
-        for archivo in archivos_rechazo:
+        with self.metricas.medir(factura, ETAPA_ARCHIVOS) as medicion:
+            medicion.archivos = self._aplicar_reglas_en_destino(ruta_factura_destino, factura)
+    
+    def _aplicar_reglas_en_destino(self, ruta_factura_destino: Path, factura: str) -> int:
+        """Aplica las reglas a lo que ya estaba en el destino (una sola lectura de la carpeta); retorna los archivos tocados"""
+        nombre_destino = self.reglas.para_factura(factura)
+        tocados = 0
+        
+        with os.scandir(ruta_factura_destino) as entradas:
+            archivos = [entrada.name for entrada in entradas if entrada.is_file()]
+        
+        for nombre in archivos:
+            nuevo = nombre_destino(nombre)
+            if nuevo == nombre:
+                continue
+            archivo = ruta_factura_destino / nombre
             try:
-                archivo.unlink()
-                logger.debug(f"Eliminado archivo de rechazo: {archivo.name}")
+                if nuevo is None:
+                    archivo.unlink()
+                    logger.debug(f"Eliminado: {nombre}")
+                else:
+                    # Si el archivo nuevo ya existe, se reemplaza
+                    os.replace(archivo, ruta_factura_destino / nuevo)
+                    logger.debug(f"Renombrado: {nombre} -> {nuevo}")
+                tocados += 1
             except Exception as e:
-                logger.warning(f"No se pudo eliminar {archivo.name}: {e}")
-        
-        # Eliminar archivos locales
-        patron_locales = f"ResultadosLocales_FE{factura}.txt"
-        archivos_locales = list(ruta_factura_destino.glob(patron_locales))
+                logger.warning(f"No se pudo aplicar la regla a {nombre}: {e}")
         
-        for archivo in archivos_locales:
-            try:
-                archivo.unlink()
-                logger.debug(f"Eliminado archivo local: {archivo.name}")
-            except Exception as e:
-                logger.warning(f"No se pudo eliminar {archivo.name}: {e}")
+        return tocados
     
     def procesar_una_factura(self, factura: str) -> bool:
         """Procesa una factura completa (soportes + factura + archivos)"""
+        with self.metricas.medir(factura, METRICA_TOTAL):
+            return self._procesar_etapas(factura)
+    
+    def _procesar_etapas(self, factura: str) -> bool:
         try:
             # Procesar soportes
             if not self.procesar_soporte(factura):
-                self.errores_detallados.append(f"FE{factura}: Soportes no encontrados")
+                self.registrar_error(f"FE{factura}: Soportes no encontrados")
+                self.registrar_etapa(factura, ETAPA_SOPORTE, 'error')
                 return False
+            self.registrar_etapa(factura, ETAPA_SOPORTE)
             
             # Procesar factura
             ruta_factura_destino = self.procesar_factura(factura)
             if not ruta_factura_destino:
-                self.errores_detallados.append(f"FE{factura}: Factura no encontrada")
+                self.registrar_error(f"FE{factura}: Factura no encontrada")
+                self.registrar_etapa(factura, ETAPA_FACTURA, 'error')
                 return False
+            self.registrar_etapa(factura, ETAPA_FACTURA)
             
             # Procesar archivos
             self.procesar_archivos_factura(ruta_factura_destino, factura)
+            self.registrar_etapa(factura, ETAPA_ARCHIVOS)
             
+            self.registrar_etapa(factura, ETAPA_COMPLETADA)
             return True
             
         except Exception as e:
             logger.error(f"❌ Error inesperado procesando FE{factura}: {e}")
-            self.errores_detallados.append(f"FE{factura}: {str(e)}")
+            self.registrar_error(f"FE{factura}: {str(e)}")
+            self.registrar_etapa(factura, ETAPA_COMPLETADA, 'error', str(e))
             return False
     
+    def registrar_etapa(self, factura: str, etapa: str, estado: str = 'ok', detalle: str = '') -> None:
+        """Anota en la bitácora el resultado de una etapa (si hay bitácora abierta)"""
+        if self.bitacora is not None and not self.etapa_completada(factura, etapa):
+            self.bitacora.registrar(factura, etapa, estado, detalle)
+    
+    def etapa_completada(self, factura: str, etapa: str) -> bool:
+        """Indica si la bitácora registra la etapa como terminada"""
+        return self.bitacora is not None and self.bitacora.etapa_completada(factura, etapa)
+    
     def procesar_todas(self) -> Tuple[int, int]:
         """Procesa todas las facturas y retorna (exitosas, fallidas)"""
         
@@ -195,25 +332,151 @@ class ProcesadorFacturas:
             logger.error("❌ No se pudieron cargar facturas del Excel")
             return 0, 0
         
+        if self.catalogo is not None:
+            self.consultar_catalogo(facturas)
+        
+        # Abrir la bitácora y descartar lo que ya terminó en la ejecución anterior
+        self.bitacora = BitacoraEjecucion(self.ruta_bitacora, reanudar=self.reanudar)
+        todas = facturas
+        if self.reanudar:
+            completadas = self.bitacora.completadas()
+            pendientes = [factura for factura in facturas if factura not in completadas]
+            self.facturas_exitosas += len(facturas) - len(pendientes)
+            logger.info(f"⏭️ Reanudando: {len(facturas) - len(pendientes)} facturas ya completadas")
+            facturas = pendientes
+        
         logger.info(f"⏳ Iniciando procesamiento de {len(facturas)} facturas...\n")
         
         # Procesar con barra de progreso
-        with tqdm(total=len(facturas), desc="Procesando facturas", 
-                 bar_format='{l_bar}{bar:40}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]',
-                 ncols=100, colour="green") as pbar:
-            
-            for factura in facturas:
-                pbar.set_description(f"Procesando FE{factura}")
+        from tqdm import tqdm
+        try:
+            with tqdm(total=len(facturas), desc="Procesando facturas", 
+                     bar_format='{l_bar}{bar:40}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]',
+                     ncols=100, colour="green") as pbar:
                 
-                if self.procesar_una_factura(factura):
-                    self.facturas_exitosas += 1
+                if self.trabajadores == 1:
+                    for factura in facturas:
+                        pbar.set_description(f"Procesando FE{factura}")
+                        
+                        if self.procesar_una_factura(factura):
+                            self.facturas_exitosas += 1
+                        else:
+                            self.facturas_fallidas += 1
+                        
+                        pbar.update(1)
                 else:
-                    self.facturas_fallidas += 1
-                
-                pbar.update(1)
+                    self.procesar_en_paralelo(facturas, pbar)
+            
+            if self.verificar:
+                self.verificar_copias(todas)
+        finally:
+            self.bitacora.cerrar()
         
         return self.facturas_exitosas, self.facturas_fallidas
     
+    def procesar_en_paralelo(self, facturas: List[str], pbar: 'tqdm') -> None:
+        """Procesa las facturas con un pool de hilos dejando el mismo resultado que el modo serial"""
+        # Las filas repetidas de una factura se procesan seguidas en el mismo hilo:
+        # dos hilos nunca escriben en la misma carpeta de destino, y cada fila deja
+        # su resultado, su error y su registro como en el modo serial
+        filas = {}  # factura -> filas del Excel donde aparece
+        for fila, factura in enumerate(facturas):
+            filas.setdefault(factura, []).append(fila)
+        
+        def procesar_filas(factura: str) -> List[Tuple[int, bool, List[str]]]:
+            resultados = []
+            for fila in filas[factura]:
+                self._errores_fila.errores = []
+                try:
+                    exitosa = self.procesar_una_factura(factura)
+                    resultados.append((fila, exitosa, self._errores_fila.errores))
+                finally:
+                    self._errores_fila.errores = None
+                pbar.update(1)
+            return resultados
+        
+        pbar.set_description(f"Procesando ({self.trabajadores} hilos)")
+        errores_por_fila = []  # (fila del Excel, errores de esa fila)
+        pool = nullcontext(self.executor) if self.executor is not None else ThreadPoolExecutor(max_workers=self.trabajadores)
+        with pool as executor:
+            futuros = [executor.submit(procesar_filas, factura) for factura in filas]
+            for futuro in as_completed(futuros):
+                resultados = futuro.result()
+                exitosas = sum(1 for _, exitosa, _ in resultados if exitosa)
+                
+                with self._lock:
+                    self.facturas_exitosas += exitosas
+                    self.facturas_fallidas += len(resultados) - exitosas
+                errores_por_fila.extend((fila, errores) for fila, _, errores in resultados if errores)
+        
+        # Dejar los errores en el orden de las filas del Excel, como en el modo serial
+        errores_por_fila.sort(key=lambda elemento: elemento[0])
+        with self._lock:
+            self.errores_detallados.extend(error for _, errores in errores_por_fila for error in errores)
+    
+    def verificar_copias(self, facturas: List[str]) -> None:
+        """Compara por SHA-256 lo copiado con el origen y escribe el manifiesto del lote.
+        
+        Se verifican todas las facturas completadas (también las de una ejecución
+        anterior al reanudar). Una copia que no coincide se borra y la factura
+        queda con error en la bitácora, así --reanudar la vuelve a copiar.
+        """
+        completadas = self.bitacora.completadas()
+        unicas = [factura for factura in dict.fromkeys(facturas) if factura in completadas]
+        
+        pares = []
+        origen_de_par = {}  # destino -> (factura, etapa)
+        for factura in unicas:
+            copias = (
+                (ETAPA_SOPORTE, self.ruta_soportes / f"FE{factura}", self.ruta_soportes_destino / f"FE{factura}", None),
+                (ETAPA_FACTURA, self.ruta_facturas / f"AttachedDocument_F-010-{factura}",
+                 self.ruta_facturas_destino / f"FE{factura}", self.reglas.para_factura(factura)),
+            )
+            for etapa, origen, destino, nombre_destino in copias:
+                for par in pares_de_copia(origen, destino, nombre_destino):
+                    pares.append(par)
+                    origen_de_par[par[1]] = (factura, etapa)
+        
+        logger.info(f"🔐 Verificando {len(pares)} archivos de {len(unicas)} facturas...")
+        cache = CacheHashes(self.ruta_destino / NOMBRE_CACHE, self.tamano_bloque)
+        # Hashear es lectura y hashlib suelta el GIL: se usan hilos aunque la copia haya sido serial
+        trabajadores = max(self.trabajadores, min(8, os.cpu_count() or 1))
+        pool = nullcontext(self.executor) if self.executor is not None else ThreadPoolExecutor(max_workers=trabajadores)
+        with pool as executor, self.metricas.medir(None, ETAPA_VERIFICACION) as medicion:
+            resultados = verificar_pares(pares, cache, executor)
+            medicion.bytes = cache.bytes_leidos
+            medicion.archivos = len(pares)
+        cache.guardar()
+        
+        hashes = {}
+        con_error = {}  # factura -> etapas a repetir
+        for _, destino, digest, problema in resultados:
+            if problema is None:
+                hashes[destino] = digest
+                continue
+            factura, etapa = origen_de_par[destino]
+            self.registrar_error(f"FE{factura}: {os.path.relpath(destino, self.ruta_destino)} {problema}")
+            con_error.setdefault(factura, set()).add(etapa)
+            if problema.startswith('el contenido'):
+                try:
+                    os.remove(destino)
+                except OSError as e:
+                    logger.warning(f"No se pudo borrar la copia dañada {destino}: {e}")
+        
+        repeticiones = Counter(facturas)
+        for factura, etapas in con_error.items():
+            for etapa in etapas:
+                self.bitacora.registrar(factura, etapa, 'error', 'verificación')
+            self.bitacora.registrar(factura, ETAPA_COMPLETADA, 'error', 'verificación')
+            self.facturas_exitosas -= repeticiones[factura]
+            self.facturas_fallidas += repeticiones[factura]
+        
+        escribir_manifiesto(self.ruta_manifiesto, hashes)
+        self.archivos_verificados = len(hashes)
+        self.archivos_con_diferencias = len(resultados) - len(hashes)
+        logger.info(f"🔐 {self.archivos_verificados} archivos verificados ({cache.bytes_leidos / 1e6:.1f} MB leídos, "
+                    f"{cache.aciertos} hashes del caché); manifiesto en {self.ruta_manifiesto}")
+    
     def generar_reporte(self) -> None:
         """Genera un reporte del procesamiento"""
         total = self.facturas_exitosas + self.facturas_fallidas
@@ -236,7 +499,41 @@ class ProcesadorFacturas:
             if len(self.errores_detallados) > 10:
                 print(f"  ... y {len(self.errores_detallados) - 10} errores más")
         
+        if self.verificar:
+            print(f"🔐 Archivos verificados: {self.archivos_verificados}, con diferencias: {self.archivos_con_diferencias}")
+        
+        self.imprimir_tiempos()
+        
         print("="*60)
+    
+    def imprimir_tiempos(self) -> None:
+        """Imprime p50/p95/p99 por etapa y el histograma de las etapas por factura"""
+        resumen = self.metricas.resumen()
+        if not resumen:
+            return
+        
+        print("\n⏱️ Tiempos por etapa:")
+        print(f"  {'etapa':<14}{'n':>7}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'MB':>9}{'archivos':>10}")
+        for etapa, datos in resumen.items():
+            print(f"  {etapa:<14}{datos['cantidad']:>7}{datos['total_s']:>10.2f}"
+                  f"{datos['p50_s'] * 1000:>9.1f}{datos['p95_s'] * 1000:>9.1f}{datos['p99_s'] * 1000:>9.1f}"
+                  f"{datos['bytes'] / 1e6:>9.1f}{datos['archivos']:>10}")
+        
+        for etapa in (ETAPA_SOPORTE, ETAPA_FACTURA, ETAPA_ARCHIVOS):
+            lineas = self.metricas.histograma(etapa)
+            if lineas:
+                print(f"\n  Distribución '{etapa}':")
+                for linea in lineas:
+                    print(f"  {linea}")
+    
+    def exportar_metricas(self) -> Tuple[Path, Path]:
+        """Guarda las métricas en el destino como JSON (resumen + mediciones) y CSV"""
+        ruta_json = self.ruta_metricas.with_suffix('.json')
+        ruta_csv = self.ruta_metricas.with_suffix('.csv')
+        self.metricas.exportar_json(ruta_json)
+        self.metricas.exportar_csv(ruta_csv)
+        logger.info(f"📈 Métricas guardadas en {ruta_json} y {ruta_csv}")
+        return ruta_json, ruta_csv
 
 
 def solicitar_ruta(mensaje: str, debe_existir: bool = False) -> str:
@@ -258,8 +555,52 @@ def solicitar_ruta(mensaje: str, debe_existir: bool = False) -> str:
         return ruta
 
 
+def solicitar_entero(mensaje: str, predeterminado: int) -> int:
+    """Solicita un entero positivo al usuario, con valor por defecto"""
+    while True:
+        valor = input(f"{mensaje}: ").strip()
+        
+        if not valor:
+            return predeterminado
+        
+        if valor.isdigit() and int(valor) > 0:
+            return int(valor)
+        
+        print("⚠️ Ingrese un número entero mayor que cero")
+
+
+def ejecutar_con_perfil(procesador: ProcesadorFacturas, lineas: int = 20) -> Tuple[int, int]:
+    """Ejecuta procesar_todas bajo cProfile, guarda el .prof en el destino e imprime las funciones más costosas"""
+    import cProfile
+    import pstats
+    
+    perfil = cProfile.Profile()
+    resultado = perfil.runcall(procesador.procesar_todas)
+    
+    ruta_perfil = procesador.ruta_destino / "perfil_radicacion.prof"
+    if procesador.ruta_destino.exists():
+        perfil.dump_stats(str(ruta_perfil))
+        logger.info(f"🔬 Perfil guardado en {ruta_perfil} (ábralo con snakeviz o pstats)")
+    pstats.Stats(perfil).sort_stats('cumulative').print_stats(lineas)
+    return resultado
+
+
+def solicitar_reglas() -> Optional[ReglasCopia]:
+    """Pregunta el archivo de reglas por EPS y la EPS (Enter = reglas predeterminadas); None si no se pudo cargar"""
+    ruta_reglas = input("📜 Archivo de reglas de copia por EPS, .toml o .json (Enter = predeterminadas): ").strip()
+    if not ruta_reglas:
+        return ReglasCopia()
+    eps = input("🏥 EPS de las reglas (Enter = predeterminada): ").strip() or None
+    try:
+        return cargar_reglas(ruta_reglas, eps)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se pudieron cargar las reglas: {e}")
+        return None
+
+
 def main():
     """Función principal para procesar facturas y soportes"""
+    configurar_logging()
     print("="*60)
     print("🚀 PROCESADOR DE FACTURAS Y SOPORTES")
     print("="*60 + "\n")
@@ -282,17 +623,50 @@ def main():
         
         ruta_destino = solicitar_ruta("📁 Ingrese la ruta de destino")
         
+        modo_copia = solicitar_modo_copia()
+        
+        reglas = solicitar_reglas()
+        if reglas is None:
+            return
+        
+        trabajadores = solicitar_entero("🧵 Ingrese el número de hilos de copia (Enter = 1)", 1)
+        limite_soportes = limite_facturas = None
+        if trabajadores > 1:
+            limite_soportes = solicitar_entero(
+                f"📦 Copias simultáneas desde soportes (Enter = {trabajadores})", trabajadores)
+            limite_facturas = solicitar_entero(
+                f"🗄️ Copias simultáneas desde facturas (Enter = {trabajadores})", trabajadores)
+        
+        verificar = input("🔐 ¿Verificar las copias con SHA-256 y generar el manifiesto? (s/n): ").strip().lower() == 's'
+        
+        reanudar = '--reanudar' in sys.argv[1:]
+        if not reanudar and (Path(ruta_destino) / "bitacora_radicacion.jsonl").exists():
+            reanudar = input("♻️ Hay una ejecución anterior en el destino. ¿Desea reanudarla? (s/n): ").strip().lower() == 's'
+        
         # Crear procesador y ejecutar
         procesador = ProcesadorFacturas(
             ruta_xlsx=ruta_xlsx,
             columna=columna_excel,
             ruta_destino=ruta_destino,
             ruta_soportes=ruta_soportes,
-            ruta_facturas=ruta_facturas
+            ruta_facturas=ruta_facturas,
+            trabajadores=trabajadores,
+            limite_soportes=limite_soportes,
+            limite_facturas=limite_facturas,
+            reanudar=reanudar,
+            modo_copia=modo_copia,
+            reglas=reglas,
+            verificar=verificar
         )
         
-        exitosas, fallidas = procesador.procesar_todas()
+        # Con --perfil se ejecuta bajo cProfile y se guarda el perfil junto a las métricas
+        if '--perfil' in sys.argv[1:]:
+            exitosas, fallidas = ejecutar_con_perfil(procesador)
+        else:
+            exitosas, fallidas = procesador.procesar_todas()
         procesador.generar_reporte()
+        if procesador.ruta_destino.exists():
+            procesador.exportar_metricas()
         
     except KeyboardInterrupt:
         print("\n\n⚠️ Proceso interrumpido por el usuario")
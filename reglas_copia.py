@@ -0,0 +1,95 @@
+import fnmatch
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+
+# Reglas que deciden, durante la copia de una factura, qué archivos no se copian
+# y cuáles se escriben con otro nombre. Así los rechazos y resultados locales no
+# se copian para luego borrarlos, y el CUV queda como .json desde el principio.
+#
+# Los patrones son comodines de fnmatch; {factura} se reemplaza por el número
+# de la factura que se está copiando. Cada EPS puede tener sus propias reglas en
+# un archivo TOML o JSON:
+#
+#   [eps.sura]
+#   omitir = ["ResultadosMSPS_FE{factura}_ID0_R.txt", "ResultadosLocales_FE{factura}.txt"]
+#   renombrar = [{patron = "ResultadosMSPS_FE{factura}_*_A_CUV.txt", extension = ".json"}]
+
+EPS_PREDETERMINADA = 'predeterminada'
+
+# Lo que hacía procesar_archivos_factura después de copiar
+REGLAS_PREDETERMINADAS = {
+    'omitir': [
+        'ResultadosMSPS_FE{factura}_ID0_R.txt',
+        'ResultadosLocales_FE{factura}.txt',
+    ],
+    'renombrar': [
+        {'patron': 'ResultadosMSPS_FE{factura}_*_A_CUV.txt', 'extension': '.json'},
+    ],
+}
+
+
+class ReglasCopia:
+    """Reglas de omisión y renombrado de archivos al copiar la carpeta de una factura"""
+
+    def __init__(self, omitir: Optional[List[str]] = None, renombrar: Optional[List[Dict[str, str]]] = None):
+        self.omitir = list(REGLAS_PREDETERMINADAS['omitir'] if omitir is None else omitir)
+        self.renombrar = list(REGLAS_PREDETERMINADAS['renombrar'] if renombrar is None else renombrar)
+        for regla in self.renombrar:
+            if 'patron' not in regla or 'extension' not in regla:
+                raise ValueError(f"Regla de renombrado incompleta (requiere 'patron' y 'extension'): {regla}")
+
+    @classmethod
+    def desde_dict(cls, datos: dict) -> 'ReglasCopia':
+        return cls(datos.get('omitir'), datos.get('renombrar'))
+
+    def para_factura(self, factura: str) -> Callable[[str], Optional[str]]:
+        """Devuelve nombre_destino(nombre) para copiado.copiar_arbol: nuevo nombre, o None para no copiar"""
+        omitir = [patron.format(factura=factura) for patron in self.omitir]
+        renombrar = [(regla['patron'].format(factura=factura), regla['extension']) for regla in self.renombrar]
+
+        def nombre_destino(nombre: str) -> Optional[str]:
+            for patron in omitir:
+                if fnmatch.fnmatch(nombre, patron):
+                    return None
+            for patron, extension in renombrar:
+                if fnmatch.fnmatch(nombre, patron):
+                    return os.path.splitext(nombre)[0] + extension
+            return nombre
+
+        return nombre_destino
+
+    def __repr__(self):
+        return f"ReglasCopia(omitir={self.omitir}, renombrar={self.renombrar})"
+
+
+def cargar_reglas(ruta: Optional[str] = None, eps: Optional[str] = None) -> ReglasCopia:
+    """Carga las reglas de la EPS desde un archivo TOML o JSON; sin archivo, las predeterminadas.
+
+    Lanza ValueError si la EPS no está en el archivo o el formato no es soportado.
+    """
+    if not ruta:
+        return ReglasCopia()
+
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(ruta, 'rb') as f:
+            datos = tomllib.load(f)
+    elif extension == '.json':
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+    else:
+        raise ValueError(f"Formato de reglas no soportado: {extension}. Use .toml o .json")
+
+    por_eps = datos.get('eps', {})
+    eps = eps or EPS_PREDETERMINADA
+    if eps not in por_eps:
+        if eps == EPS_PREDETERMINADA:
+            return ReglasCopia()
+        raise ValueError(f"La EPS '{eps}' no tiene reglas en {ruta}. EPS disponibles: {sorted(por_eps)}")
+    return ReglasCopia.desde_dict(por_eps[eps])
@@ -1,7 +1,9 @@
 import os
 import re
-import time
-from tqdm import tqdm
+import json
+from datetime import datetime
+
+PATRON_SUFIJO = re.compile(r'^(.*?)_(\d+)$')
 
 
 def validar_ruta(ruta):
@@ -12,63 +14,124 @@ def validar_ruta(ruta):
     return True
 
 
+def calcular_nuevo_nombre(archivo):
+    """Devuelve (nuevo_nombre, sufijo_actual): FE258058_2.zip -> FE258058_3.zip, FE258058.zip -> FE258058_1.zip"""
+    # Separar el nombre base y la extensión
+    nombre_base, extension = os.path.splitext(archivo)
+
+    match = PATRON_SUFIJO.match(nombre_base)
+    if match:
+        # Si tiene un sufijo numérico (por ejemplo, FE258058_2)
+        nombre_sin_sufijo = match.group(1)  # FE258058
+        numero_sufijo = int(match.group(2))  # 2
+        return f"{nombre_sin_sufijo}_{numero_sufijo + 1}{extension}", numero_sufijo
+
+    # Si no tiene sufijo numérico, agregar _1
+    return f"{nombre_base}_1{extension}", 0
+
+
+def planificar_renombrado(ruta, archivos_zip):
+    """Calcula todos los nombres nuevos y el orden seguro para renombrar.
+
+    Se renombra primero el sufijo más alto (FE1_2 -> FE1_3 antes que FE1_1 -> FE1_2),
+    así ningún archivo pisa a otro del mismo lote. Si el nombre nuevo lo ocupa un
+    archivo que no está en el lote, el archivo se deja como está y se reporta.
+    Devuelve (plan [(viejo, nuevo)], conflictos [(viejo, nuevo)]).
+    """
+    candidatos = []
+    for archivo in archivos_zip:
+        nuevo, sufijo = calcular_nuevo_nombre(archivo)
+        candidatos.append((sufijo, archivo, nuevo))
+    candidatos.sort(key=lambda candidato: candidato[0], reverse=True)
+
+    en_lote = {os.path.normcase(archivo) for archivo in archivos_zip}
+    ocupados = {os.path.normcase(nombre) for nombre in os.listdir(ruta)} - en_lote
+
+    plan, conflictos = [], []
+    for _, archivo, nuevo in candidatos:
+        if os.path.normcase(nuevo) in ocupados:
+            conflictos.append((archivo, nuevo))
+            ocupados.add(os.path.normcase(archivo))  # Se queda con su nombre actual
+        else:
+            plan.append((archivo, nuevo))
+            ocupados.add(os.path.normcase(nuevo))
+    return plan, conflictos
+
+
+def guardar_registro_deshacer(ruta, plan):
+    """Escribe el plan antes de ejecutarlo para poder revertir el lote completo."""
+    ruta_registro = os.path.join(ruta, f"deshacer_renombrado_{datetime.now():%Y%m%d_%H%M%S}.jsonl")
+    with open(ruta_registro, 'w', encoding='utf-8') as f:
+        for viejo, nuevo in plan:
+            f.write(json.dumps({'viejo': viejo, 'nuevo': nuevo}, ensure_ascii=False) + '\n')
+    return ruta_registro
+
+
+def deshacer_renombrado(ruta_registro):
+    """Revierte un lote usando su registro (en orden inverso); devuelve cuántos archivos se restauraron"""
+    ruta = os.path.dirname(os.path.abspath(ruta_registro))
+    with open(ruta_registro, 'r', encoding='utf-8') as f:
+        plan = [json.loads(linea) for linea in f if linea.strip()]
+
+    restaurados = 0
+    for paso in reversed(plan):
+        ruta_nueva = os.path.join(ruta, paso['nuevo'])
+        ruta_vieja = os.path.join(ruta, paso['viejo'])
+        # Si el lote se interrumpió, los pasos que no alcanzaron a ejecutarse se saltan
+        if os.path.exists(ruta_nueva) and not os.path.exists(ruta_vieja):
+            os.rename(ruta_nueva, ruta_vieja)
+            restaurados += 1
+    return restaurados
+
+
 def renombrar_archivos_zip(ruta):
     """Renombra archivos ZIP en la misma carpeta con barra de progreso"""
     # Obtener lista de archivos ZIP
     print("🔍 Buscando archivos ZIP para renombrar...")
-    archivos_zip = [
-        archivo for archivo in os.listdir(ruta)
-        if os.path.isfile(os.path.join(ruta, archivo)) and archivo.lower().endswith('.zip')
-    ]
+    with os.scandir(ruta) as entradas:
+        archivos_zip = [
+            entrada.name for entrada in entradas
+            if entrada.is_file() and entrada.name.lower().endswith('.zip')
+        ]
 
     if not archivos_zip:
         print("⚠️ No se encontraron archivos ZIP en la ruta.")
         return
 
-    # Configurar la barra de progreso
-    print("📈 Iniciando proceso de renombrado...")
-    for archivo in tqdm(archivos_zip, desc="Procesando archivos ZIP", unit="archivo"):
-        ruta_archivo = os.path.join(ruta, archivo)
-
-        # Separar el nombre base y la extensión
-        nombre_base, extension = os.path.splitext(archivo)
-
-        match = re.match(r'^(.*?)_(\d+)$', nombre_base)
-        if match:
-            # Si tiene un sufijo numérico (por ejemplo, FE258058_2)
-            nombre_sin_sufijo = match.group(1)  # FE258058
-            numero_sufijo = int(match.group(2))  # 2
-            nuevo_numero = numero_sufijo + 1  # 3
-            nuevo_nombre_base = f"{nombre_sin_sufijo}_{nuevo_numero}"
-        else:
-            # Si no tiene sufijo numérico, agregar _1
-            nuevo_nombre_base = f"{nombre_base}_1"
+    plan, conflictos = planificar_renombrado(ruta, archivos_zip)
+    for archivo, nuevo in conflictos:
+        print(f"⚠️ {archivo} no se renombró: ya existe {nuevo}")
 
-        # Crear el nuevo nombre del archivo
-        nuevo_nombre = f"{nuevo_nombre_base}{extension}"
-        nueva_ruta = os.path.join(ruta, nuevo_nombre)
+    ruta_registro = guardar_registro_deshacer(ruta, plan)
 
+    # Configurar la barra de progreso (tqdm se importa solo si hay archivos que renombrar)
+    from tqdm import tqdm
+    print("📈 Iniciando proceso de renombrado...")
+    for archivo, nuevo_nombre in tqdm(plan, desc="Procesando archivos ZIP", unit="archivo"):
         # Renombrar el archivo en la misma carpeta
-        os.rename(ruta_archivo, nueva_ruta)
-        print(f"📄 Archivo {archivo} renombrado a {nuevo_nombre}")
+        os.rename(os.path.join(ruta, archivo), os.path.join(ruta, nuevo_nombre))
 
-        # Simular tiempo de procesamiento (ajustable)
-        time.sleep(0.1)  # Simula 0.1 segundos por archivo
+    print(f"📄 {len(plan)} archivos renombrados. Para revertir el lote use: {ruta_registro}")
 
 
 def main():
     """Función principal"""
     # Solicitar la ruta de origen
-    ruta = input("📦 Ingrese la ruta de origen: ")
+    ruta = input("📦 Ingrese la ruta de origen (o un registro deshacer_renombrado_*.jsonl para revertir): ")
 
     # Validar la ruta
     if not validar_ruta(ruta):
         return
 
+    if os.path.isfile(ruta) and ruta.endswith('.jsonl'):
+        restaurados = deshacer_renombrado(ruta)
+        print(f"↩️ {restaurados} archivos restaurados.")
+        return
+
     # Renombrar los archivos ZIP
     renombrar_archivos_zip(ruta)
     print("✅ Proceso completado.")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
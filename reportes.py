@@ -0,0 +1,161 @@
+import csv
+import glob
+import importlib.util
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+# Resultado por factura de cada ejecución (encontrada, no encontrada, copiada o
+# fallida, con motivo, bytes y duración) en un dataset particionado por
+# ejecución, al estilo Hive:
+#
+#   <destino>/reportes/<proceso>/ejecucion=20250301_101500/parte-00000.parquet
+#
+# Cada ejecución escribe su propia partición, así ninguna pisa a la anterior, y
+# pandas.read_parquet('<destino>/reportes/faltantes') devuelve todas con la
+# columna 'ejecucion'. Sin pyarrow el dataset se escribe en CSV con la misma
+# estructura. Las filas se escriben a medida que llegan (CSV) o por partes de
+# FILAS_POR_PARTE (Parquet); el Excel solo se genera si se pide, con un libro de
+# solo escritura leyendo la partición por filas.
+
+CARPETA_REPORTES = 'reportes'
+FORMATO_PARQUET = 'parquet'
+FORMATO_CSV = 'csv'
+FILAS_POR_PARTE = 50000
+
+ENCONTRADA = 'encontrada'
+NO_ENCONTRADA = 'no_encontrada'
+COPIADA = 'copiada'
+FALLIDA = 'fallida'
+ESTADOS = (ENCONTRADA, NO_ENCONTRADA, COPIADA, FALLIDA)
+
+COLUMNAS = ['ejecucion', 'proceso', 'factura', 'estado', 'motivo', 'bytes', 'segundos', 'fecha']
+
+
+def formato_predeterminado() -> str:
+    """Parquet si está pyarrow; si no, CSV"""
+    return FORMATO_PARQUET if importlib.util.find_spec('pyarrow') else FORMATO_CSV
+
+
+class ReporteEjecucion:
+    """Partición del dataset de reportes para una ejecución de un proceso; segura entre hilos"""
+
+    def __init__(self, ruta_reportes, proceso, formato=None, ejecucion=None):
+        self.proceso = proceso
+        self.formato = formato or formato_predeterminado()
+        if self.formato not in (FORMATO_PARQUET, FORMATO_CSV):
+            raise ValueError(f"Formato de reporte desconocido: {self.formato}. Use {FORMATO_PARQUET} o {FORMATO_CSV}")
+        base = ejecucion or datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Dos ejecuciones en el mismo segundo (por ejemplo, en un lote) no comparten partición
+        self.ejecucion, sufijo = base, 1
+        while os.path.exists(os.path.join(ruta_reportes, proceso, f"ejecucion={self.ejecucion}")):
+            sufijo += 1
+            self.ejecucion = f"{base}_{sufijo}"
+        self.ruta_particion = os.path.join(ruta_reportes, proceso, f"ejecucion={self.ejecucion}")
+        os.makedirs(self.ruta_particion)
+
+        self.conteo: Dict[str, int] = dict.fromkeys(ESTADOS, 0)
+        self._filas: List[list] = []
+        self._partes = 0
+        self._lock = threading.Lock()
+        self._archivo = None
+        self._escritor = None
+        if self.formato == FORMATO_CSV:
+            self._archivo = open(os.path.join(self.ruta_particion, 'parte-00000.csv'), 'w',
+                                 encoding='utf-8', newline='')
+            self._escritor = csv.writer(self._archivo)
+            self._escritor.writerow(COLUMNAS)
+
+    def registrar(self, factura, estado, motivo='', bytes_copiados=0, segundos=0.0) -> None:
+        """Agrega el resultado de una factura."""
+        if estado not in ESTADOS:
+            raise ValueError(f"Estado desconocido: {estado}. Use uno de {ESTADOS}")
+        fila = [self.ejecucion, self.proceso, str(factura), estado, motivo, int(bytes_copiados),
+                round(segundos, 6), datetime.now().isoformat(timespec='seconds')]
+        with self._lock:
+            self.conteo[estado] += 1
+            if self._escritor is not None:
+                self._escritor.writerow(fila)
+            else:
+                self._filas.append(fila)
+                if len(self._filas) >= FILAS_POR_PARTE:
+                    self._escribir_parte()
+
+    def _escribir_parte(self) -> None:
+        """Escribe las filas acumuladas como una parte Parquet (se llama con el lock tomado)."""
+        if not self._filas:
+            return
+        import pandas as pd
+
+        # En Parquet la ejecución sale del nombre de la partición (ejecucion=...)
+        tabla = pd.DataFrame(self._filas, columns=COLUMNAS).drop(columns='ejecucion')
+        ruta = os.path.join(self.ruta_particion, f"parte-{self._partes:05d}.parquet")
+        tabla.to_parquet(f"{ruta}.tmp", index=False)
+        os.replace(f"{ruta}.tmp", ruta)
+        self._partes += 1
+        self._filas = []
+
+    def cerrar(self) -> str:
+        """Termina de escribir la partición y devuelve su ruta."""
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = self._escritor = None
+            else:
+                self._escribir_parte()
+        return self.ruta_particion
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+    def resumen(self) -> str:
+        return ' | '.join(f"{estado}: {cantidad}" for estado, cantidad in self.conteo.items() if cantidad)
+
+    def exportar_excel(self, ruta_xlsx, estados: Optional[Iterable[str]] = None) -> int:
+        """Excel de esta ejecución (cerrada); ver exportar_excel."""
+        return exportar_excel(self.ruta_particion, ruta_xlsx, estados)
+
+
+def leer_particion(ruta_particion) -> Iterator[dict]:
+    """Filas de una partición (CSV o Parquet) como diccionarios, parte por parte."""
+    for ruta in sorted(glob.glob(os.path.join(ruta_particion, 'parte-*.csv'))):
+        with open(ruta, 'r', encoding='utf-8', newline='') as f:
+            for fila in csv.DictReader(f):
+                fila['bytes'] = int(fila['bytes'])
+                fila['segundos'] = float(fila['segundos'])
+                yield fila
+    partes = sorted(glob.glob(os.path.join(ruta_particion, 'parte-*.parquet')))
+    if partes:
+        import pandas as pd
+        ejecucion = os.path.basename(os.path.normpath(ruta_particion)).partition('=')[2]
+        for ruta in partes:
+            for fila in pd.read_parquet(ruta).to_dict('records'):
+                fila['ejecucion'] = ejecucion
+                yield fila
+
+
+def listar_ejecuciones(ruta_reportes, proceso) -> List[str]:
+    """Particiones de un proceso, de la más antigua a la más reciente."""
+    return sorted(glob.glob(os.path.join(ruta_reportes, proceso, 'ejecucion=*')))
+
+
+def exportar_excel(ruta_particion, ruta_xlsx, estados: Optional[Iterable[str]] = None) -> int:
+    """Escribe la partición (opcionalmente solo algunos estados) en un .xlsx de solo escritura; devuelve las filas."""
+    from openpyxl import Workbook
+
+    estados = set(estados) if estados else None
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Reporte')
+    hoja.append(COLUMNAS)
+    filas = 0
+    for fila in leer_particion(ruta_particion):
+        if estados is None or fila['estado'] in estados:
+            hoja.append([fila[columna] for columna in COLUMNAS])
+            filas += 1
+    libro.save(ruta_xlsx)
+    return filas
@@ -1,14 +1,22 @@
 import os
-import shutil
 import zipfile
-import pandas as pd
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lector_facturas import leer_facturas
+from copiado import MODO_COPIA, copiar_arbol, ruta_almacen_para, solicitar_modo_copia
+
+# Formatos que ya vienen comprimidos: se guardan sin volver a desinflar
+EXTENSIONES_COMPRIMIDAS = {'.pdf', '.zip', '.rar', '.7z', '.gz', '.jpg', '.jpeg', '.png'}
+TAMANO_BLOQUE = 1024 * 1024
 
 def validar_ruta(ruta):
     return os.path.exists(ruta)
 
-def copiar_carpetas(facturas, ruta_origen, ruta_destino):
+def copiar_carpetas(facturas, ruta_origen, ruta_destino, modo=MODO_COPIA):
     if not os.path.exists(ruta_destino):
         os.makedirs(ruta_destino)
+    ruta_almacen = ruta_almacen_para(ruta_destino)
 
     copiadas = []
     for factura in facturas:
@@ -16,23 +24,134 @@ def copiar_carpetas(facturas, ruta_origen, ruta_destino):
         origen = os.path.join(ruta_origen, nombre_carpeta)
         destino = os.path.join(ruta_destino, nombre_carpeta)
         if os.path.exists(origen):
-            shutil.copytree(origen, destino)
+            copiar_arbol(origen, destino, modo=modo, ruta_almacen=ruta_almacen)
             copiadas.append(destino)
             print(f"✅ Copiada: {nombre_carpeta}")
         else:
             print(f"⚠️ No encontrada: {nombre_carpeta}")
     return copiadas
 
-def comprimir_carpetas(ruta_destino, nombre_zip='facturas_comprimidas.zip'):
-    zip_path = os.path.join(ruta_destino, nombre_zip)
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for carpeta_raiz, _, archivos in os.walk(ruta_destino):
-            for archivo in archivos:
-                if archivo != nombre_zip:
-                    ruta_completa = os.path.join(carpeta_raiz, archivo)
-                    ruta_relativa = os.path.relpath(ruta_completa, ruta_destino)
-                    zipf.write(ruta_completa, ruta_relativa)
-    print(f"📦 Carpetas comprimidas en: {zip_path}")
+def listar_carpetas_factura(facturas, ruta_origen):
+    # Devuelve [(nombre_carpeta, [(ruta_archivo, nombre_en_zip)], bytes)] leyendo del árbol de origen
+    carpetas = []
+    for factura in facturas:
+        nombre_carpeta = f"AttachedDocument_F-010-{factura}"
+        origen = os.path.join(ruta_origen, nombre_carpeta)
+        if not os.path.isdir(origen):
+            print(f"⚠️ No encontrada: {nombre_carpeta}")
+            continue
+        miembros = []
+        total = 0
+        for carpeta_raiz, _, archivos in os.walk(origen):
+            for archivo in sorted(archivos):
+                ruta_completa = os.path.join(carpeta_raiz, archivo)
+                miembros.append((ruta_completa, os.path.relpath(ruta_completa, ruta_origen)))
+                total += os.path.getsize(ruta_completa)
+        carpetas.append((nombre_carpeta, miembros, total))
+    return carpetas
+
+def planificar_volumenes(carpetas, tamano_maximo=None):
+    # Reparte las carpetas en volúmenes sin partir ninguna carpeta; una carpeta
+    # más grande que el límite queda sola en su volumen
+    volumenes = [[]]
+    acumulado = 0
+    for carpeta in carpetas:
+        tamano = carpeta[2]
+        if tamano_maximo and volumenes[-1] and acumulado + tamano > tamano_maximo:
+            volumenes.append([])
+            acumulado = 0
+        volumenes[-1].append(carpeta)
+        acumulado += tamano
+    return [volumen for volumen in volumenes if volumen]
+
+def desinflar_miembro(ruta_completa):
+    # Comprime un archivo a un flujo deflate crudo (lo que guarda el ZIP) y
+    # devuelve (crc, tamaño, datos); se llama desde los hilos del pool
+    compresor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    tamano = 0
+    partes = []
+    with open(ruta_completa, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            crc = zlib.crc32(bloque, crc)
+            tamano += len(bloque)
+            partes.append(compresor.compress(bloque))
+    partes.append(compresor.flush())
+    return crc, tamano, b''.join(partes)
+
+def agregar_desinflado(zipf, ruta_completa, nombre_en_zip, crc, tamano, datos):
+    # Agrega al ZIP un miembro ya desinflado: zipfile no tiene una forma pública
+    # de escribir datos comprimidos por fuera, así que se escribe el encabezado
+    # local y los datos, y se registra la entrada para el directorio central
+    zinfo = zipfile.ZipInfo.from_file(ruta_completa, nombre_en_zip)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = tamano
+    zinfo.compress_size = len(datos)
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader())
+    zipf.fp.write(datos)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+    zipf._didModify = True
+
+def escribir_volumen(zip_path, carpetas, executor, ventana):
+    # Los miembros que se desinflan se comprimen en el pool (zlib libera el GIL,
+    # así que usan varios núcleos) y se escriben en orden en este hilo; a lo
+    # sumo `ventana` miembros comprimidos esperan en memoria
+    temporal = f"{zip_path}.tmp"
+    miembros = [miembro for _, miembros_carpeta, _ in carpetas for miembro in miembros_carpeta]
+    pendientes = deque()
+    siguiente = 0
+    with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+        while siguiente < len(miembros) or pendientes:
+            while siguiente < len(miembros) and len(pendientes) < ventana:
+                ruta_completa, nombre_en_zip = miembros[siguiente]
+                siguiente += 1
+                if os.path.splitext(ruta_completa)[1].lower() in EXTENSIONES_COMPRIMIDAS:
+                    pendientes.append((ruta_completa, nombre_en_zip, None))
+                else:
+                    pendientes.append((ruta_completa, nombre_en_zip, executor.submit(desinflar_miembro, ruta_completa)))
+            ruta_completa, nombre_en_zip, futuro = pendientes.popleft()
+            if futuro is None:
+                zipf.write(ruta_completa, nombre_en_zip, compress_type=zipfile.ZIP_STORED)
+            else:
+                agregar_desinflado(zipf, ruta_completa, nombre_en_zip, *futuro.result())
+    os.replace(temporal, zip_path)
+    return zip_path
+
+def empaquetar_facturas(facturas, ruta_origen, ruta_destino, nombre_base='facturas_comprimidas',
+                        tamano_maximo_mb=None, trabajadores=None, executor=None):
+    # Empaqueta las carpetas de factura directamente desde el origen (sin copia
+    # intermedia), en volúmenes de hasta tamano_maximo_mb. Los volúmenes se
+    # escriben uno tras otro y los archivos de cada uno se comprimen en paralelo,
+    # así que también un único volumen usa todos los núcleos.
+    # Con un executor compartido (lote de cli.py) se usa ese pool de hilos
+    os.makedirs(ruta_destino, exist_ok=True)
+    # Una factura repetida en el Excel daría entradas duplicadas en el ZIP
+    carpetas = listar_carpetas_factura(dict.fromkeys(facturas), ruta_origen)
+    if not carpetas:
+        return []
+
+    tamano_maximo = tamano_maximo_mb * 1024 * 1024 if tamano_maximo_mb else None
+    volumenes = planificar_volumenes(carpetas, tamano_maximo)
+    if len(volumenes) == 1:
+        rutas = [os.path.join(ruta_destino, f"{nombre_base}.zip")]
+    else:
+        rutas = [os.path.join(ruta_destino, f"{nombre_base}_{i:03d}.zip") for i in range(1, len(volumenes) + 1)]
+
+    trabajadores = trabajadores or getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+    ventana = trabajadores * 4
+    if executor is not None:
+        zips = [escribir_volumen(ruta, volumen, executor, ventana) for ruta, volumen in zip(rutas, volumenes)]
+    else:
+        with ThreadPoolExecutor(max_workers=trabajadores) as executor:
+            zips = [escribir_volumen(ruta, volumen, executor, ventana) for ruta, volumen in zip(rutas, volumenes)]
+
+    for zip_path, volumen in zip(zips, volumenes):
+        print(f"📦 {len(volumen)} carpetas comprimidas en: {zip_path}")
+    return zips
 
 def main():
     print("\n=== Copiador de Carpetas de Facturas ===")
@@ -40,7 +159,21 @@ def main():
     ruta_arbol = input("📁 Ruta del árbol de carpetas de origen: ").strip()
     ruta_destino = input("📂 Ruta de destino para las carpetas copiadas: ").strip()
     nombre_columna = input("📊 Nombre de la columna con los números de factura: ").strip()
+    empaquetar = input("📦 ¿Empaquetar en ZIP directamente desde el origen, sin copiar? (s/n): ").strip().lower() == 's'
+    tamano_maximo_mb = None
+    modo_copia = MODO_COPIA
+    if empaquetar:
+        tamano_maximo = input("📏 Tamaño máximo por volumen en MB (Enter = sin límite): ").strip()
+        tamano_maximo_mb = int(tamano_maximo) if tamano_maximo.isdigit() else None
+    else:
+        modo_copia = solicitar_modo_copia()
+
+    ejecutar(ruta_excel, ruta_arbol, ruta_destino, nombre_columna, empaquetar, tamano_maximo_mb, modo_copia)
 
+def ejecutar(ruta_excel, ruta_arbol, ruta_destino, nombre_columna, empaquetar=False, tamano_maximo_mb=None,
+             modo_copia=MODO_COPIA, executor=None):
+    # Copia (o empaqueta) las carpetas de las facturas del Excel sin hacer preguntas;
+    # devuelve las carpetas copiadas o los ZIP creados
     if not validar_ruta(ruta_excel):
         print("❌ La ruta del archivo Excel no existe.")
         return
@@ -50,20 +183,25 @@ def main():
 
     # Leer facturas del Excel
     try:
-        df = pd.read_excel(ruta_excel)
-        facturas = df[nombre_columna].dropna().astype(int).tolist()
+        facturas = leer_facturas(ruta_excel, nombre_columna)
     except Exception as e:
         print(f"❌ Error al leer el archivo Excel: {e}")
         return
 
+    if empaquetar:
+        zips = empaquetar_facturas(facturas, ruta_arbol, ruta_destino, tamano_maximo_mb=tamano_maximo_mb,
+                                   executor=executor)
+        if not zips:
+            print("⚠️ No se encontraron carpetas para comprimir.")
+        return zips
+
     # Copiar carpetas que coincidan
-    carpetas_copiadas = copiar_carpetas(facturas, ruta_arbol, ruta_destino)
+    carpetas_copiadas = copiar_carpetas(facturas, ruta_arbol, ruta_destino, modo_copia)
 
     if not carpetas_copiadas:
         print("⚠️ No se encontraron carpetas para copiar.")
-        return
-    # Comprimir carpetas copiadas
-    # comprimir_carpetas(ruta_destino)
+        return carpetas_copiadas
+    return carpetas_copiadas
 
 
 if __name__ == '__main__':
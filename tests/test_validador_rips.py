@@ -0,0 +1,121 @@
+"""Reglas de validador_rips sobre hojas armadas a mano: qué filas marca cada regla y con qué nombre.
+
+Uso: python -m pytest tests
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import validador_rips  # noqa: E402
+from capita import CATALOGO_CIE10, ENTERO, OPCIONAL, TEXTO, VALOR  # noqa: E402
+from validador_rips import (CONSECUTIVO_DUPLICADO, DOCUMENTO_DISTINTO, REQUERIDO, TIPO_ENTERO,  # noqa: E402
+                            TIPO_VALOR, USUARIO_INEXISTENTE, compilar_reglas, validar_cruces, validar_hoja,
+                            validar_libro)
+
+
+@pytest.fixture(autouse=True)
+def sin_catalogos(monkeypatch):
+    """Por defecto se valida por formato, aunque haya catálogos en la carpeta de capita."""
+    monkeypatch.setattr(validador_rips, 'catalogo', lambda nombre: None)
+
+
+def hoja(filas, indice=None):
+    return pd.DataFrame(filas, index=indice, dtype=str)
+
+
+def errores_de(partes):
+    """{(hoja, fila, campo, valor, regla)} de la lista de DataFrames que devuelve el validador."""
+    if not partes:
+        return set()
+    errores = pd.concat(partes, ignore_index=True)
+    return {(h, int(fila), campo, valor, regla) for h, fila, campo, valor, regla in errores.itertuples(index=False)}
+
+
+def test_formatos_cie10_y_cups():
+    reglas = compilar_reglas([('codDiagnosticoPrincipal', TEXTO), ('codConsulta', TEXTO)])
+    df = hoja({'codDiagnosticoPrincipal': ['A000', 'a00', 'Z99X'],
+               'codConsulta': ['890201', '89020', 'ABC123']})
+    assert errores_de(validar_hoja('consultas', df, reglas)) == {
+        ('consultas', 3, 'codDiagnosticoPrincipal', 'a00', 'cie10'),
+        ('consultas', 3, 'codConsulta', '89020', 'cups'),
+    }
+
+
+def test_cie10_contra_catalogo(monkeypatch):
+    monkeypatch.setattr(validador_rips, 'catalogo',
+                        lambda nombre: {'A000': 'A000'} if nombre == CATALOGO_CIE10 else None)
+    reglas = compilar_reglas([('codDiagnosticoPrincipal', TEXTO)])
+    df = hoja({'codDiagnosticoPrincipal': ['A000', 'B000']})
+    # B000 tiene formato válido, pero no está en el catálogo
+    assert errores_de(validar_hoja('consultas', df, reglas)) == {
+        ('consultas', 3, 'codDiagnosticoPrincipal', 'B000', 'cie10_catalogo'),
+    }
+
+
+def test_requeridos_y_opcionales():
+    reglas = compilar_reglas([('numAutorizacion', OPCIONAL), ('codPrestador', TEXTO),
+                              ('numFEVPagoModerador', TEXTO)])
+    df = hoja({'numAutorizacion': ['', '123'],
+               'codPrestador': ['', '123'],
+               'numFEVPagoModerador': ['', '']})
+    # OPCIONAL y PERMITEN_VACIO aceptan vacíos; codPrestador no, y además exige 12 dígitos
+    assert errores_de(validar_hoja('consultas', df, reglas)) == {
+        ('consultas', 2, 'codPrestador', '', REQUERIDO),
+        ('consultas', 3, 'codPrestador', '123', 'prestador'),
+    }
+
+
+def test_columna_obligatoria_ausente():
+    reglas = compilar_reglas([('codPrestador', TEXTO), ('numAutorizacion', OPCIONAL)])
+    df = hoja({'otra': ['x', 'y']})
+    assert errores_de(validar_hoja('consultas', df, reglas)) == {
+        ('consultas', 2, 'codPrestador', '', REQUERIDO),
+        ('consultas', 3, 'codPrestador', '', REQUERIDO),
+    }
+
+
+def test_entero_y_valor():
+    reglas = compilar_reglas([('consecutivo', ENTERO), ('vrServicio', VALOR)])
+    df = hoja({'consecutivo': ['1', 'x', '3'],
+               'vrServicio': ['10.5', '1.2.3', '.']})
+    assert errores_de(validar_hoja('consultas', df, reglas)) == {
+        ('consultas', 3, 'consecutivo', 'x', TIPO_ENTERO),
+        ('consultas', 3, 'vrServicio', '1.2.3', TIPO_VALOR),
+        ('consultas', 4, 'vrServicio', '.', TIPO_VALOR),
+    }
+
+
+def test_filas_conservan_el_indice_de_la_hoja():
+    # Una parte de capita.particionar conserva el índice de la hoja completa
+    reglas = compilar_reglas([('codSexo', TEXTO)])
+    df = hoja({'codSexo': ['X', 'M', 'Z']}, indice=[5, 9, 12])
+    assert errores_de(validar_hoja('usuarios', df, reglas)) == {
+        ('usuarios', 7, 'codSexo', 'X', 'sexo'),
+        ('usuarios', 14, 'codSexo', 'Z', 'sexo'),
+    }
+
+
+def test_cruces_de_usuarios():
+    usuarios = hoja({'consecutivo': ['1', '01', '2'],
+                     'numDocumentoIdentificacion': ['111', '222', '333']})
+    consultas = hoja({'consecutivoUsuario': ['1', '3', '2', 'x'],
+                      'numDocumentoIdentificacion': ['111', '999', '000', '111']})
+    procedimientos = hoja({'consecutivoUsuario': ['2', '7'],
+                           'numDocumentoIdentificacion': ['no se cruza', '333']})
+    assert errores_de(validar_cruces(usuarios, {'consultas': consultas, 'procedimientos': procedimientos})) == {
+        # '01' es el mismo consecutivo que '1' una vez convertido; vale el primero
+        ('usuarios', 3, 'consecutivo', '01', CONSECUTIVO_DUPLICADO),
+        ('consultas', 3, 'consecutivoUsuario', '3', USUARIO_INEXISTENTE),
+        ('consultas', 4, 'numDocumentoIdentificacion', '000', DOCUMENTO_DISTINTO),
+        # El documento solo se cruza en consultas; 'x' lo reporta validar_hoja como entero
+        ('procedimientos', 3, 'consecutivoUsuario', '7', USUARIO_INEXISTENTE),
+    }
+
+
+def test_libro_sin_encabezado():
+    errores = validar_libro({'numDocumentoIdObligado': '900123456', 'numFactura': ''}, None, {})
+    assert errores_de([errores]) == {('transaccion', 2, 'numFactura', '', REQUERIDO)}
@@ -0,0 +1,246 @@
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from capita import (CAMPOS_SERVICIO, CAMPOS_USUARIO, CATALOGO_CIE10, CATALOGO_MUNICIPIOS, DOS_DIGITOS, ENTERO,
+                    OPCIONAL, VALOR, catalogo, convertir_columna, valores_y_codigos)
+
+
+# Validación local del RIPS que arma capita.py, antes de escribir el JSON: así
+# un libro con un CIE-10 mal digitado o una consulta de un usuario inexistente
+# se detecta aquí y no horas después en un ResultadosMSPS_*_R.txt de rechazo.
+#
+# El esquema (tipos, obligatorios, formatos de código y cruces) se compila una
+# sola vez en una lista de reglas por hoja. Cada regla se evalúa sobre las
+# columnas de texto tal como las lee capita, pero solo sobre los valores
+# distintos de la columna (pd.factorize): un millón de consultas con unos
+# cientos de diagnósticos distintos son unos cientos de expresiones regulares,
+# no un millón. El resultado se expande a las filas con los códigos del
+# factorize, todo en numpy; si capita ya dejó la columna como category se usan
+# sus categorías directamente. Con los catálogos locales de capita (municipios,
+# CIE-10) esos campos se validan contra el catálogo y no solo por formato.
+
+# Nombres de las reglas, como aparecen en el reporte de errores
+REQUERIDO = 'requerido'
+TIPO_ENTERO = 'entero'
+TIPO_VALOR = 'valor'
+USUARIO_INEXISTENTE = 'usuario_inexistente'
+CONSECUTIVO_DUPLICADO = 'consecutivo_duplicado'
+DOCUMENTO_DISTINTO = 'documento_distinto_al_usuario'
+
+COLUMNAS_ERRORES = ['hoja', 'fila', 'campo', 'valor', 'regla']
+
+PATRON_FECHA = r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+PATRON_FECHA_HORA = PATRON_FECHA + r' ([01]\d|2[0-3]):[0-5]\d'
+PATRON_CIE10 = r'[A-Z]\d{2}[0-9A-Z]{0,2}'
+
+# Formato de cada campo por nombre: (regla, expresión regular completa)
+FORMATOS = {
+    'tipoDocumentoIdentificacion': ('tipo_documento', r'CC|CE|CD|PA|SC|PE|RC|TI|CN|AS|MS|DE|PT|SI'),
+    'numDocumentoIdentificacion': ('documento', r'[0-9A-Za-z]{1,20}'),
+    'fechaNacimiento': ('fecha', PATRON_FECHA),
+    'codSexo': ('sexo', r'[HMI]'),
+    'codSexoBiologico': ('sexo', r'[HMI]'),
+    'codPaisResidencia': ('pais', r'\d{3}'),
+    'codPaisOrigen': ('pais', r'\d{3}'),
+    'codMunicipioResidencia': ('municipio', r'\d{5}'),
+    'codZonaTerritorialResidencia': ('zona', r'0[12]'),
+    'incapacidad': ('si_no', r'SI|NO'),
+    'codPrestador': ('prestador', r'\d{12}'),
+    'fechaInicioAtencion': ('fecha_hora', PATRON_FECHA_HORA),
+    'fechaEgreso': ('fecha_hora', PATRON_FECHA_HORA),
+    'fechaDispensAdmon': ('fecha_hora', PATRON_FECHA_HORA),
+    'fechaSuministroTecnologia': ('fecha_hora', PATRON_FECHA_HORA),
+    'codConsulta': ('cups', r'[0-9A-Z]{6}'),
+    'codProcedimiento': ('cups', r'[0-9A-Z]{6}'),
+    'conceptoRecaudo': ('concepto_recaudo', r'0[1-5]'),
+}
+
+# Campos de texto que la norma deja vacíos en algunos casos (además de los OPCIONAL de capita)
+PERMITEN_VACIO = {'numFEVPagoModerador'}
+
+# Hojas en las que el documento del servicio debe ser el de su usuario
+CRUCE_DOCUMENTO = ('consultas',)
+
+
+class Regla(NamedTuple):
+    """Regla compilada de un campo: verificar recibe los valores distintos y devuelve un arreglo de válidos"""
+    campo: str
+    nombre: str
+    requerido: bool
+    verificar: Optional[Callable[[np.ndarray], np.ndarray]]
+
+
+def _patron(expresion) -> Callable[[np.ndarray], np.ndarray]:
+    """Verificador por expresión regular completa, compilada una vez."""
+    compilada = re.compile(expresion)
+    return lambda valores: np.fromiter((compilada.fullmatch(valor) is not None for valor in valores),
+                                       dtype=bool, count=len(valores))
+
+
+def _en_catalogo(tabla) -> Callable[[np.ndarray], np.ndarray]:
+    """Verificador por pertenencia al catálogo."""
+    return lambda valores: np.fromiter((valor in tabla for valor in valores), dtype=bool, count=len(valores))
+
+
+def _formato(nombre, tipo):
+    """(regla, verificador) del campo según su tipo en capita y su nombre."""
+    nombre_catalogo = (CATALOGO_CIE10 if nombre.startswith('codDiagnostico')
+                       else CATALOGO_MUNICIPIOS if nombre == 'codMunicipioResidencia' else None)
+    tabla = catalogo(nombre_catalogo) if nombre_catalogo else None
+    if tabla:
+        return f"{nombre_catalogo}_catalogo", _en_catalogo(tabla)
+    if tipo == ENTERO:
+        return TIPO_ENTERO, _patron(r'\d+')
+    if tipo == VALOR:
+        # Lo mismo que acepta capita.convertir_columna: dígitos con a lo sumo un punto
+        return TIPO_VALOR, _patron(r'(?=.*\d)\d*\.?\d*')
+    if tipo == DOS_DIGITOS:
+        return 'dos_digitos', _patron(r'\d{1,2}')
+    if nombre.startswith('codDiagnostico'):
+        return 'cie10', _patron(PATRON_CIE10)
+    if nombre in FORMATOS:
+        regla, expresion = FORMATOS[nombre]
+        return regla, _patron(expresion)
+    return None, None
+
+
+def compilar_reglas(campos) -> List[Regla]:
+    """Reglas de una hoja a partir de sus campos [(nombre, tipo de capita)]."""
+    reglas = []
+    for nombre, tipo in campos:
+        regla, verificar = _formato(nombre, tipo)
+        requerido = tipo != OPCIONAL and nombre not in PERMITEN_VACIO
+        reglas.append(Regla(nombre, regla or REQUERIDO, requerido, verificar))
+    return reglas
+
+
+@lru_cache(maxsize=None)
+def esquema() -> Dict[str, List[Regla]]:
+    """{hoja: reglas} del RIPS de capita; se compila la primera vez que se pide."""
+    reglas = {'usuarios': compilar_reglas(CAMPOS_USUARIO)}
+    for tipo, campos in CAMPOS_SERVICIO.items():
+        reglas[tipo] = compilar_reglas(campos + [('consecutivoUsuario', ENTERO)])
+    return reglas
+
+
+def _errores(hoja, filas, campo, valores, regla) -> pd.DataFrame:
+    return pd.DataFrame({'hoja': hoja, 'fila': filas, 'campo': campo, 'valor': valores, 'regla': regla},
+                        columns=COLUMNAS_ERRORES)
+
+
+def _filas(df) -> np.ndarray:
+    """Fila de Excel de cada registro (fila 1 = encabezados); con capita.particionar se conserva la de la hoja."""
+    return df.index.to_numpy() + 2
+
+
+def _columna(df, campo) -> np.ndarray:
+    """Columna como arreglo de texto; si la hoja no la trae, todo vacío."""
+    if campo in df:
+        return df[campo].astype(str).to_numpy(dtype=object)
+    return np.full(len(df), '', dtype=object)
+
+
+def validar_hoja(hoja, df, reglas) -> List[pd.DataFrame]:
+    """Aplica las reglas a las columnas de la hoja; devuelve los errores encontrados (filas como en Excel)."""
+    filas = _filas(df)
+    errores = []
+    for regla in reglas:
+        if regla.campo in df:
+            unicos, codigos = valores_y_codigos(df[regla.campo])
+            unicos = unicos.to_numpy()
+        else:
+            unicos, codigos = np.array([''], dtype=object), np.zeros(len(df), dtype=np.intp)
+
+        # 0 = válido, 1 = vacío obligatorio, 2 = formato; por valor distinto
+        estado = np.zeros(len(unicos), dtype=np.int8)
+        vacios = unicos == ''
+        if regla.requerido:
+            estado[vacios] = 1
+        if regla.verificar is not None and (~vacios).any():
+            llenos = np.flatnonzero(~vacios)
+            estado[llenos[~regla.verificar(unicos[llenos])]] = 2
+
+        if not estado.any():
+            continue
+        estado_filas = estado[codigos]
+        for codigo, nombre in ((1, REQUERIDO), (2, regla.nombre)):
+            malos = estado_filas == codigo
+            if malos.any():
+                errores.append(_errores(hoja, filas[malos], regla.campo, unicos[codigos[malos]], nombre))
+    return errores
+
+
+def validar_cruces(df_usuarios, hojas_servicio) -> List[pd.DataFrame]:
+    """Consecutivos de usuario únicos, servicios de usuarios existentes y documento del servicio = el de su usuario."""
+    errores = []
+    # Los consecutivos se cruzan ya convertidos, como los vincula capita ('01' = '1')
+    texto = pd.Series(_columna(df_usuarios, 'consecutivo'))
+    consecutivos = convertir_columna(texto, ENTERO).to_numpy()
+    documentos = _columna(df_usuarios, 'numDocumentoIdentificacion')
+
+    duplicados = pd.Series(consecutivos).duplicated(keep='first').to_numpy() & texto.str.isdigit().to_numpy()
+    if duplicados.any():
+        errores.append(_errores('usuarios', _filas(df_usuarios)[duplicados], 'consecutivo',
+                                texto.to_numpy()[duplicados], CONSECUTIVO_DUPLICADO))
+    unicos = ~pd.Series(consecutivos).duplicated(keep='first').to_numpy()
+    documento_por_consecutivo = pd.Series(documentos[unicos], index=consecutivos[unicos])
+
+    for tipo, df in hojas_servicio.items():
+        texto_usuario = pd.Series(_columna(df, 'consecutivoUsuario'))
+        consecutivo_usuario = texto_usuario.to_numpy()
+        filas = _filas(df)
+        documento_usuario = (convertir_columna(texto_usuario, ENTERO).map(documento_por_consecutivo)
+                             .to_numpy(dtype=object))
+        # Los vacíos y no numéricos ya los reporta validar_hoja
+        inexistentes = pd.isna(documento_usuario) & texto_usuario.str.isdigit().to_numpy()
+        if inexistentes.any():
+            errores.append(_errores(tipo, filas[inexistentes], 'consecutivoUsuario',
+                                    consecutivo_usuario[inexistentes], USUARIO_INEXISTENTE))
+        if tipo in CRUCE_DOCUMENTO:
+            documento = _columna(df, 'numDocumentoIdentificacion')
+            distintos = ~pd.isna(documento_usuario) & (documento != documento_usuario)
+            if distintos.any():
+                errores.append(_errores(tipo, filas[distintos], 'numDocumentoIdentificacion',
+                                        documento[distintos], DOCUMENTO_DISTINTO))
+    return errores
+
+
+def validar_libro(encabezado, df_usuarios, hojas_servicio) -> pd.DataFrame:
+    """Valida el libro RIPS leído por capita.leer_hojas; devuelve un DataFrame de errores (vacío si no hay).
+
+    Columnas: hoja, fila (como en Excel), campo, valor y regla incumplida.
+    """
+    reglas = esquema()
+    errores = []
+    for campo in ('numDocumentoIdObligado', 'numFactura'):
+        if not encabezado.get(campo):
+            errores.append(_errores('transaccion', [2], campo, [''], REQUERIDO))
+
+    if df_usuarios is None:
+        df_usuarios = pd.DataFrame(columns=[nombre for nombre, _ in CAMPOS_USUARIO])
+    errores += validar_hoja('usuarios', df_usuarios, reglas['usuarios'])
+    for tipo, df in hojas_servicio.items():
+        errores += validar_hoja(tipo, df, reglas[tipo])
+    errores += validar_cruces(df_usuarios, hojas_servicio)
+
+    if not errores:
+        return pd.DataFrame(columns=COLUMNAS_ERRORES)
+    return pd.concat(errores, ignore_index=True)
+
+
+def resumen_errores(errores, maximo=20) -> List[str]:
+    """Líneas de resumen por hoja, campo y regla, con un valor de ejemplo, de la más frecuente a la menos."""
+    if errores.empty:
+        return []
+    grupos = (errores.groupby(['hoja', 'campo', 'regla'], sort=False)
+              .agg(cantidad=('fila', 'size'), fila=('fila', 'first'), valor=('valor', 'first'))
+              .sort_values('cantidad', ascending=False))
+    lineas = [f"{hoja}.{campo}: {fila.cantidad} fila(s) no cumplen '{regla}' (ej. fila {fila.fila}: {fila.valor!r})"
+              for (hoja, campo, regla), fila in grupos.head(maximo).iterrows()]
+    if len(grupos) > maximo:
+        lineas.append(f"... y {len(grupos) - maximo} grupo(s) más")
+    return lineas
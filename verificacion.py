@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from copiado import TAMANO_BLOQUE, hash_archivo
+
+
+# Verificación de copias por SHA-256: se hashea el origen y el destino de cada
+# archivo en un pool de hilos (hashlib suelta el GIL, así que los hilos leen y
+# hashean a la vez) y se comparan. Un PDF truncado por la red aparece aquí y no
+# cuando la EPS rechaza la radicación.
+#
+# Los hashes de origen y destino se guardan en un caché por (ruta, tamaño,
+# mtime, inodo, ctime): en una re-ejecución (también con --reanudar) solo se
+# vuelven a leer los archivos que cambiaron. El mtime solo no basta: copy2 le
+# pone a la copia el mtime del origen, y un archivo reescrito con el mismo
+# tamaño y mtime conserva la clave; el ctime sí cambia con cualquier escritura
+# (y con el utime de copy2), así que una copia dañada o rehecha se relee.
+# benchmarks/comprobar_verificacion.py comprueba ese caso. El resultado
+# queda en un manifiesto con el formato de sha256sum ("<hash>  <ruta relativa>"),
+# que se puede volver a comprobar después sin el origen:
+#
+#   python cli.py verificar D:/radicado/manifiesto_radicacion.sha256
+#   sha256sum -c manifiesto_radicacion.sha256   (desde la carpeta del manifiesto)
+
+NOMBRE_MANIFIESTO = 'manifiesto_radicacion.sha256'
+NOMBRE_CACHE = 'cache_hashes.json'
+VERSION_CACHE = 2
+
+
+class CacheHashes:
+    """Caché en disco de ruta -> (tamaño, mtime, inodo, ctime, SHA-256), seguro entre hilos"""
+
+    def __init__(self, ruta_cache=None, tamano_bloque=TAMANO_BLOQUE):
+        self.ruta_cache = ruta_cache
+        self.tamano_bloque = tamano_bloque
+        # {ruta absoluta: [tamaño, mtime_ns, inodo, ctime_ns, hash]}
+        self.entradas: Dict[str, list] = {}
+        self.aciertos = 0
+        self.bytes_leidos = 0
+        self._lock = threading.Lock()
+        self.cargar()
+
+    def cargar(self):
+        """Carga el caché desde disco si existe y es de la versión actual."""
+        if not self.ruta_cache or not os.path.exists(self.ruta_cache):
+            return
+        try:
+            with open(self.ruta_cache, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get('version') == VERSION_CACHE:
+                self.entradas = datos.get('hashes', {})
+        except Exception as e:
+            print(f"Caché de hashes ilegible, se reconstruirá: {str(e)}")
+            self.entradas = {}
+
+    def guardar(self):
+        """Guarda el caché en disco de forma atómica."""
+        if not self.ruta_cache:
+            return
+        with self._lock:
+            datos = {'version': VERSION_CACHE, 'hashes': dict(self.entradas)}
+        temporal = f"{self.ruta_cache}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(temporal, self.ruta_cache)
+
+    def hash(self, ruta) -> str:
+        """SHA-256 del archivo; solo se lee si cambió su clave desde la última vez."""
+        ruta = os.path.abspath(ruta)
+        estado = os.stat(ruta)
+        clave = [estado.st_size, estado.st_mtime_ns, estado.st_ino, estado.st_ctime_ns]
+        with self._lock:
+            entrada = self.entradas.get(ruta)
+            if entrada and entrada[:4] == clave:
+                self.aciertos += 1
+                return entrada[4]
+
+        digest = hash_archivo(ruta, self.tamano_bloque)
+        with self._lock:
+            self.entradas[ruta] = clave + [digest]
+            self.bytes_leidos += estado.st_size
+        return digest
+
+
+def pares_de_copia(origen, destino, nombre_destino: Optional[Callable[[str], Optional[str]]] = None
+                   ) -> List[Tuple[str, str]]:
+    """[(archivo de origen, archivo de destino)] de lo que copiado.copiar_arbol escribe con las mismas reglas."""
+    pares = []
+    for directorio, subdirectorios, archivos in os.walk(origen):
+        relativo = os.path.relpath(directorio, origen)
+        if nombre_destino is not None:
+            subdirectorios[:] = [d for d in subdirectorios if nombre_destino(d) is not None]
+        for archivo in archivos:
+            nuevo = nombre_destino(archivo) if nombre_destino is not None else archivo
+            if nuevo is None:
+                continue
+            pares.append((os.path.join(directorio, archivo), os.path.normpath(os.path.join(destino, relativo, nuevo))))
+    return pares
+
+
+def verificar_pares(pares: List[Tuple[str, str]], cache: CacheHashes, executor: Executor
+                    ) -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+    """Hashea origen y destino de cada par en el pool; devuelve [(origen, destino, hash, problema)].
+
+    hash es el del destino cuando coincide con el origen; si no, queda en None
+    y problema explica la diferencia. Los dos hashes pueden salir del caché.
+    """
+    futuros = [(origen, destino, executor.submit(cache.hash, origen),
+                executor.submit(cache.hash, destino))
+               for origen, destino in pares]
+    resultados = []
+    for origen, destino, futuro_origen, futuro_destino in futuros:
+        try:
+            hash_origen = futuro_origen.result()
+        except OSError as e:
+            resultados.append((origen, destino, None, f"no se pudo leer el origen: {e}"))
+            continue
+        try:
+            hash_destino = futuro_destino.result()
+        except FileNotFoundError:
+            resultados.append((origen, destino, None, "falta en el destino"))
+            continue
+        except OSError as e:
+            resultados.append((origen, destino, None, f"no se pudo leer el destino: {e}"))
+            continue
+        if hash_origen != hash_destino:
+            resultados.append((origen, destino, None, "el contenido no coincide con el origen"))
+        else:
+            resultados.append((origen, destino, hash_destino, None))
+    return resultados
+
+
+def escribir_manifiesto(ruta_manifiesto, hashes: Dict[str, str]) -> None:
+    """Escribe {ruta: hash} como manifiesto sha256sum, con rutas relativas a la carpeta del manifiesto."""
+    base = os.path.dirname(os.path.abspath(ruta_manifiesto))
+    lineas = sorted(f"{digest}  {os.path.relpath(ruta, base).replace(os.sep, '/')}\n"
+                    for ruta, digest in hashes.items())
+    temporal = f"{ruta_manifiesto}.tmp"
+    with open(temporal, 'w', encoding='utf-8', newline='\n') as f:
+        f.writelines(lineas)
+    os.replace(temporal, ruta_manifiesto)
+
+
+def leer_manifiesto(ruta_manifiesto) -> List[Tuple[str, str]]:
+    """[(hash, ruta absoluta)] de un manifiesto sha256sum."""
+    base = os.path.dirname(os.path.abspath(ruta_manifiesto))
+    entradas = []
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+        for numero, linea in enumerate(f, 1):
+            linea = linea.rstrip('\n')
+            if not linea:
+                continue
+            digest, separador, relativa = linea.partition('  ')
+            if not separador or len(digest) != 64:
+                raise ValueError(f"Línea {numero} del manifiesto no válida: {linea!r}")
+            entradas.append((digest, os.path.join(base, relativa.lstrip('*'))))
+    return entradas
+
+
+def verificar_manifiesto(ruta_manifiesto, trabajadores=8, tamano_bloque=TAMANO_BLOQUE,
+                         executor: Optional[Executor] = None) -> Tuple[int, List[str]]:
+    """Vuelve a hashear los archivos del manifiesto (sin caché ni origen); devuelve (correctos, problemas)."""
+    entradas = leer_manifiesto(ruta_manifiesto)
+    cache = CacheHashes(tamano_bloque=tamano_bloque)
+
+    def comprobar(entrada):
+        digest, ruta = entrada
+        try:
+            return None if cache.hash(ruta) == digest else f"{ruta}: el contenido no coincide con el manifiesto"
+        except FileNotFoundError:
+            return f"{ruta}: no existe"
+        except OSError as e:
+            return f"{ruta}: {e}"
+
+    if executor is not None:
+        problemas = [p for p in executor.map(comprobar, entradas) if p]
+    else:
+        with ThreadPoolExecutor(max_workers=trabajadores) as pool:
+            problemas = [p for p in pool.map(comprobar, entradas) if p]
+    return len(entradas) - len(problemas), problemas
@@ -0,0 +1,433 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from indice_facturas import IndiceFacturas, PATRON_JSON, PATRON_XML
+from main import copiar_archivo, crear_directorio
+from metricas import MetricasEtapas
+from prueba import CARPETAS_DESTINO, clasificar_carpeta, ejecutar_movimientos
+
+
+# Modo vigilancia: en lugar de correr main.procesar_facturas y
+# prueba.organizar_carpetas a mano cada vez que llegan archivos, este proceso
+# queda escuchando los cambios y atiende solo lo que cambió:
+#
+#   - llega un XML o un FE*.json: si ya están los dos, crea la carpeta de la factura
+#   - llega un resultado (ResultadosMSPS_*, ResultadosLocales_*) a una carpeta:
+#     la clasifica y la mueve a "validados y aprobados" / "Rechazados Locales" / "Rechazados MSPS"
+#
+# Usa los eventos del sistema de archivos (inotify en Linux, ReadDirectoryChangesW
+# en Windows) si está instalado watchdog (pip install watchdog); si no, o si el
+# sistema no da más vigilancias, sondea comparando el mtime de los directorios
+# y el tamaño y mtime de los archivos recién llegados.
+# Las ráfagas (un ZIP de resultados descomprimiéndose, una copia de cientos de
+# XML) se agrupan: se espera un silencio corto antes de procesar, con un tope
+# para que una ráfaga continua no retrase los eventos más de ESPERA_MAXIMA.
+# Con eventos, un archivo se atiende en menos de un segundo. Con sondeo se
+# suma la espera hasta el siguiente barrido: en el peor caso INTERVALO_SONDEO
+# + ESPERA_MAXIMA (1 s con los valores predeterminados) más el tiempo de copia;
+# un --intervalo mayor la alarga en la misma medida.
+#
+#   python vigilante.py
+#   python cli.py vigilar --xml D:/007-Invoices/2025/SEPT-2025 --json D:/007-Invoices/json_files --destino D:/007-Invoices/2025-Directories
+
+ESPERA_PREDETERMINADA = 0.25  # Segundos de silencio que cierran una ráfaga
+ESPERA_MAXIMA = 0.75          # Tope de espera de una ráfaga continua
+INTERVALO_SONDEO = 0.25       # Segundos entre barridos cuando no hay watchdog
+ESTABILIDAD_SONDEO = 5.0      # Segundos sin cambios para dar por terminado de escribir un archivo
+
+ETAPA_FACTURA = 'factura'     # Evento de XML/JSON atendido
+ETAPA_CARPETA = 'carpeta'     # Evento dentro de una carpeta de factura atendido
+
+
+def archivo_actualizado(origen, destino) -> bool:
+    """True si destino ya es copia de origen (mismo tamaño y mtime; copy2 conserva el mtime)."""
+    try:
+        estado_origen = os.stat(origen)
+        estado_destino = os.stat(destino)
+    except OSError:
+        return False
+    return (estado_origen.st_size == estado_destino.st_size
+            and abs(estado_origen.st_mtime - estado_destino.st_mtime) < 2)  # FAT guarda el mtime cada 2 s
+
+
+class SondeoDirectorios(threading.Thread):
+    """Alternativa a watchdog: barre los directorios cada intervalo y avisa de los archivos nuevos o cambiados.
+
+    Solo se relista un directorio si cambió su mtime, así que un barrido sin
+    cambios cuesta un stat por directorio. Escribir dentro de un archivo no
+    cambia el mtime de su directorio: por eso cada archivo nuevo o cambiado
+    queda en observación (un stat por barrido) y se vuelve a avisar mientras
+    su tamaño o mtime sigan cambiando; sale tras `estabilidad` segundos sin cambios.
+    Un archivo viejo que se reescribe en su lugar, sin renombrarlo, no se detecta.
+
+    A notificar se le pasa la ruta y el instante estimado de llegada (el mtime
+    o ctime más reciente del archivo, en la escala de time.perf_counter), para
+    que la latencia incluya la espera hasta el barrido.
+    """
+
+    def __init__(self, raices: Iterable[Tuple[str, bool]], notificar: Callable[[str, Optional[float]], None],
+                 intervalo=INTERVALO_SONDEO, excluir: Iterable[str] = (), estabilidad=ESTABILIDAD_SONDEO):
+        super().__init__(name='sondeo-directorios', daemon=True)
+        self.raices = list(raices)
+        self.notificar = notificar
+        self.intervalo = intervalo
+        self.estabilidad = estabilidad
+        self.excluir = set(excluir)
+        # {directorio: (mtime, {nombre: None si es directorio, si no (tamaño, mtime)})}
+        self.instantanea: Dict[str, Tuple[int, Dict[str, Optional[Tuple[int, int]]]]] = {}
+        # {ruta: ((tamaño, mtime), último cambio visto)} de los archivos que pueden estar a medio escribir
+        self.en_observacion: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self._detener = threading.Event()
+        self.barrer(avisar=False)
+
+    @staticmethod
+    def _llegada(estado: os.stat_result) -> float:
+        """Instante de llegada del archivo según su mtime/ctime, en la escala de time.perf_counter."""
+        antiguedad = time.time() - max(estado.st_mtime_ns, estado.st_ctime_ns) / 1e9
+        return time.perf_counter() - max(0.0, antiguedad)
+
+    def _revisar_observados(self):
+        """Vuelve a avisar de los archivos en observación que cambiaron; suelta los que ya no cambian."""
+        ahora = time.monotonic()
+        for ruta, (firma, ultimo_cambio) in list(self.en_observacion.items()):
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                del self.en_observacion[ruta]
+                continue
+            actual = (estado.st_size, estado.st_mtime_ns)
+            if actual == firma:
+                if ahora - ultimo_cambio >= self.estabilidad:
+                    del self.en_observacion[ruta]
+                continue
+            self.en_observacion[ruta] = (actual, ahora)
+            directorio, nombre = os.path.split(ruta)
+            anterior = self.instantanea.get(directorio)
+            if anterior is not None and nombre in anterior[1]:
+                anterior[1][nombre] = actual  # Para que el relistado del directorio no lo repita
+            self.notificar(ruta, self._llegada(estado))
+
+    def barrer(self, avisar=True):
+        if avisar:
+            # Antes que los directorios, para que un archivo relistado en este barrido no se avise dos veces
+            self._revisar_observados()
+        vistos = set()
+        for raiz, recursivo in self.raices:
+            pendientes = [raiz]
+            while pendientes:
+                directorio = pendientes.pop()
+                try:
+                    mtime = os.stat(directorio).st_mtime_ns
+                except OSError:
+                    continue
+                vistos.add(directorio)
+
+                anterior = self.instantanea.get(directorio)
+                if anterior is not None and anterior[0] == mtime:
+                    entradas = anterior[1]
+                else:
+                    previas = anterior[1] if anterior is not None else {}
+                    entradas = {}
+                    try:
+                        with os.scandir(directorio) as it:
+                            for entrada in it:
+                                if entrada.is_dir(follow_symlinks=False):
+                                    entradas[entrada.name] = None
+                                    if avisar and entrada.name not in previas:
+                                        self.notificar(entrada.path, None)
+                                    continue
+                                try:
+                                    estado = entrada.stat(follow_symlinks=False)
+                                except OSError:
+                                    continue  # Se borró mientras se listaba
+                                firma = (estado.st_size, estado.st_mtime_ns)
+                                entradas[entrada.name] = firma
+                                # Nuevo, o reemplazado (p. ej. renombrando encima) con otro tamaño o mtime
+                                if avisar and previas.get(entrada.name) != firma:
+                                    self.en_observacion[entrada.path] = (firma, time.monotonic())
+                                    self.notificar(entrada.path, self._llegada(estado))
+                    except OSError:
+                        continue
+                    self.instantanea[directorio] = (mtime, entradas)
+
+                if recursivo:
+                    pendientes.extend(ruta for ruta in (os.path.join(directorio, nombre)
+                                                        for nombre, firma in entradas.items() if firma is None)
+                                      if ruta not in self.excluir)
+
+        for directorio in self.instantanea.keys() - vistos:
+            del self.instantanea[directorio]
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.barrer()
+
+    def stop(self):
+        self._detener.set()
+
+
+class Vigilante:
+    """Crea y clasifica carpetas de facturas a medida que llegan los XML, los JSON y los resultados"""
+
+    def __init__(self, ruta_base_xml, ruta_json_origen, ruta_destino, espera=ESPERA_PREDETERMINADA,
+                 espera_maxima=ESPERA_MAXIMA, sondeo=False, intervalo_sondeo=INTERVALO_SONDEO,
+                 indice: Optional[IndiceFacturas] = None, trabajadores=8):
+        self.ruta_base_xml = os.path.abspath(ruta_base_xml)
+        self.ruta_json_origen = os.path.abspath(ruta_json_origen)
+        self.ruta_destino = os.path.abspath(ruta_destino)
+        self.espera = espera
+        self.espera_maxima = espera_maxima
+        self.sondeo = sondeo
+        self.intervalo_sondeo = intervalo_sondeo
+        self.indice = indice if indice is not None else IndiceFacturas()
+        self.trabajadores = trabajadores
+
+        self.eventos = queue.Queue()
+        self.metricas = MetricasEtapas()
+        self.xml_por_numero: Dict[str, str] = {}
+        self.json_por_numero: Dict[str, str] = {}
+        self.carpetas_creadas = 0
+        self.carpetas_movidas = 0
+        self.con_sondeo = False
+        self._detener = threading.Event()
+
+    def notificar(self, ruta, instante=None):
+        """Encola un cambio; se llama desde el hilo de watchdog o del sondeo.
+
+        instante es la llegada estimada del archivo (time.perf_counter); sin él
+        se toma el momento del aviso, que con eventos es prácticamente el mismo.
+        """
+        self.eventos.put((ruta, time.perf_counter() if instante is None else instante))
+
+    def detener(self):
+        self._detener.set()
+
+    # --- Acciones ---
+
+    def _carpeta_clasificada(self, nombre_carpeta) -> bool:
+        return any(os.path.isdir(os.path.join(self.ruta_destino, destino, nombre_carpeta))
+                   for destino in CARPETAS_DESTINO)
+
+    def crear_carpeta(self, numero) -> bool:
+        """Crea o completa la carpeta de la factura si están su XML y su JSON; True si copió algo."""
+        ruta_xml = self.xml_por_numero.get(numero)
+        ruta_json = self.json_por_numero.get(numero)
+        if not ruta_xml or not ruta_json:
+            return False
+
+        archivo_xml = os.path.basename(ruta_xml)
+        nombre_carpeta = os.path.splitext(archivo_xml)[0]  # Ej: AttachedDocument_F-010-200816
+        if self._carpeta_clasificada(nombre_carpeta):
+            return False
+        ruta_carpeta = crear_directorio(os.path.join(self.ruta_destino, nombre_carpeta))
+
+        copiado = False
+        # Se vuelve a copiar si el origen cambió: el primer evento puede llegar con el archivo a medio escribir,
+        # y tanto watchdog como el sondeo (archivos en observación) avisan otra vez cuando termina de escribirse
+        for origen, nombre in ((ruta_xml, archivo_xml), (ruta_json, f"FE{numero}.json")):
+            destino = os.path.join(ruta_carpeta, nombre)
+            if not archivo_actualizado(origen, destino):
+                copiado = copiar_archivo(origen, destino) or copiado
+        return copiado
+
+    def organizar_carpeta(self, nombre_carpeta) -> Optional[str]:
+        """Clasifica una carpeta de destino y la mueve; devuelve la carpeta destino o None."""
+        ruta_carpeta = os.path.join(self.ruta_destino, nombre_carpeta)
+        try:
+            destino = clasificar_carpeta(ruta_carpeta)
+        except OSError:
+            return None  # Se movió o borró mientras tanto
+        if not destino:
+            return None
+        errores = ejecutar_movimientos(self.ruta_destino, [(nombre_carpeta, destino)])
+        for error in errores:
+            print(f"⚠️ No se pudo mover {error}")
+        return None if errores else destino
+
+    # --- Pasada inicial ---
+
+    def pasada_inicial(self):
+        """Pone el destino al día con lo que llegó mientras el vigilante no corría."""
+        inicio = time.perf_counter()
+        self.indice.actualizar(self.ruta_base_xml, self.ruta_json_origen)
+        self.indice.guardar()
+        self.xml_por_numero = dict(self.indice.xml_por_numero)
+        self.json_por_numero = dict(self.indice.json_por_numero)
+
+        existentes = set()
+        for ruta in [self.ruta_destino] + [os.path.join(self.ruta_destino, d) for d in CARPETAS_DESTINO]:
+            if os.path.isdir(ruta):
+                with os.scandir(ruta) as entradas:
+                    existentes.update(entrada.name for entrada in entradas if entrada.is_dir())
+
+        pendientes = [numero for numero, ruta_xml in self.xml_por_numero.items()
+                      if numero in self.json_por_numero
+                      and os.path.splitext(os.path.basename(ruta_xml))[0] not in existentes]
+        with ThreadPoolExecutor(max_workers=self.trabajadores) as executor:
+            self.carpetas_creadas += sum(executor.map(self.crear_carpeta, pendientes))
+
+        for destino in CARPETAS_DESTINO:
+            os.makedirs(os.path.join(self.ruta_destino, destino), exist_ok=True)
+        with os.scandir(self.ruta_destino) as entradas:
+            carpetas = [entrada.name for entrada in entradas
+                        if entrada.is_dir() and entrada.name not in CARPETAS_DESTINO]
+        movidas = sum(1 for carpeta in carpetas if self.organizar_carpeta(carpeta))
+        self.carpetas_movidas += movidas
+
+        print(f"🔄 Pasada inicial: {self.carpetas_creadas} carpetas creadas, {movidas} clasificadas "
+              f"en {time.perf_counter() - inicio:.1f}s")
+
+    # --- Eventos ---
+
+    def _interpretar(self, ruta) -> Optional[Tuple[str, str]]:
+        """(etapa, clave) del evento: (ETAPA_FACTURA, número) o (ETAPA_CARPETA, nombre de carpeta)."""
+        # El destino va primero: puede estar dentro del árbol de XML y las carpetas llevan su propio XML
+        prefijo_destino = os.path.join(self.ruta_destino, '')
+        if ruta.startswith(prefijo_destino):
+            carpeta = ruta[len(prefijo_destino):].split(os.sep, 1)[0]
+            if carpeta and carpeta not in CARPETAS_DESTINO:
+                return ETAPA_CARPETA, carpeta
+            return None
+
+        directorio, nombre = os.path.split(ruta)
+        if directorio == self.ruta_json_origen:
+            match = PATRON_JSON.search(nombre)
+            por_numero = self.json_por_numero
+        elif ruta.startswith(os.path.join(self.ruta_base_xml, '')):
+            match = PATRON_XML.search(nombre)
+            por_numero = self.xml_por_numero
+        else:
+            return None
+        if not match:
+            return None
+
+        numero = match.group(1)
+        if os.path.isfile(ruta):
+            por_numero[numero] = ruta
+        elif por_numero.get(numero) == ruta:
+            del por_numero[numero]
+        return ETAPA_FACTURA, numero
+
+    def _recoger_rafaga(self) -> Dict[str, float]:
+        """Espera el primer evento y junta los que lleguen hasta un silencio de `espera` segundos."""
+        try:
+            ruta, instante = self.eventos.get(timeout=0.5)
+        except queue.Empty:
+            return {}
+        rafaga = {ruta: instante}
+        limite = time.perf_counter() + self.espera_maxima
+        while True:
+            restante = min(self.espera, limite - time.perf_counter())
+            if restante <= 0:
+                break
+            try:
+                ruta, instante = self.eventos.get(timeout=restante)
+            except queue.Empty:
+                break
+            rafaga.setdefault(ruta, instante)
+        return rafaga
+
+    def procesar_rafaga(self, rafaga: Dict[str, float]):
+        # Primero las facturas nuevas y luego las carpetas: una carpeta recién creada puede clasificarse en la misma ráfaga
+        pendientes = {ETAPA_FACTURA: {}, ETAPA_CARPETA: {}}
+        for ruta, instante in rafaga.items():
+            evento = self._interpretar(ruta)
+            if evento:
+                etapa, clave = evento
+                pendientes[etapa][clave] = min(instante, pendientes[etapa].get(clave, instante))
+
+        for numero, instante in pendientes[ETAPA_FACTURA].items():
+            if self.crear_carpeta(numero):
+                self.carpetas_creadas += 1
+                print(f"📁 Carpeta de la factura {numero} creada")
+            self.metricas.registrar(numero, ETAPA_FACTURA, time.perf_counter() - instante)
+
+        for carpeta, instante in pendientes[ETAPA_CARPETA].items():
+            destino = self.organizar_carpeta(carpeta)
+            if destino:
+                self.carpetas_movidas += 1
+                print(f"➡️ {carpeta} movida a '{destino}'")
+            self.metricas.registrar(carpeta, ETAPA_CARPETA, time.perf_counter() - instante)
+
+    def _iniciar_observador(self):
+        """Arranca watchdog si está disponible; si no, el sondeo. Ambos tienen stop() y join()."""
+        if not self.sondeo:
+            try:
+                from watchdog.events import FileSystemEventHandler
+                from watchdog.observers import Observer
+            except ImportError:
+                print(f"ℹ️ watchdog no está instalado: se revisan los cambios cada {self.intervalo_sondeo}s")
+            else:
+                vigilante = self
+
+                class Manejador(FileSystemEventHandler):
+                    def on_any_event(self, evento):
+                        if evento.event_type in ('created', 'modified', 'moved', 'closed'):
+                            vigilante.notificar(getattr(evento, 'dest_path', '') or evento.src_path)
+
+                observador = Observer()
+                manejador = Manejador()
+                try:
+                    observador.schedule(manejador, self.ruta_base_xml, recursive=True)
+                    observador.schedule(manejador, self.ruta_json_origen, recursive=False)
+                    observador.schedule(manejador, self.ruta_destino, recursive=True)
+                    observador.start()
+                    print("👀 Vigilando con eventos del sistema de archivos")
+                    return observador
+                except OSError as e:  # p. ej. se agotó fs.inotify.max_user_watches
+                    print(f"⚠️ No se pudo vigilar con eventos ({e}): se revisan los cambios cada {self.intervalo_sondeo}s")
+
+        self.con_sondeo = True
+        sondeo = SondeoDirectorios(
+            [(self.ruta_base_xml, True), (self.ruta_json_origen, False), (self.ruta_destino, True)],
+            self.notificar, self.intervalo_sondeo,
+            excluir=[os.path.join(self.ruta_destino, destino) for destino in CARPETAS_DESTINO])
+        sondeo.start()
+        return sondeo
+
+    def imprimir_latencias(self):
+        print(f"\n📋 {self.carpetas_creadas} carpetas creadas, {self.carpetas_movidas} carpetas clasificadas")
+        if self.con_sondeo:
+            print(f"  Latencias desde la llegada de cada archivo (su mtime), con la espera del sondeo cada {self.intervalo_sondeo}s")
+        else:
+            print("  Latencias desde el evento del sistema de archivos")
+        for etapa, datos in self.metricas.resumen().items():
+            print(f"  {etapa:<10} {datos['cantidad']:>6} eventos   p50 {datos['p50_s'] * 1000:>6.0f} ms   "
+                  f"p95 {datos['p95_s'] * 1000:>6.0f} ms   máx {datos['max_s'] * 1000:>6.0f} ms")
+
+    def ejecutar(self):
+        """Pasada inicial y luego atiende eventos hasta detener() o Ctrl+C."""
+        crear_directorio(self.ruta_destino)
+        self.pasada_inicial()
+        observador = self._iniciar_observador()
+        print("⏳ Esperando cambios (Ctrl+C para salir)...")
+        try:
+            while not self._detener.is_set():
+                rafaga = self._recoger_rafaga()
+                if rafaga:
+                    self.procesar_rafaga(rafaga)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observador.stop()
+            observador.join()
+            self.imprimir_latencias()
+
+
+def main():
+    ruta_base_xml = input("Ingrese la ruta del árbol de XML: ").strip()
+    ruta_json_origen = input("Ingrese la ruta de la carpeta de JSON: ").strip()
+    ruta_destino = input("Ingrese la ruta de destino de las carpetas: ").strip()
+    for ruta in (ruta_base_xml, ruta_json_origen):
+        if not os.path.isdir(ruta):
+            print(f"❌ La ruta especificada no es un directorio válido: {ruta}")
+            return
+    Vigilante(ruta_base_xml, ruta_json_origen, ruta_destino).ejecutar()
+
+
+if __name__ == "__main__":
+    main()